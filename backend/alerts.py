@@ -0,0 +1,411 @@
+"""
+Alert Engine - Bias and signal transition alerts
+Detects changes in per-symbol bias/signal between snapshots and delivers
+them to subscribed webhooks in batches from a background thread.
+Subscriptions are kept in SQLite so they survive restarts and are seen by
+every worker sharing the state directory. Each one belongs to an owner.
+
+Webhook hosts must resolve to public addresses (checked on subscribe and
+again before every delivery), so subscriptions cannot reach loopback,
+private or link-local services. ALERTS_ALLOW_PRIVATE=1 lifts that, e.g.
+for a local test receiver.
+"""
+
+import heapq
+import ipaddress
+import itertools
+import os
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from bias_calculator import BIAS_LABELS, SIGNAL_LABELS
+
+# Snapshot row fields that can trigger an alert, and their values
+ALERT_VALUES = {
+    "signal": SIGNAL_LABELS,
+    "daily": BIAS_LABELS,
+    "weekly": BIAS_LABELS,
+    "monthly": BIAS_LABELS,
+}
+ALERT_FIELDS = list(ALERT_VALUES)
+ANY = "*"
+
+ALLOW_PRIVATE_ENV = "ALERTS_ALLOW_PRIVATE"
+
+
+def allow_private_targets() -> bool:
+    return os.environ.get(ALLOW_PRIVATE_ENV, "").lower() in ("1", "true", "yes")
+
+
+def check_webhook_url(url: str, allow_private: bool = False):
+    """
+    Raise ValueError unless url is http(s) and every address its host
+    resolves to is public (not loopback, private, link-local, multicast...)
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        raise ValueError(f"Invalid webhook URL: {url}")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid webhook URL: {url}")
+    if allow_private:
+        return
+
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port or (443 if parts.scheme == "https" else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Webhook host does not resolve: {parts.hostname}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Webhook host {parts.hostname} resolves to a non-public address ({address})")
+
+
+class WebhookDispatcher:
+    """
+    Batches alert events per webhook URL and POSTs them asynchronously.
+
+    Events are queued by the engine and never block the caller. A single
+    background thread groups queued events by URL, flushes a batch when it
+    reaches `max_batch` events or is `flush_interval` seconds old, and hands
+    it to a small thread pool. Failed deliveries are retried with
+    exponential backoff plus jitter up to `max_attempts` times. The target
+    is re-checked before each POST and redirects are not followed, so a
+    host that starts resolving to a private address is not reached.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 100,
+                 max_attempts: int = 5, backoff: float = 1.0, timeout: float = 5.0,
+                 max_workers: int = 4, allow_private: bool = None):
+        self.allow_private = allow_private_targets() if allow_private is None else allow_private
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+        self.stats = {"queued": 0, "delivered": 0, "batches": 0, "retries": 0, "dropped": 0}
+
+        self._queue = queue.Queue()
+        self._retries = []                # heap of (due_time, seq, url, events, attempt)
+        self._seq = itertools.count()
+        self._session = None
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            # requests is only needed once someone subscribes
+            import requests
+            if self._session is None:
+                self._session = requests.Session()
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="webhook")
+            self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what is pending and stop the background thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def enqueue(self, url: str, event: dict):
+        self._queue.put((url, event))
+
+    def _run(self):
+        pending: Dict[str, list] = {}     # url -> events
+        opened: Dict[str, float] = {}     # url -> time the batch started
+
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                url, event = self._queue.get(timeout=0.05)
+                self.stats["queued"] += 1
+                pending.setdefault(url, []).append(event)
+                opened.setdefault(url, time.monotonic())
+                # Drain whatever else is already queued without waiting
+                while True:
+                    url, event = self._queue.get_nowait()
+                    self.stats["queued"] += 1
+                    pending.setdefault(url, []).append(event)
+                    opened.setdefault(url, time.monotonic())
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for url in list(pending):
+                events = pending[url]
+                if stopping or len(events) >= self.max_batch or now - opened[url] >= self.flush_interval:
+                    for i in range(0, len(events), self.max_batch):
+                        self._executor.submit(self._deliver, url, events[i:i + self.max_batch], 1)
+                    del pending[url]
+                    del opened[url]
+
+            with self._state_lock:
+                due = []
+                while self._retries and (stopping or self._retries[0][0] <= now):
+                    due.append(heapq.heappop(self._retries))
+            for _, _, url, events, attempt in due:
+                self._executor.submit(self._deliver, url, events, attempt)
+
+            if stopping and self._queue.empty():
+                return
+
+    def _deliver(self, url: str, events: List[dict], attempt: int):
+        try:
+            check_webhook_url(url, self.allow_private)
+        except ValueError as e:
+            with self._state_lock:
+                self.stats["dropped"] += len(events)
+            print(f"Webhook delivery to {url} refused: {e}")
+            return
+
+        try:
+            response = self._session.post(url, json={"events": events}, timeout=self.timeout,
+                                          allow_redirects=False)
+            response.raise_for_status()
+            with self._state_lock:
+                self.stats["batches"] += 1
+                self.stats["delivered"] += len(events)
+            return
+        except Exception as e:
+            error = e
+
+        if attempt >= self.max_attempts or self._stop.is_set():
+            with self._state_lock:
+                self.stats["dropped"] += len(events)
+            print(f"Webhook delivery to {url} failed after {attempt} attempts: {error}")
+            return
+
+        delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        with self._state_lock:
+            self.stats["retries"] += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), url, events, attempt + 1))
+
+
+class AlertEngine:
+    """
+    Tracks the last seen bias/signal per symbol and turns changes into alerts.
+
+    Subscriptions are indexed by (field, symbol, to-value) with "*" wildcards,
+    so each transition only looks up four index buckets instead of scanning
+    every subscription.
+
+    With `db_path` subscriptions are stored in SQLite; the index is reloaded
+    whenever another connection (another worker) changed the table.
+    """
+
+    def __init__(self, dispatcher: Optional[WebhookDispatcher] = None, db_path: str = None,
+                 known_symbols: List[str] = None):
+        self.dispatcher = dispatcher or WebhookDispatcher()
+        self.db_path = db_path
+        self.known_symbols = set(known_symbols) if known_symbols else None
+        self._db = None
+        self._data_version = None
+        self._subscriptions: Dict[str, dict] = {}
+        self._index: Dict[tuple, set] = {}
+        self._last: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Persistence ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS alert_subscriptions (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    to_value TEXT NOT NULL,
+                    from_value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    owner TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            columns = [row["name"] for row in db.execute("PRAGMA table_info(alert_subscriptions)")]
+            if "owner" not in columns:
+                # Databases from before owners existed; their subscriptions keep firing but have no owner
+                db.execute("ALTER TABLE alert_subscriptions ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _reload(self):
+        """Re-read subscriptions if another connection changed them (caller holds the lock)"""
+        if not self.db_path:
+            return
+        db = self._connect()
+        # data_version only changes for commits made by other connections
+        data_version = db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        self._subscriptions, self._index = {}, {}
+        for row in db.execute("SELECT * FROM alert_subscriptions ORDER BY created_at"):
+            self._add({
+                "id": row["id"],
+                "owner": row["owner"],
+                "url": row["url"],
+                "symbol": row["symbol"],
+                "field": row["field"],
+                "to": row["to_value"],
+                "from": row["from_value"],
+            })
+        if self._subscriptions:
+            self.dispatcher.start()
+
+    def _add(self, subscription: dict):
+        key = (subscription["field"], subscription["symbol"], subscription["to"])
+        self._subscriptions[subscription["id"]] = subscription
+        self._index.setdefault(key, set()).add(subscription["id"])
+
+    # ---------- Subscriptions ----------
+
+    def subscribe(self, owner: str, url: str, symbol: str = ANY, field: str = "signal",
+                  to: str = ANY, from_: str = ANY) -> dict:
+        if field not in ALERT_VALUES:
+            raise ValueError(f"Invalid field: {field} (expected one of {', '.join(ALERT_FIELDS)})")
+        symbol = symbol.strip().upper().replace("-", "/") if symbol != ANY else ANY
+        if symbol != ANY and self.known_symbols is not None and symbol not in self.known_symbols:
+            raise ValueError(f"Unknown symbol: {symbol}")
+        check_webhook_url(url, self.dispatcher.allow_private)
+
+        subscription = {
+            "id": uuid.uuid4().hex,
+            "owner": owner,
+            "url": url,
+            "symbol": symbol,
+            "field": field,
+            "to": to.upper() if to != ANY else ANY,
+            "from": from_.upper() if from_ != ANY else ANY,
+        }
+        for name in ("to", "from"):
+            value = subscription[name]
+            if value != ANY and value not in ALERT_VALUES[field]:
+                raise ValueError(f"Invalid {name} value for {field}: {value} "
+                                 f"(expected * or one of {', '.join(ALERT_VALUES[field])})")
+
+        with self._lock:
+            if self.db_path:
+                self._reload()
+                db = self._connect()
+                db.execute(
+                    "INSERT INTO alert_subscriptions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (subscription["id"], url, subscription["symbol"], field,
+                     subscription["to"], subscription["from"], time.time(), owner),
+                )
+                db.commit()
+            self._add(subscription)
+
+        self.dispatcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription_id: str, owner: str) -> bool:
+        """False if the subscription does not exist or belongs to another owner"""
+        with self._lock:
+            self._reload()
+            subscription = self._subscriptions.get(subscription_id)
+            if not subscription or subscription["owner"] != owner:
+                return False
+            del self._subscriptions[subscription_id]
+            if self.db_path:
+                db = self._connect()
+                db.execute("DELETE FROM alert_subscriptions WHERE id = ?", (subscription_id,))
+                db.commit()
+            key = (subscription["field"], subscription["symbol"], subscription["to"])
+            bucket = self._index.get(key)
+            if bucket:
+                bucket.discard(subscription_id)
+                if not bucket:
+                    del self._index[key]
+        return True
+
+    def list_subscriptions(self, owner: str) -> List[dict]:
+        with self._lock:
+            self._reload()
+            return [subscription for subscription in self._subscriptions.values()
+                    if subscription["owner"] == owner]
+
+    # ---------- Transitions ----------
+
+    def seed(self, rows: List[dict]):
+        """
+        Record a snapshot's state without raising alerts, e.g. the warm
+        snapshot loaded at startup, so the first live refresh is compared
+        against it instead of only recording.
+        """
+        with self._lock:
+            for row in rows:
+                self._last[row["symbol"]] = row
+
+    def observe(self, rows: List[dict]) -> List[dict]:
+        """
+        Compare a freshly produced snapshot against the previous one.
+        The first time a symbol is seen only records its state.
+        Returns the transitions found (matching events are queued for delivery).
+        """
+        transitions = []
+        now = time.time()
+
+        with self._lock:
+            self._reload()
+            for row in rows:
+                symbol = row["symbol"]
+                previous = self._last.get(symbol)
+                self._last[symbol] = row
+                if previous is None:
+                    continue
+
+                for field in ALERT_FIELDS:
+                    old, new = previous.get(field), row.get(field)
+                    if old == new:
+                        continue
+                    transition = {"symbol": symbol, "field": field, "from": old, "to": new}
+                    transitions.append(transition)
+                    self._dispatch(transition, row, now)
+
+        return transitions
+
+    def _dispatch(self, transition: dict, row: dict, timestamp: float):
+        field, symbol, to = transition["field"], transition["symbol"], transition["to"]
+        for key in ((field, symbol, to), (field, ANY, to), (field, symbol, ANY), (field, ANY, ANY)):
+            for subscription_id in self._index.get(key, ()):
+                subscription = self._subscriptions[subscription_id]
+                if subscription["from"] not in (ANY, transition["from"]):
+                    continue
+                self.dispatcher.enqueue(subscription["url"], {
+                    "subscription_id": subscription_id,
+                    **transition,
+                    "signal": row.get("signal"),
+                    "daily": row.get("daily"),
+                    "weekly": row.get("weekly"),
+                    "monthly": row.get("monthly"),
+                    "timestamp": timestamp,
+                })
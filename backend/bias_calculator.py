@@ -3,46 +3,85 @@ Bias Calculator - Implements MT4 Trend Bias Logic
 Compares current closed candle (C1) vs previous candle (C2)
 """
 
+import time
+
+# Bias labels ordered by score (index = score + 2)
+BIAS_LABELS = ["STRONG BEAR", "BEAR", "NEUTRAL", "BULL", "STRONG BULL"]
+BIAS_SCORES = {label: i - 2 for i, label in enumerate(BIAS_LABELS)}
+SIGNAL_LABELS = ["SELL", "WAIT", "BUY"]
+
+# rule_engine imports the label constants from this module, so it is
+# imported on first use. The active rule set is kept here for up to
+# rule_engine.CHECK_INTERVAL, which keeps a live call close to a plain if-chain.
+_rule_engine = None
+_active = (None, 0.0)      # (CompiledRules, monotonic time it must be re-checked)
+
+
+def _rules(rules):
+    global _rule_engine, _active
+    if rules is None:
+        compiled, recheck_at = _active
+        now = time.monotonic()
+        if now < recheck_at:
+            return compiled
+    if _rule_engine is None:
+        import rule_engine
+        _rule_engine = rule_engine
+    compiled = _rule_engine.resolve_rules(rules)
+    if rules is None:
+        _active = (compiled, now + _rule_engine.CHECK_INTERVAL)
+    return compiled
+
 def calculate_bias(c1_open: float, c1_high: float, c1_low: float, c1_close: float,
-                   c2_open: float, c2_high: float, c2_low: float, c2_close: float) -> str:
+                   c2_open: float, c2_high: float, c2_low: float, c2_close: float,
+                   rules: str = None) -> str:
     """
     Calculate bias based on candle comparison.
     
     C1 = Last closed candle (yesterday/last week/last month)
     C2 = Candle before C1 (2 days ago/2 weeks ago/2 months ago)
     
-    Priority Order (first match wins):
+    The rules come from the active rule set (see rule_engine; `rules`
+    picks another one by name or passes a rule-set dict). The default set,
+    first match wins:
     1. STRONG BULL: C1.Close > C2.High (clean breakout above)
     2. STRONG BEAR: C1.Close < C2.Low (clean breakdown below)
     3. BEAR: C1.High > C2.High AND C1.Close < C2.High (rejection from high)
     4. BULL: C1.Low < C2.Low AND C1.Close > C2.Low (recovery from low)
-    5. NEUTRAL: Inside bar (within previous range)
+    5. NEUTRAL: anything else (inside bar)
     """
+    compiled, recheck_at = _active
+    if rules is not None or time.monotonic() >= recheck_at:
+        compiled = _rules(rules)
+    return compiled.bias_values(c1_open, c1_high, c1_low, c1_close,
+                                c2_open, c2_high, c2_low, c2_close)
+
+
+def calculate_bias_series(c1_high, c1_low, c1_close, c2_high, c2_low,
+                          c1_open=None, c2_open=None, c2_close=None, rules: str = None):
+    """
+    Vectorized version of calculate_bias for whole histories.
     
-    # STRONG BULL: Clean break above (close > previous high)
-    if c1_close > c2_high:
-        return "STRONG BULL"
-    
-    # STRONG BEAR: Clean break below (close < previous low)
-    if c1_close < c2_low:
-        return "STRONG BEAR"
-    
-    # BEAR: Rejection from high (tested above but failed)
-    if c1_high > c2_high and c1_close < c2_high:
-        return "BEAR"
-    
-    # BULL: Rejection recovery (tested below but recovered)
-    if c1_low < c2_low and c1_close > c2_low:
-        return "BULL"
-    
-    # NEUTRAL: Inside bar (within previous candle range)
-    if c1_high <= c2_high and c1_low >= c2_low:
-        return "NEUTRAL"
-    
-    return "NEUTRAL"
+    Takes equal-length arrays (C1 fields and the matching C2 fields) and
+    returns an int8 array of bias scores (-2 .. 2, see BIAS_SCORES).
+    Same rule set and priority order as calculate_bias. The optional
+    fields are only needed by rule sets that use them. `rules` is a rule-set
+    name or a rule-set dict (rule_sweep passes its variants this way).
+    """
+    c1 = {"high": c1_high, "low": c1_low, "close": c1_close}
+    c2 = {"high": c2_high, "low": c2_low}
+    for candle, field, values in ((c1, "open", c1_open), (c2, "open", c2_open), (c2, "close", c2_close)):
+        if values is not None:
+            candle[field] = values
+    return _rules(rules).bias_series(c1, c2)
 
 
-def get_bias_from_candles(candles: list) -> str:
+def bias_labels(scores) -> list:
+    """Convert an array of bias scores back to label strings"""
+    return [BIAS_LABELS[int(s) + 2] for s in scores]
+
+
+def get_bias_from_candles(candles: list, rules: str = None) -> str:
     """
     Get bias from a list of candle data.
     Expects at least 3 candles, most recent first.
@@ -62,34 +101,24 @@ def get_bias_from_candles(candles: list) -> str:
     
     return calculate_bias(
         c1['open'], c1['high'], c1['low'], c1['close'],
-        c2['open'], c2['high'], c2['low'], c2['close']
+        c2['open'], c2['high'], c2['low'], c2['close'],
+        rules
     )
 
-def calculate_trade_signal(daily: str, weekly: str, monthly: str) -> str:
+def calculate_trade_signal(daily: str, weekly: str, monthly: str, rules: str = None) -> str:
     """
     Calculate trade signal based on bias alignment.
     
+    Rules come from the active rule set (see rule_engine). The default set:
+    
     BUY RULES:
-    - MN: MUST be STRONG BULL
+    - MN: STRONG BULL or BULL
     - W1: STRONG BULL or BULL
     - D1: STRONG BULL or BULL
     
     SELL RULES:
-    - MN: MUST be STRONG BEAR
+    - MN: STRONG BEAR or BEAR
     - W1: STRONG BEAR or BEAR
     - D1: STRONG BEAR or BEAR
     """
-    
-    # Check BUY
-    if monthly in ["STRONG BULL", "BULL"]:
-        if weekly in ["STRONG BULL", "BULL"]:
-            if daily in ["STRONG BULL", "BULL"]:
-                return "BUY"
-                
-    # Check SELL
-    if monthly in ["STRONG BEAR", "BEAR"]:
-        if weekly in ["STRONG BEAR", "BEAR"]:
-            if daily in ["STRONG BEAR", "BEAR"]:
-                return "SELL"
-                
-    return "WAIT"
+    return _rules(rules).signal(daily, weekly, monthly)
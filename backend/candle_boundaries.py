@@ -0,0 +1,269 @@
+"""
+Candle Boundaries - Broker-timezone D1/W1/MN candles from intraday bars
+yfinance daily/weekly/monthly bars use exchange or UTC boundaries, while
+MT4 brokers close the day at their server midnight (New York 17:00 for
+the usual GMT+2/+3 "NY close" servers). This module re-buckets intraday
+bars (1h or finer) into broker D1/W1/MN candles.
+
+For each (broker profile, session) a calendar is precomputed with one
+entry per UTC hour: trading day, week and month bucket plus an in-session
+flag. Assigning a bar to its candle is then a table lookup by hour index,
+and resampling a whole history is one vectorized pass (np.*.reduceat).
+
+Timezone and session offsets must be whole hours (true for New York,
+London, GMT+2 and UTC). Bars finer than an hour are fine.
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+HOUR = 3600
+DAY = 86400
+
+# Broker server clocks. day_start_hour is when the new trading day starts in
+# `tz`: "ny-close" (17:00 New York) is the usual GMT+2/+3 MT4 server with
+# DST, "gmt+2" a fixed GMT+2 server without. sunday_into_monday folds the
+# short Sunday session into Monday's candle.
+BROKER_PROFILES = {
+    "ny-close": {"tz": "America/New_York", "day_start_hour": 17, "sunday_into_monday": False},
+    "gmt+2": {"tz": "Etc/GMT-2", "day_start_hour": 0, "sunday_into_monday": True},
+    "london": {"tz": "Europe/London", "day_start_hour": 0, "sunday_into_monday": True},
+    "utc": {"tz": "UTC", "day_start_hour": 0, "sunday_into_monday": False},
+}
+
+# Trading sessions in their own timezone: weekly open/close as
+# (weekday, hour) with Monday = 0, plus daily breaks as (start_hour, end_hour)
+SESSIONS = {
+    # Spot FX: Sunday 17:00 to Friday 17:00 New York
+    "fx": {"tz": "America/New_York", "open": (6, 17), "close": (4, 17), "breaks": []},
+    # CME Globex metals (GC=F, SI=F): Sunday 18:00 to Friday 17:00 ET, daily 17:00-18:00 break
+    "cme_metals": {"tz": "America/New_York", "open": (6, 18), "close": (4, 17), "breaks": [(17, 18)]},
+}
+
+INSTRUMENT_SESSIONS = {"GC=F": "cme_metals", "SI=F": "cme_metals"}
+
+TIMEFRAMES = ["daily", "weekly", "monthly"]
+
+# Day numbers count from 1970-01-01 (a Thursday): shifting by 4 makes Monday
+# weekday 0, shifting by 3 gives Sunday-based weeks like MT4's W1 bars
+_MONDAY_SHIFT = 4
+_SUNDAY_SHIFT = 3
+
+
+def session_for(ticker: str) -> str:
+    """
+    Session name for a Yahoo ticker (spot FX unless listed). Cross rates
+    ("CROSS:GC=F*USDJPY=X") trade only while their non-FX leg does.
+    """
+    from data_fetcher import parse_cross
+
+    cross = parse_cross(ticker)
+    for leg in (cross[0], cross[2]) if cross else (ticker,):
+        if leg in INSTRUMENT_SESSIONS:
+            return INSTRUMENT_SESSIONS[leg]
+    return "fx"
+
+
+def _hourly_offsets(tz_name: str, hours: np.ndarray) -> np.ndarray:
+    """
+    UTC offset in seconds for each UTC hour in `hours` (ascending epoch seconds).
+    zoneinfo is only consulted once per day plus a bisection around each
+    DST change, not once per hour.
+    """
+    tz = ZoneInfo(tz_name)
+
+    def offset(ts: int) -> int:
+        utcoffset = datetime.fromtimestamp(int(ts), timezone.utc).astimezone(tz).utcoffset()
+        seconds = int(utcoffset.total_seconds())
+        if seconds % HOUR:
+            raise ValueError(f"{tz_name} has a non whole-hour UTC offset ({utcoffset})")
+        return seconds
+
+    first, last = int(hours[0]), int(hours[-1])
+    probes = list(range(first, last + 1, DAY)) + [last]
+    values = [offset(ts) for ts in probes]
+
+    # (effective_from, offset) change points
+    changes = [(first, values[0])]
+    for (a, va), (b, vb) in zip(zip(probes, values), zip(probes[1:], values[1:])):
+        if va == vb:
+            continue
+        lo, hi = a, b               # offset(lo) == va, offset(hi) == vb
+        while hi - lo > HOUR:
+            mid = lo + (hi - lo) // (2 * HOUR) * HOUR
+            if offset(mid) == va:
+                lo = mid
+            else:
+                hi = mid
+        changes.append((hi, vb))
+
+    starts = np.array([start for start, _ in changes], dtype=np.int64)
+    offsets = np.array([value for _, value in changes], dtype=np.int64)
+    return offsets[np.searchsorted(starts, hours, side="right") - 1]
+
+
+class BoundaryCalendar:
+    """
+    Hour-indexed bucket table for one broker profile and session:
+        day[h], week[h], month[h]  bucket ids of UTC hour h (counted from `base`)
+        in_session[h]              whether the instrument trades in that hour
+    """
+
+    def __init__(self, profile: str, session: str, start: int, end: int):
+        if profile not in BROKER_PROFILES:
+            raise ValueError(f"Unknown broker profile: {profile} (expected one of {', '.join(BROKER_PROFILES)})")
+        if session not in SESSIONS:
+            raise ValueError(f"Unknown session: {session}")
+        broker = BROKER_PROFILES[profile]
+        spec = SESSIONS[session]
+
+        self.profile = profile
+        self.session = session
+        self.base = start // HOUR * HOUR
+        hours = np.arange(self.base, end // HOUR * HOUR + HOUR, HOUR, dtype=np.int64)
+        self.end = int(hours[-1]) + HOUR
+
+        # Trading day: broker local time shifted so the day starts at day_start_hour
+        local = hours + _hourly_offsets(broker["tz"], hours)
+        shift = (24 - broker["day_start_hour"]) % 24 * HOUR
+        day = (local + shift) // DAY
+        if broker["sunday_into_monday"]:
+            day = np.where((day - _MONDAY_SHIFT) % 7 == 6, day + 1, day)
+        self.day = day.astype(np.int32)
+        self.week = ((day - _SUNDAY_SHIFT) // 7).astype(np.int32)
+        self.month = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+
+        # Session flag from the session's own local time
+        session_local = hours + _hourly_offsets(spec["tz"], hours)
+        weekday = (session_local // DAY - _MONDAY_SHIFT) % 7
+        hour = session_local % DAY // HOUR
+        week_hour = weekday * 24 + hour
+        open_, close = spec["open"][0] * 24 + spec["open"][1], spec["close"][0] * 24 + spec["close"][1]
+        if open_ > close:       # window wraps over the weekend (Sunday open .. Friday close)
+            in_session = (week_hour >= open_) | (week_hour < close)
+        else:
+            in_session = (week_hour >= open_) & (week_hour < close)
+        for break_start, break_end in spec["breaks"]:
+            in_session &= ~((hour >= break_start) & (hour < break_end))
+        self.in_session = in_session
+
+    def covers(self, start: int, end: int) -> bool:
+        return self.base <= start and end < self.end
+
+    def lookup(self, ts: np.ndarray, timeframe: str) -> tuple:
+        """(bucket ids, in-session mask) for epoch-second timestamps, O(1) per bar"""
+        index = (np.asarray(ts, dtype=np.int64) - self.base) // HOUR
+        table = {"daily": self.day, "weekly": self.week, "monthly": self.month}[timeframe]
+        return table[index], self.in_session[index]
+
+
+_calendars: Dict[tuple, BoundaryCalendar] = {}
+_lock = threading.Lock()
+
+
+def get_calendar(profile: str, session: str, start: int, end: int) -> BoundaryCalendar:
+    """
+    Calendar covering [start, end], cached per (profile, session). Built for
+    whole calendar years with a year of headroom, so growing histories
+    rarely trigger a rebuild.
+    """
+    key = (profile, session)
+    with _lock:
+        calendar = _calendars.get(key)
+        if calendar is None or not calendar.covers(start, end):
+            if calendar is not None:
+                start, end = min(start, calendar.base), max(end, calendar.end - HOUR)
+            first_year = datetime.fromtimestamp(start, timezone.utc).year
+            last_year = datetime.fromtimestamp(end, timezone.utc).year + 1
+            calendar = BoundaryCalendar(
+                profile, session,
+                int(datetime(first_year, 1, 1, tzinfo=timezone.utc).timestamp()),
+                int(datetime(last_year + 1, 1, 1, tzinfo=timezone.utc).timestamp()) - HOUR,
+            )
+            _calendars[key] = calendar
+        return calendar
+
+
+def bucket_dates(buckets, timeframe: str) -> np.ndarray:
+    """Trading dates (datetime64[D]) of buckets: the day, the week's Sunday or the month's 1st"""
+    buckets = np.asarray(buckets, dtype=np.int64)
+    if timeframe == "daily":
+        return buckets.astype("datetime64[D]")
+    if timeframe == "weekly":
+        return (buckets * 7 + _SUNDAY_SHIFT).astype("datetime64[D]")
+    return buckets.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def date_buckets(dates, timeframe: str) -> np.ndarray:
+    """Bucket ids of trading dates, the inverse of bucket_dates"""
+    days = np.asarray(dates).astype("datetime64[D]")
+    if timeframe == "daily":
+        return days.astype(np.int64)
+    if timeframe == "weekly":
+        return (days.astype(np.int64) - _SUNDAY_SHIFT) // 7
+    return days.astype("datetime64[M]").astype(np.int64)
+
+
+def bucket_label(bucket: int, timeframe: str) -> str:
+    """Trading date of one bucket as YYYY-MM-DD"""
+    return str(bucket_dates([bucket], timeframe)[0])
+
+
+def resample(ts, open_, high, low, close, timeframe: str, profile: str = "ny-close",
+             session: str = "fx") -> Dict[str, np.ndarray]:
+    """
+    Re-bucket intraday bars (ascending epoch seconds) into broker candles.
+    Bars outside the session are dropped. Returns columns
+    bucket/ts (first bar)/open/high/low/close/bars, oldest first.
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+    ts = np.asarray(ts, dtype=np.int64)
+    empty = {name: np.empty(0) for name in ["bucket", "ts", "open", "high", "low", "close", "bars"]}
+    if not len(ts):
+        return empty
+
+    calendar = get_calendar(profile, session, int(ts[0]), int(ts[-1]))
+    bucket, in_session = calendar.lookup(ts, timeframe)
+
+    keep = np.flatnonzero(in_session)
+    if not len(keep):
+        return empty
+    bucket = bucket[keep]
+    ts = ts[keep]
+    open_ = np.asarray(open_, dtype=np.float64)[keep]
+    high = np.asarray(high, dtype=np.float64)[keep]
+    low = np.asarray(low, dtype=np.float64)[keep]
+    close = np.asarray(close, dtype=np.float64)[keep]
+
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)]
+    return {
+        "bucket": bucket[starts],
+        "ts": ts[starts],
+        "open": open_[starts],
+        "high": np.maximum.reduceat(high, starts),
+        "low": np.minimum.reduceat(low, starts),
+        "close": close[ends - 1],
+        "bars": ends - starts,
+    }
+
+
+def to_candles(columns: Dict[str, np.ndarray], timeframe: str, count: Optional[int] = None) -> list:
+    """Resampled columns -> data_fetcher candle dicts, newest first"""
+    rows = len(columns["bucket"])
+    first = 0 if count is None else max(rows - count, 0)
+    return [
+        {
+            "open": float(columns["open"][i]),
+            "high": float(columns["high"][i]),
+            "low": float(columns["low"][i]),
+            "close": float(columns["close"][i]),
+            "date": bucket_label(columns["bucket"][i], timeframe),
+        }
+        for i in range(rows - 1, first - 1, -1)
+    ]
@@ -0,0 +1,158 @@
+"""
+Currency Strength - Currency x timeframe strength matrix
+Every pair is BASE/QUOTE, so its bias and its last closed bar's move
+count for the base currency and against the quote currency. Averaging over
+all pairs a currency appears in gives e.g. "USD strong vs all".
+
+Metals (XAU, XAG) are reported separately: a metal/currency pair only
+counts for its metal leg, so gold's swings do not leak into USD, JPY or
+GBP strength.
+
+The pair x currency incidence matrix is built once; each snapshot only
+re-aggregates the pairs that changed since the previous one.
+"""
+
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from bias_calculator import BIAS_SCORES
+
+TIMEFRAMES = ["daily", "weekly", "monthly"]
+
+METALS = {"XAU", "XAG"}
+
+
+def split_pair(symbol: str) -> tuple:
+    """"EUR/USD" -> ("EUR", "USD")"""
+    base, _, quote = symbol.partition("/")
+    return base, quote
+
+
+class CurrencyStrength:
+    """
+    Strength of each currency per timeframe:
+        bias   - mean bias score (-2 STRONG BEAR .. +2 STRONG BULL) of its pairs,
+                 with the sign flipped where the currency is the quote
+        change - mean % move of its pairs (C1 close vs C2 close, i.e. the
+                 last closed bar), same sign convention
+    Currencies are ranked on currency pairs only, metals on their own pairs.
+
+    update(snapshot, closes) recomputes at most once per snapshot
+    (epoch, version): an adopted snapshot from another lineage can reuse a
+    version number.
+    closes(symbol, timeframe) returns the pair's candles (newest first) or [].
+    """
+
+    def __init__(self, symbols: List[str]):
+        self.symbols = list(symbols)
+        legs = {currency for symbol in self.symbols for currency in split_pair(symbol)}
+        self.currencies = sorted(legs - METALS)
+        self.metals = sorted(legs & METALS)
+        # Columns: currencies first, then metals
+        column = {currency: j for j, currency in enumerate(self.currencies + self.metals)}
+
+        # incidence[i, j] = +1 if leg j is the base of pair i, -1 if it is the quote.
+        # In a metal/currency pair only the metal leg counts.
+        self.incidence = np.zeros((len(self.symbols), len(column)))
+        for i, symbol in enumerate(self.symbols):
+            base, quote = split_pair(symbol)
+            mixed = (base in METALS) != (quote in METALS)
+            if not mixed or base in METALS:
+                self.incidence[i, column[base]] = 1
+            if not mixed or quote in METALS:
+                self.incidence[i, column[quote]] = -1
+        self.pair_counts = np.abs(self.incidence).sum(axis=0)
+
+        # Per-pair inputs and their per-leg sums (pairs/legs x timeframes)
+        self.bias = np.zeros((len(self.symbols), len(TIMEFRAMES)))
+        self.change = np.zeros((len(self.symbols), len(TIMEFRAMES)))
+        self.bias_sum = np.zeros((len(column), len(TIMEFRAMES)))
+        self.change_sum = np.zeros((len(column), len(TIMEFRAMES)))
+
+        self.epoch = None
+        self.version = None
+        self.generated_at = None
+        self.stats = {"updates": 0, "pairs_changed": 0}
+        self._lock = threading.Lock()
+
+    def update(self, snapshot: dict, closes: Callable[[str, str], List[dict]]) -> bool:
+        """Fold a new snapshot in; returns False if this (epoch, version) was already applied"""
+        epoch, version = snapshot.get("epoch"), snapshot.get("version", 0)
+        with self._lock:
+            if (epoch, version) == (self.epoch, self.version):
+                return False
+
+            rows = {row["symbol"]: row for row in snapshot["data"]}
+            bias = self.bias.copy()
+            change = self.change.copy()
+            for i, symbol in enumerate(self.symbols):
+                row = rows.get(symbol)
+                for k, timeframe in enumerate(TIMEFRAMES):
+                    if row:
+                        bias[i, k] = BIAS_SCORES.get(row.get(timeframe), 0)
+                    move = self._latest_move(closes(symbol, timeframe))
+                    if move is not None:
+                        change[i, k] = move
+
+            # Only pairs whose inputs moved contribute a delta
+            changed = np.flatnonzero((bias != self.bias).any(axis=1) | (change != self.change).any(axis=1))
+            if len(changed):
+                delta = self.incidence[changed].T
+                self.bias_sum += delta @ (bias[changed] - self.bias[changed])
+                self.change_sum += delta @ (change[changed] - self.change[changed])
+                self.bias, self.change = bias, change
+
+            self.epoch, self.version = epoch, version
+            self.generated_at = snapshot.get("generated_at")
+            self.stats["updates"] += 1
+            self.stats["pairs_changed"] += len(changed)
+            return True
+
+    @staticmethod
+    def _latest_move(candles: List[dict]) -> Optional[float]:
+        """
+        % change of the last closed bar (C1) vs the one before it (C2).
+        candles[0] is the bar still forming, like in the bias calculation.
+        """
+        if not candles or len(candles) < 3 or not candles[2]["close"]:
+            return None
+        return (candles[1]["close"] / candles[2]["close"] - 1) * 100
+
+    def matrix(self) -> dict:
+        with self._lock:
+            counts = np.maximum(self.pair_counts, 1)[:, None]
+            bias = self.bias_sum / counts
+            change = self.change_sum / counts
+            legs = self.currencies + self.metals
+
+            def cells(j):
+                return {
+                    timeframe: {
+                        "bias": round(float(bias[j, k]), 3),
+                        "change": round(float(change[j, k]), 3),
+                    }
+                    for k, timeframe in enumerate(TIMEFRAMES)
+                }
+
+            def ranking(first, last):
+                # Strongest first, per timeframe (bias, then price move as tie-break)
+                return {
+                    timeframe: [legs[first + j] for j in np.lexsort((-change[first:last, k], -bias[first:last, k]))]
+                    for k, timeframe in enumerate(TIMEFRAMES)
+                }
+
+            n = len(self.currencies)
+            return {
+                "version": self.version,
+                "epoch": self.epoch,
+                "generated_at": self.generated_at,
+                "currencies": self.currencies,
+                "metals": self.metals,
+                "pairs": {leg: int(count) for leg, count in zip(legs, self.pair_counts)},
+                "strength": {currency: cells(j) for j, currency in enumerate(self.currencies)},
+                "ranking": ranking(0, n),
+                "metal_strength": {metal: cells(n + j) for j, metal in enumerate(self.metals)},
+                "metal_ranking": ranking(n, len(legs)),
+            }
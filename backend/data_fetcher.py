@@ -3,10 +3,47 @@ Data Fetcher - yfinance Integration
 Uses Yahoo Finance data (free, no key required)
 """
 
-import yfinance as yf
-from datetime import datetime
-from typing import List, Dict
-import pandas as pd
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
+
+import profiling
+import shared_cache
+import upstream_scheduler
+
+# yfinance (and pandas behind it) take ~1s to import, so they are only
+# loaded when a fetch actually has to go upstream. See _yfinance().
+yf = None
+
+# When set (e.g. http://127.0.0.1:8900), candles are read from a Yahoo chart
+# API at that base URL with plain requests instead of yfinance. Used by
+# loadtest.py to point the app at its local stub.
+CHART_URL_ENV = "YAHOO_CHART_URL"
+_http = threading.local()
+
+# When set to a candle_boundaries profile (e.g. "ny-close"), D1/W1/MN candles
+# are built from 1h bars on that broker's day/week/month boundaries instead
+# of Yahoo's own daily/weekly/monthly bars, so bias matches the MT4 chart.
+BROKER_TIMEZONE_ENV = "BROKER_TIMEZONE"
+
+# Broker candles of all three timeframes are built from one 1h series per
+# ticker, downloaded once and reused while it is younger than the daily TTL
+BROKER_INTRADAY_PERIOD = "1y"
+_intraday_cache: Dict[str, tuple] = {}        # yahoo_symbol -> (fetched_at, (ts, open, high, low, close))
+_intraday_locks: Dict[str, threading.Lock] = {}
+
+# Candle cache: (yahoo_symbol, timeframe, broker profile) -> {"fetched_at": epoch, "candles": [...]}
+# Only C1/C2 matter for bias and they only change when a bar closes,
+# so the cache can live for minutes even on the daily timeframe.
+CACHE_TTL = {
+    "daily": 300,
+    "weekly": 900,
+    "monthly": 3600,
+}
+_candle_cache: Dict[tuple, dict] = {}
+_cache_lock = threading.Lock()
 
 # Symbol mapping: Your format -> Yahoo Finance format
 SYMBOL_MAP = {
@@ -26,41 +63,240 @@ SYMBOL_MAP = {
     "XAG/USD": "SI=F",                    # Silver Futures
 }
 
+CROSS_PREFIX = "CROSS:"
+
 def get_all_symbols() -> List[str]:
     """Get list of all tracked symbols"""
     return list(SYMBOL_MAP.keys())
 
-def fetch_direct_candles(yahoo_symbol: str, timeframe: str) -> List[dict]:
+
+def parse_cross(ticker: str) -> Optional[tuple]:
     """
-    Fetch candles directly from Yahoo Finance for a single symbol
+    "CROSS:GC=F*USDJPY=X" -> ("GC=F", "*", "USDJPY=X"), None for a plain ticker.
+    Raises ValueError for a malformed formula.
     """
-    # Map timeframe to yfinance interval and period
-    tf_map = {
-        "daily":   {"interval": "1d", "period": "1mo"},
-        "weekly":  {"interval": "1wk", "period": "3mo"},
-        "monthly": {"interval": "1mo", "period": "1y"}, 
-    }
+    if not ticker.startswith(CROSS_PREFIX):
+        return None
+    formula = ticker[len(CROSS_PREFIX):]
+    op = "*" if "*" in formula else "/"
+    legs = formula.split(op)
+    if len(legs) != 2 or not all(legs):
+        raise ValueError(f"Invalid cross-rate formula: {formula}")
+    return legs[0], op, legs[1]
+
+
+def combine_cross(base, op: str, quote):
+    """Cross value from its legs: floats, numpy arrays or DataFrames alike"""
+    return base * quote if op == "*" else base / quote
+
+
+def download_history(period: str = "max", interval: str = "1d") -> Dict[str, "pd.DataFrame"]:
+    """
+    Open/High/Low/Close frames (oldest first) for every tracked symbol via
+    yfinance, cross rates combined from their legs. Daily and longer bars
+    are indexed by their naive exchange-local date, so legs quoted in
+    different exchange timezones line up; intraday bars keep their UTC time.
+    """
+    intraday = interval.endswith(("m", "h"))
+
+    def download(ticker):
+        df = _yfinance().Ticker(ticker).history(period=period, interval=interval)
+        if df.empty:
+            raise ValueError(f"No data found for {ticker}")
+        df = df[["Open", "High", "Low", "Close"]].dropna()
+        if intraday:
+            df.index = df.index.tz_convert("UTC")
+        else:
+            # The exchange-local date (a London-midnight bar is the previous day in UTC)
+            df.index = df.index.tz_localize(None).normalize()
+        return df[~df.index.duplicated(keep="last")]
+
+    history = {}
+    for symbol, ticker in SYMBOL_MAP.items():
+        try:
+            cross = parse_cross(ticker)
+            if cross:
+                base, op, quote = cross
+                base_df, quote_df = download(base).align(download(quote), join="inner")
+                df = combine_cross(base_df, op, quote_df)
+            else:
+                df = download(ticker)
+        except Exception as e:
+            print(f"Error downloading {symbol}: {e}")
+            continue
+        if not df.empty:
+            history[symbol] = df.dropna()
+    return history
+
+
+def broker_profile() -> Optional[str]:
+    """
+    Configured candle_boundaries profile, None for Yahoo's own bars.
+    Raises ValueError for an unknown name, before anything is downloaded.
+    """
+    profile = os.environ.get(BROKER_TIMEZONE_ENV) or None
+    if profile:
+        from candle_boundaries import BROKER_PROFILES
+        if profile not in BROKER_PROFILES:
+            raise ValueError(f"Invalid {BROKER_TIMEZONE_ENV}: {profile} "
+                             f"(expected one of {', '.join(BROKER_PROFILES)})")
+    return profile
+
+
+def _shared_key(yahoo_symbol: str, timeframe: str) -> str:
+    """Shared cache key; broker candles are kept apart from Yahoo's own bars"""
+    profile = broker_profile()
+    return f"candles:{yahoo_symbol}:{timeframe}" + (f":{profile}" if profile else "")
+
+
+def _local_key(yahoo_symbol: str, timeframe: str) -> tuple:
+    """Process-local cache key; like _shared_key it includes the broker profile (None = Yahoo bars)"""
+    return (yahoo_symbol, timeframe, broker_profile())
+
+
+def _yfinance():
+    """Import yfinance on first use"""
+    global yf
+    if yf is None:
+        import yfinance
+        yf = yfinance
+    return yf
+
+
+def get_cached_candles(yahoo_symbol: str, timeframe: str, max_age: float = None) -> List[dict]:
+    """
+    Return cached candles if they are younger than max_age seconds
+    (defaults to the timeframe TTL), otherwise None.
+    """
+    entry = _candle_cache.get(_local_key(yahoo_symbol, timeframe))
+    if not entry:
+        return None
+    if max_age is None:
+        max_age = CACHE_TTL.get(timeframe, 300)
+    if time.time() - entry["fetched_at"] > max_age:
+        return None
+    return entry["candles"]
+
+
+def export_candle_cache() -> List[dict]:
+    """Candle cache as a JSON-friendly list (for persisting to disk)"""
+    with _cache_lock:
+        return [
+            {"symbol": symbol, "timeframe": timeframe, "profile": profile, **entry}
+            for (symbol, timeframe, profile), entry in _candle_cache.items()
+        ]
+
+
+def import_candle_cache(entries: List[dict]) -> int:
+    """
+    Load entries produced by export_candle_cache, keeping newer in-memory ones.
+    Entries without a profile are Yahoo bars.
+    """
+    loaded = 0
+    with _cache_lock:
+        for entry in entries:
+            key = (entry["symbol"], entry["timeframe"], entry.get("profile"))
+            current = _candle_cache.get(key)
+            if current and current["fetched_at"] >= entry["fetched_at"]:
+                continue
+            _candle_cache[key] = {"fetched_at": entry["fetched_at"], "candles": entry["candles"]}
+            loaded += 1
+    return loaded
+
+# Map timeframe to yfinance interval and period
+TIMEFRAME_CONFIG = {
+    "daily":   {"interval": "1d", "period": "1mo"},
+    "weekly":  {"interval": "1wk", "period": "3mo"},
+    "monthly": {"interval": "1mo", "period": "1y"}, 
+}
+
+def fetch_direct_candles(yahoo_symbol: str, timeframe: str, background: bool = False) -> List[dict]:
+    """
+    Fetch candles directly from Yahoo Finance for a single symbol
     
-    config = tf_map.get(timeframe)
+    Lookup order: process-local cache, then the shared cache tier (other
+    workers' results). On a miss only the worker elected for this key goes
+    upstream, through the upstream scheduler (rate limit, priority, retry).
+    If upstream keeps failing the last known candles are returned instead
+    of nothing, so a failed fetch does not turn into a NEUTRAL reading.
+    """
+    config = TIMEFRAME_CONFIG.get(timeframe)
     if not config:
         print(f"Invalid timeframe: {timeframe}")
         return []
 
+    cached = get_cached_candles(yahoo_symbol, timeframe)
+    if cached:
+        return cached
+
+    profile = broker_profile()
+    if profile:
+        download = lambda: download_broker_candles(yahoo_symbol, timeframe, profile)
+    else:
+        download = lambda: download_candles(yahoo_symbol, config)
+
+    def refresh():
+        priority = upstream_scheduler.job_priority(
+            timeframe, _staleness(yahoo_symbol, timeframe), background
+        )
+        candles = upstream_scheduler.get_scheduler().run(
+            ("candles", yahoo_symbol, timeframe),
+            download,
+            priority,
+        )
+        return {"fetched_at": time.time(), "candles": candles}
+
     try:
-        # Fetch data
-        ticker = yf.Ticker(yahoo_symbol)
+        entry = shared_cache.get_cache().get_or_refresh(
+            _shared_key(yahoo_symbol, timeframe), CACHE_TTL.get(timeframe, 300), refresh
+        )
+    except Exception as e:
+        print(f"Error fetching {yahoo_symbol}: {e}")
+        entry = None
+    
+    with _cache_lock:
+        key = (yahoo_symbol, timeframe, profile)
+        current = _candle_cache.get(key)
+        if not entry:
+            # Upstream failed: fall back to the last known candles, however old
+            return current["candles"] if current else []
+        if not current or current["fetched_at"] < entry["fetched_at"]:
+            _candle_cache[key] = entry
+    return entry["candles"]
+
+def _staleness(yahoo_symbol: str, timeframe: str) -> float:
+    """Age of the cached series in TTLs (inf if never fetched)"""
+    entry = _candle_cache.get(_local_key(yahoo_symbol, timeframe))
+    if not entry:
+        return float("inf")
+    return (time.time() - entry["fetched_at"]) / CACHE_TTL.get(timeframe, 300)
+
+def download_candles(yahoo_symbol: str, config: dict) -> List[dict]:
+    """
+    Download candles from Yahoo Finance (newest first, last 5 bars)
+    Raises on errors and empty results so the scheduler can retry.
+    """
+    chart_url = os.environ.get(CHART_URL_ENV)
+    if chart_url:
+        return download_chart_candles(yahoo_symbol, config, chart_url)
+    
+    # Fetch data
+    with profiling.span("download", "upstream", symbol=yahoo_symbol, interval=config["interval"]):
+        ticker = _yfinance().Ticker(yahoo_symbol)
         df = ticker.history(period=config["period"], interval=config["interval"])
-        
-        if df.empty:
-            print(f"No data found for {yahoo_symbol}")
-            return []
+    
+    if df.empty:
+        raise ValueError(f"No data found for {yahoo_symbol}")
 
+    with profiling.span("convert", "upstream", symbol=yahoo_symbol, rows=len(df)):
         # Sort descending (newest first)
         df = df.sort_index(ascending=False)
         
         # Convert to our dictionary format
         candles = []
         for index, row in df.iterrows():
+            if row[["Open", "High", "Low", "Close"]].isna().any():
+                continue
             date_str = index.strftime("%Y-%m-%d")
             
             candles.append({
@@ -74,65 +310,149 @@ def fetch_direct_candles(yahoo_symbol: str, timeframe: str) -> List[dict]:
             # We only need the last few candles for bias calculation
             if len(candles) >= 5:
                 break
-                
-        return candles
+            
+    return candles
 
-    except Exception as e:
-        print(f"Error fetching {yahoo_symbol}: {e}")
-        return []
+def download_chart_candles(yahoo_symbol: str, config: dict, base_url: str) -> List[dict]:
+    """
+    Same as download_candles, but reads the chart API directly:
+        GET {base_url}/v8/finance/chart/{symbol}?interval=1d&range=1mo
+    """
+    with profiling.span("download", "upstream", symbol=yahoo_symbol, interval=config["interval"]):
+        result = _chart_request(yahoo_symbol, config["interval"], config["period"], base_url)
+    
+    with profiling.span("convert", "upstream", symbol=yahoo_symbol):
+        quote = result["indicators"]["quote"][0]
+        offset = result.get("meta", {}).get("gmtoffset", 0)
+        
+        candles = []
+        for i in range(len(result["timestamp"]) - 1, -1, -1):
+            # Yahoo leaves fields of a row null (often just open/high/low); skip incomplete rows
+            if any(quote[field][i] is None for field in ("open", "high", "low", "close")):
+                continue
+            candles.append({
+                "open": float(quote["open"][i]),
+                "high": float(quote["high"][i]),
+                "low": float(quote["low"][i]),
+                "close": float(quote["close"][i]),
+                "date": datetime.fromtimestamp(result["timestamp"][i] + offset, timezone.utc).strftime("%Y-%m-%d"),
+            })
+            if len(candles) >= 5:
+                break
+    
+    return candles
+
+def _chart_request(yahoo_symbol: str, interval: str, period: str, base_url: str) -> dict:
+    """First chart API result for a symbol (raises if there is none)"""
+    import requests
+    
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = _http.session = requests.Session()
+    
+    response = session.get(
+        f"{base_url.rstrip('/')}/v8/finance/chart/{yahoo_symbol}",
+        params={"interval": interval, "range": period},
+        timeout=10,
+    )
+    response.raise_for_status()
+    results = response.json()["chart"]["result"]
+    if not results or not results[0].get("timestamp"):
+        raise ValueError(f"No data found for {yahoo_symbol}")
+    return results[0]
 
-def calculate_cross_rate(formula: str, timeframe: str) -> List[dict]:
+def download_intraday(yahoo_symbol: str, period: str, interval: str = "1h") -> tuple:
+    """Intraday bars as numpy arrays: (ts epoch seconds ascending, open, high, low, close)"""
+    import numpy as np
+    
+    chart_url = os.environ.get(CHART_URL_ENV)
+    with profiling.span("download", "upstream", symbol=yahoo_symbol, interval=interval):
+        if chart_url:
+            result = _chart_request(yahoo_symbol, interval, period, chart_url)
+            quote = result["indicators"]["quote"][0]
+            ts = np.array(result["timestamp"], dtype=np.int64)
+            prices = [np.array(quote[name], dtype=np.float64) for name in ("open", "high", "low", "close")]
+        else:
+            df = _yfinance().Ticker(yahoo_symbol).history(period=period, interval=interval)
+            if df.empty:
+                raise ValueError(f"No data found for {yahoo_symbol}")
+            ts = df.index.tz_convert("UTC").values.astype("datetime64[s]").astype(np.int64)
+            prices = [df[name].values.astype(np.float64) for name in ("Open", "High", "Low", "Close")]
+    
+    # Missing quotes come back as None/NaN, in any of the four fields
+    keep = ~np.isnan(np.vstack(prices)).any(axis=0)
+    order = np.argsort(ts[keep], kind="stable")
+    return (ts[keep][order], *(values[keep][order] for values in prices))
+
+def broker_intraday(yahoo_symbol: str) -> tuple:
+    """
+    The ticker's BROKER_INTRADAY_PERIOD of 1h bars, shared by its D1/W1/MN
+    refreshes: downloaded at most once per daily TTL, and concurrent
+    callers for the same ticker wait for one download.
+    """
+    with _cache_lock:
+        lock = _intraday_locks.setdefault(yahoo_symbol, threading.Lock())
+    with lock:
+        cached = _intraday_cache.get(yahoo_symbol)
+        if cached and time.time() - cached[0] < CACHE_TTL["daily"]:
+            return cached[1]
+        bars = download_intraday(yahoo_symbol, BROKER_INTRADAY_PERIOD)
+        _intraday_cache[yahoo_symbol] = (time.time(), bars)
+        return bars
+
+def download_broker_candles(yahoo_symbol: str, timeframe: str, profile: str) -> List[dict]:
+    """
+    Broker-timezone candles (newest first, last 5 bars): the shared 1h
+    series re-bucketed by candle_boundaries. The oldest bucket is dropped
+    because the period can start inside it.
+    """
+    import candle_boundaries
+    
+    # Resolve the calendar first, so a bad profile or session fails before any download
+    session = candle_boundaries.session_for(yahoo_symbol)
+    now = int(time.time())
+    candle_boundaries.get_calendar(profile, session, now - 366 * 86400, now)
+    
+    ts, open_, high, low, close = broker_intraday(yahoo_symbol)
+    with profiling.span("resample", "upstream", symbol=yahoo_symbol, timeframe=timeframe, rows=len(ts)):
+        columns = candle_boundaries.resample(
+            ts, open_, high, low, close, timeframe, profile, session
+        )
+        candles = candle_boundaries.to_candles({name: values[1:] for name, values in columns.items()},
+                                               timeframe, count=5)
+    if not candles:
+        raise ValueError(f"No {timeframe} candles for {yahoo_symbol} in {profile} time")
+    return candles
+
+def calculate_cross_rate(formula: str, timeframe: str, background: bool = False) -> List[dict]:
     """
     Calculate synthetic cross-rate candles from two component pairs
     Formula format: "BASE*QUOTE" or "BASE/QUOTE"
     Example: "GC=F*USDJPY=X" or "GC=F/GBPUSD=X"
     """
     try:
-        # Parse formula
-        if "*" in formula:
-            base_symbol, quote_symbol = formula.split("*")
-            operation = "multiply"
-        elif "/" in formula:
-            base_symbol, quote_symbol = formula.split("/")
-            operation = "divide"
-        else:
-            print(f"Invalid cross-rate formula: {formula}")
-            return []
+        base_symbol, op, quote_symbol = parse_cross(CROSS_PREFIX + formula)
         
         # Fetch both component pairs
-        base_candles = fetch_direct_candles(base_symbol, timeframe)
-        quote_candles = fetch_direct_candles(quote_symbol, timeframe)
+        base_candles = fetch_direct_candles(base_symbol, timeframe, background)
+        quote_candles = fetch_direct_candles(quote_symbol, timeframe, background)
         
         if not base_candles or not quote_candles:
             print(f"Failed to fetch data for cross-rate: {formula}")
             return []
         
         # Calculate synthetic candles
-        synthetic_candles = []
-        min_length = min(len(base_candles), len(quote_candles))
+        with profiling.span("cross_rate", "app", formula=formula):
+            synthetic_candles = []
+            min_length = min(len(base_candles), len(quote_candles))
         
-        for i in range(min_length):
-            base = base_candles[i]
-            quote = quote_candles[i]
-            
-            if operation == "multiply":
-                synthetic = {
-                    "open": base["open"] * quote["open"],
-                    "high": base["high"] * quote["high"],
-                    "low": base["low"] * quote["low"],
-                    "close": base["close"] * quote["close"],
-                    "date": base["date"]
-                }
-            else:  # divide
-                synthetic = {
-                    "open": base["open"] / quote["open"],
-                    "high": base["high"] / quote["high"],
-                    "low": base["low"] / quote["low"],
-                    "close": base["close"] / quote["close"],
-                    "date": base["date"]
-                }
-            
-            synthetic_candles.append(synthetic)
+            for i in range(min_length):
+                base = base_candles[i]
+                quote = quote_candles[i]
+                synthetic = {field: combine_cross(base[field], op, quote[field])
+                             for field in ("open", "high", "low", "close")}
+                synthetic["date"] = base["date"]
+                synthetic_candles.append(synthetic)
         
         return synthetic_candles
     
@@ -140,10 +460,45 @@ def calculate_cross_rate(formula: str, timeframe: str) -> List[dict]:
         print(f"Error calculating cross-rate {formula}: {e}")
         return []
 
-def get_timeframe_candles(display_symbol: str, timeframe: str) -> List[dict]:
+def get_known_candles(display_symbol: str, timeframe: str) -> List[dict]:
+    """
+    Last known candles (any age) without going upstream: process-local
+    cache, then the shared cache tier. Cross rates are combined from their
+    components' known candles (closes only). Returns [] if nothing is known.
+    """
+    def known(yahoo_symbol):
+        entry = _candle_cache.get(_local_key(yahoo_symbol, timeframe))
+        if entry:
+            return entry["candles"]
+        cache = shared_cache.get_cache()
+        if cache.is_shared:
+            entry = cache.get(_shared_key(yahoo_symbol, timeframe))
+            if entry:
+                return entry["candles"]
+        return []
+
+    yahoo_symbol = SYMBOL_MAP.get(display_symbol)
+    if not yahoo_symbol:
+        return []
+    cross = parse_cross(yahoo_symbol)
+    if not cross:
+        return known(yahoo_symbol)
+
+    base_symbol, op, quote_symbol = cross
+    base_candles, quote_candles = known(base_symbol), known(quote_symbol)
+    return [
+        {
+            "date": base["date"],
+            "close": combine_cross(base["close"], op, quote["close"]),
+        }
+        for base, quote in zip(base_candles, quote_candles)
+    ]
+
+def get_timeframe_candles(display_symbol: str, timeframe: str, background: bool = False) -> List[dict]:
     """
     Get candles for a specific timeframe using yfinance
     Supports both direct symbols and cross-rate calculations
+    background=True marks warmup/refresh work that user requests may overtake
     """
     
     # Get Yahoo ticker or cross-rate formula
@@ -153,13 +508,13 @@ def get_timeframe_candles(display_symbol: str, timeframe: str) -> List[dict]:
         return []
     
     # Check if this is a cross-rate calculation
-    if yahoo_symbol.startswith("CROSS:"):
-        formula = yahoo_symbol.replace("CROSS:", "")
+    if yahoo_symbol.startswith(CROSS_PREFIX):
+        formula = yahoo_symbol[len(CROSS_PREFIX):]
         print(f"[{display_symbol} {timeframe}] Calculating cross-rate: {formula}")
-        return calculate_cross_rate(formula, timeframe)
+        return calculate_cross_rate(formula, timeframe, background)
     
     # Direct fetch for regular symbols
-    candles = fetch_direct_candles(yahoo_symbol, timeframe)
+    candles = fetch_direct_candles(yahoo_symbol, timeframe, background)
     
     if candles:
         latest = candles[0]
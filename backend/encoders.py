@@ -0,0 +1,239 @@
+"""
+Encoders - Response encodings for bias and candle endpoints
+JSON (default), MessagePack and Arrow IPC stream, picked via the Accept
+header or a ?format= query parameter.
+
+msgpack and pyarrow are optional; a format is only offered when its
+package is installed. Both binary formats are columnar and send bias and
+signal labels as small integer codes plus the label dictionary
+(code = index into BIAS_LABELS / SIGNAL_LABELS).
+"""
+
+import importlib.util
+import json
+from datetime import date
+from typing import Optional
+
+from bias_calculator import BIAS_LABELS, SIGNAL_LABELS
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+FORMATS = {"json": JSON, "msgpack": MSGPACK, "arrow": ARROW}
+ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+
+_MODULES = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+
+TIMEFRAMES = ["daily", "weekly", "monthly"]
+CANDLE_FIELDS = ["open", "high", "low", "close"]
+
+
+class NotAcceptable(Exception):
+    """Requested format is unknown or its package is not installed"""
+
+
+def available_formats() -> list:
+    """Media types that can be produced in this environment"""
+    return [JSON] + [media for media, module in _MODULES.items()
+                     if importlib.util.find_spec(module) is not None]
+
+
+def negotiate(accept: Optional[str], format_param: Optional[str] = None) -> str:
+    """
+    Pick the response media type.
+    An explicit ?format= wins and must be available; otherwise the Accept
+    header is honoured by q-value and anything unsupported falls back to JSON.
+    """
+    available = available_formats()
+
+    if format_param:
+        media = FORMATS.get(format_param.lower())
+        if media not in available:
+            raise NotAcceptable(f"Unsupported format: {format_param} "
+                                f"(available: {', '.join(k for k, v in FORMATS.items() if v in available)})")
+        return media
+
+    if not accept:
+        return JSON
+
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media, _, params = part.strip().partition(";")
+        media = ALIASES.get(media.strip().lower(), media.strip().lower())
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        candidates.append((-quality, position, media))
+
+    for negative_quality, _, media in sorted(candidates):
+        if negative_quality == 0:
+            break
+        if media in available:
+            return media
+    return JSON
+
+
+def _bias_code(label: str) -> int:
+    return BIAS_LABELS.index(label) if label in BIAS_LABELS else BIAS_LABELS.index("NEUTRAL")
+
+
+def _signal_code(label: str) -> int:
+    return SIGNAL_LABELS.index(label) if label in SIGNAL_LABELS else SIGNAL_LABELS.index("WAIT")
+
+
+# ====================================
+# /api/bias
+# ====================================
+
+def encode_bias(payload: dict, media: str) -> bytes:
+    """Encode {"data": [...], "count": n, ...} from /api/bias"""
+    if media == JSON:
+        return json.dumps(payload).encode()
+
+    rows = payload["data"]
+    columns = {"symbol": [row["symbol"] for row in rows]}
+    for timeframe in TIMEFRAMES:
+        columns[timeframe] = [_bias_code(row.get(timeframe)) for row in rows]
+    columns["signal"] = [_signal_code(row.get("signal")) for row in rows]
+    meta = {k: v for k, v in payload.items() if k != "data"}
+
+    if media == MSGPACK:
+        import msgpack
+        return msgpack.packb({
+            **meta,
+            "labels": {"bias": BIAS_LABELS, "signal": SIGNAL_LABELS},
+            "columns": columns,
+        })
+
+    if media == ARROW:
+        import pyarrow as pa
+        bias_dictionary = pa.array(BIAS_LABELS)
+        arrays = [pa.array(columns["symbol"], type=pa.string())]
+        for timeframe in TIMEFRAMES:
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(columns[timeframe], type=pa.int8()), bias_dictionary))
+        arrays.append(pa.DictionaryArray.from_arrays(pa.array(columns["signal"], type=pa.int8()), pa.array(SIGNAL_LABELS)))
+        table = pa.Table.from_arrays(arrays, names=["symbol"] + TIMEFRAMES + ["signal"])
+        return _arrow_stream(table, meta)
+
+    raise NotAcceptable(f"Unsupported media type: {media}")
+
+
+# ====================================
+# /api/bias/{symbol} and /api/debug/{symbol}
+# ====================================
+
+def encode_candles(payload: dict, media: str) -> bytes:
+    """
+    Encode per-symbol candle payloads. Accepts both shapes:
+        {"symbol": s, "daily": {"bias": b, "candles": [...]}, ...}   (/api/bias/{symbol})
+        {"symbol": s, "daily": [...], ...}                           (/api/debug/{symbol})
+    """
+    if media == JSON:
+        return json.dumps(payload).encode()
+
+    series = {}
+    for timeframe in TIMEFRAMES:
+        value = payload.get(timeframe) or []
+        if isinstance(value, dict):
+            series[timeframe] = (value.get("bias"), value.get("candles") or [])
+        else:
+            series[timeframe] = (None, value)
+    has_bias = any(bias is not None for bias, _ in series.values())
+
+    if media == MSGPACK:
+        import msgpack
+        timeframes = {}
+        for timeframe, (bias, candles) in series.items():
+            columns = {"date": [c["date"] for c in candles]}
+            for field in CANDLE_FIELDS:
+                columns[field] = [c[field] for c in candles]
+            if has_bias:
+                columns["bias"] = _bias_code(bias)
+            timeframes[timeframe] = columns
+        packed = {"symbol": payload["symbol"], **timeframes}
+        if has_bias:
+            packed["labels"] = {"bias": BIAS_LABELS}
+        return msgpack.packb(packed)
+
+    if media == ARROW:
+        import pyarrow as pa
+        timeframe_codes, bias_codes = [], []
+        columns = {"date": []}
+        columns.update({field: [] for field in CANDLE_FIELDS})
+        for index, (timeframe, (bias, candles)) in enumerate(series.items()):
+            for c in candles:
+                timeframe_codes.append(index)
+                bias_codes.append(_bias_code(bias))
+                columns["date"].append(date.fromisoformat(c["date"]))
+                for field in CANDLE_FIELDS:
+                    columns[field].append(c[field])
+
+        arrays = [pa.DictionaryArray.from_arrays(pa.array(timeframe_codes, type=pa.int8()), pa.array(TIMEFRAMES))]
+        names = ["timeframe"]
+        if has_bias:
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(bias_codes, type=pa.int8()), pa.array(BIAS_LABELS)))
+            names.append("bias")
+        arrays.append(pa.array(columns["date"], type=pa.date32()))
+        arrays.extend(pa.array(columns[field], type=pa.float64()) for field in CANDLE_FIELDS)
+        names.extend(["date"] + CANDLE_FIELDS)
+        return _arrow_stream(pa.Table.from_arrays(arrays, names=names), {"symbol": payload["symbol"]})
+
+    raise NotAcceptable(f"Unsupported media type: {media}")
+
+
+# ====================================
+# /api/history/{symbol}
+# ====================================
+
+def encode_history(payload: dict, media: str) -> bytes:
+    """
+    Encode {"symbol": s, ..., "columns": {"ts": array, "open": array, ...}}
+    where the columns are numpy arrays (memmap views). "bias", if present,
+    holds bias scores (-2 .. 2). Arrow wraps the arrays without copying.
+    """
+    columns = payload["columns"]
+    meta = {k: v for k, v in payload.items() if k != "columns"}
+
+    if media in (JSON, MSGPACK):
+        lists = {name: values.tolist() for name, values in columns.items()}
+        if "bias" in lists:
+            lists["bias"] = [score + 2 for score in lists["bias"]]
+        if media == JSON:
+            if "bias" in lists:
+                lists["bias"] = [BIAS_LABELS[code] for code in lists["bias"]]
+            return json.dumps({**meta, "columns": lists}).encode()
+        import msgpack
+        packed = {**meta, "columns": lists}
+        if "bias" in lists:
+            packed["labels"] = {"bias": BIAS_LABELS}
+        return msgpack.packb(packed)
+
+    if media == ARROW:
+        import pyarrow as pa
+        arrays = [pa.array(columns["ts"]).cast(pa.timestamp("s"))]
+        names = ["ts"]
+        for field in CANDLE_FIELDS:
+            arrays.append(pa.array(columns[field]))
+            names.append(field)
+        if "bias" in columns:
+            codes = pa.array((columns["bias"] + 2).astype("int8"))
+            arrays.append(pa.DictionaryArray.from_arrays(codes, pa.array(BIAS_LABELS)))
+            names.append("bias")
+        return _arrow_stream(pa.Table.from_arrays(arrays, names=names), meta)
+
+    raise NotAcceptable(f"Unsupported media type: {media}")
+
+
+def _arrow_stream(table, meta: dict) -> bytes:
+    import pyarrow as pa
+    table = table.replace_schema_metadata({k: json.dumps(v) for k, v in meta.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,388 @@
+"""
+History Store - Memory-mapped columnar candle history
+One directory per (ticker, interval) with fixed-width column files:
+
+    ts.i8                  int64 bar open time (epoch seconds, ascending)
+    open/high/low/close.f8 float64 prices
+    fences.i8              every FENCE_STRIDE-th timestamp (date-range index)
+    meta.json              {"ticker", "interval", "rows", "first", "last"}
+
+Columns are opened with numpy.memmap, so slices are views into the page
+cache: only the pages a query touches become resident, however many
+symbols and years are stored. Date-range lookups binary-search the small
+fence index in memory and then a single FENCE_STRIDE block of timestamps.
+
+Usage:
+    cd backend
+    python history_store.py ingest --interval 1d --period max     # every SYMBOL_MAP ticker
+    python history_store.py ingest --source csv                    # verification CSVs
+    python history_store.py ingest --interval 1h --period 730d
+    python history_store.py resample --broker ny-close             # 1h -> 1d/1wk/1mo-ny-close
+    python history_store.py info
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".state", "history")
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+PRICE_COLUMNS_TITLE = ["Open", "High", "Low", "Close"]     # pandas / yfinance column names
+FENCE_STRIDE = 1024
+
+INTERVALS = ["1h", "1d", "1wk", "1mo"]
+
+# Broker-timezone series derived from 1h history are stored as "<interval>-<profile>", e.g. "1d-ny-close"
+RESAMPLED_INTERVALS = {"daily": "1d", "weekly": "1wk", "monthly": "1mo"}
+
+
+def stored_intervals() -> List[str]:
+    """Every interval name a series can be stored under (plain and broker-resampled)"""
+    from candle_boundaries import BROKER_PROFILES
+
+    return INTERVALS + [f"{interval}-{profile}" for interval in RESAMPLED_INTERVALS.values()
+                        for profile in BROKER_PROFILES]
+
+
+def _safe_name(ticker: str) -> str:
+    """"CROSS:GC=F*USDJPY=X" -> "CROSS_GC=F_x_USDJPY=X" (file-system safe, reversible enough)"""
+    name = ticker.replace("*", "_x_").replace("/", "_d_").replace(":", "_")
+    return re.sub(r"[^A-Za-z0-9._=^-]", "_", name)
+
+
+def _to_epoch(value) -> Optional[int]:
+    """Epoch seconds from an int, ISO date/datetime string or None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(np.datetime64(str(value), "s").astype(np.int64))
+
+
+class HistorySeries:
+    """
+    Read-only view of one (ticker, interval). Columns are np.memmap arrays;
+    slice() returns views, nothing is copied.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self.columns = {"ts": self._map("ts.i8", np.int64)}
+        for column in PRICE_COLUMNS:
+            self.columns[column] = self._map(f"{column}.f8", np.float64)
+        # The fence index is tiny (rows / FENCE_STRIDE), keep it in memory
+        self.fences = np.fromfile(os.path.join(path, "fences.i8"), dtype=np.int64)
+
+    def _map(self, filename: str, dtype):
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, filename), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def locate(self, ts: int, side: str = "left") -> int:
+        """Row position of `ts` (np.searchsorted semantics) via the fence index"""
+        ts_column = self.columns["ts"]
+        block = max(int(np.searchsorted(self.fences, ts, side="right")) - 1, 0)
+        start = block * FENCE_STRIDE
+        end = min(start + FENCE_STRIDE + 1, self.rows)
+        return start + int(np.searchsorted(ts_column[start:end], ts, side=side))
+
+    def range_index(self, start=None, end=None) -> tuple:
+        """(i, j) so that rows i..j-1 have start <= ts < end"""
+        start, end = _to_epoch(start), _to_epoch(end)
+        i = self.locate(start, "left") if start is not None else 0
+        j = self.locate(end, "left") if end is not None else self.rows
+        return i, max(i, j)
+
+    def slice(self, start=None, end=None) -> Dict[str, np.ndarray]:
+        """Column views for start <= ts < end (ISO dates or epoch seconds)"""
+        i, j = self.range_index(start, end)
+        return {name: column[i:j] for name, column in self.columns.items()}
+
+    def tail(self, count: int) -> Dict[str, np.ndarray]:
+        return {name: column[max(self.rows - count, 0):] for name, column in self.columns.items()}
+
+
+class HistoryStore:
+    """Directory of HistorySeries, one per (ticker, interval)"""
+
+    def __init__(self, root: str = None):
+        self.root = root or os.environ.get("HISTORY_DIR", DEFAULT_HISTORY_DIR)
+        self._open: Dict[tuple, tuple] = {}       # (ticker, interval) -> (mtime, HistorySeries)
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str, interval: str) -> str:
+        """Series directory; interval and ticker are checked so neither can leave the store root"""
+        if interval not in stored_intervals():
+            raise ValueError(f"Invalid interval: {interval} (expected one of {', '.join(stored_intervals())})")
+        name = _safe_name(ticker)
+        if name.strip(".") == "":
+            raise ValueError(f"Invalid ticker: {ticker}")
+        return os.path.join(self.root, name, interval)
+
+    # ---------- Reading ----------
+
+    def series(self, ticker: str, interval: str) -> Optional[HistorySeries]:
+        """Open (or reuse) the memmapped series, None if it was never written"""
+        path = self._path(ticker, interval)
+        try:
+            mtime = os.path.getmtime(os.path.join(path, "meta.json"))
+        except OSError:
+            return None
+        key = (ticker, interval)
+        with self._lock:
+            cached = self._open.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            series = HistorySeries(path)
+            self._open[key] = (mtime, series)
+            return series
+
+    def list(self) -> List[dict]:
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in sorted(os.listdir(self.root)):
+            for interval in sorted(os.listdir(os.path.join(self.root, name))):
+                meta_path = os.path.join(self.root, name, interval, "meta.json")
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        entries.append(json.load(f))
+        return entries
+
+    # ---------- Writing ----------
+
+    def write(self, ticker: str, interval: str, ts, open_, high, low, close, replace: bool = False) -> int:
+        """
+        Merge bars into the stored series (a bar with an existing timestamp
+        replaces it). Bars that are all newer than the stored ones are
+        appended in place; anything else rewrites the series atomically.
+        replace=True drops the stored bars instead of merging.
+        Returns the stored row count.
+        """
+        incoming = {
+            "ts": np.asarray(ts, dtype=np.int64),
+            "open": np.asarray(open_, dtype=np.float64),
+            "high": np.asarray(high, dtype=np.float64),
+            "low": np.asarray(low, dtype=np.float64),
+            "close": np.asarray(close, dtype=np.float64),
+        }
+        order = np.argsort(incoming["ts"], kind="stable")
+        incoming = {name: values[order] for name, values in incoming.items()}
+        # Last occurrence of a duplicated timestamp wins
+        keep = np.append(incoming["ts"][1:] != incoming["ts"][:-1], True) if len(order) else np.array([], bool)
+        incoming = {name: values[keep] for name, values in incoming.items()}
+
+        path = self._path(ticker, interval)
+        with self._lock:
+            current = HistorySeries(path) if os.path.exists(os.path.join(path, "meta.json")) else None
+            self._open.pop((ticker, interval), None)
+
+            if replace:
+                rows = self._rewrite(path, ticker, interval, incoming)
+            elif current and current.rows and len(incoming["ts"]) and incoming["ts"][0] > current.columns["ts"][-1]:
+                rows = self._append(path, current, incoming)
+            else:
+                if current and current.rows:
+                    merged = {name: np.concatenate([current.columns[name], values])
+                              for name, values in incoming.items()}
+                    # Stable sort keeps stored bars before incoming ones, take the last of each ts
+                    order = np.argsort(merged["ts"], kind="stable")
+                    merged = {name: values[order] for name, values in merged.items()}
+                    keep = np.append(merged["ts"][1:] != merged["ts"][:-1], True)
+                    incoming = {name: values[keep] for name, values in merged.items()}
+                rows = self._rewrite(path, ticker, interval, incoming)
+        return rows
+
+    def _append(self, path: str, current: HistorySeries, incoming: dict) -> int:
+        for name, values in incoming.items():
+            filename = "ts.i8" if name == "ts" else f"{name}.f8"
+            with open(os.path.join(path, filename), "ab") as f:
+                f.write(values.tobytes())
+        rows = current.rows + len(incoming["ts"])
+        ts = np.memmap(os.path.join(path, "ts.i8"), dtype=np.int64, mode="r", shape=(rows,))
+        ts[::FENCE_STRIDE].tofile(os.path.join(path, "fences.i8"))
+        self._write_meta(path, current.meta["ticker"], current.meta["interval"], rows, ts)
+        return rows
+
+    def _rewrite(self, path: str, ticker: str, interval: str, columns: dict) -> int:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        columns["ts"].tofile(os.path.join(tmp_path, "ts.i8"))
+        for name in PRICE_COLUMNS:
+            columns[name].tofile(os.path.join(tmp_path, f"{name}.f8"))
+        columns["ts"][::FENCE_STRIDE].tofile(os.path.join(tmp_path, "fences.i8"))
+        self._write_meta(tmp_path, ticker, interval, len(columns["ts"]), columns["ts"])
+
+        # Swap directories; readers holding the old memmaps keep their (unlinked) files
+        old_path = f"{path}.{os.getpid()}.old"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return len(columns["ts"])
+
+    @staticmethod
+    def _write_meta(path: str, ticker: str, interval: str, rows: int, ts):
+        meta = {
+            "ticker": ticker,
+            "interval": interval,
+            "rows": rows,
+            "first": int(ts[0]) if rows else None,
+            "last": int(ts[-1]) if rows else None,
+        }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    def write_frame(self, ticker: str, interval: str, df, replace: bool = False) -> int:
+        """Store a pandas DataFrame with a DatetimeIndex and Open/High/Low/Close columns"""
+        index = df.index.tz_convert("UTC").tz_localize(None) if df.index.tz is not None else df.index
+        ts = index.values.astype("datetime64[s]").astype(np.int64)
+        return self.write(ticker, interval, ts, df["Open"].values, df["High"].values,
+                          df["Low"].values, df["Close"].values, replace=replace)
+
+
+# ====================================
+# Analytics on top of the store
+# ====================================
+
+def bias_history(series: HistorySeries, start=None, end=None, rules: str = None) -> dict:
+    """
+    Bias of every bar in [start, end) against the bar before it (C1 vs C2),
+    computed on memmap views with the active rule set. Returns the bars'
+    column views plus "bias" (scores -2 .. 2).
+    """
+    from bias_calculator import calculate_bias_series
+
+    i, j = series.range_index(start, end)
+    i = max(i, 1)                          # the first stored bar has no C2
+    j = max(j, i)
+    c1 = {name: column[i:j] for name, column in series.columns.items()}
+    c2 = {name: column[i - 1:j - 1] for name, column in series.columns.items()}
+    scores = calculate_bias_series(
+        c1["high"], c1["low"], c1["close"], c2["high"], c2["low"],
+        c1_open=c1["open"], c2_open=c2["open"], c2_close=c2["close"], rules=rules,
+    )
+    return {**c1, "bias": scores}
+
+
+def resample_history(store: HistoryStore, profile: str, source: str = "1h", tickers: List[str] = None) -> dict:
+    """
+    Re-bucket stored intraday series into broker D1/W1/MN series with
+    candle_boundaries (one vectorized pass per series and timeframe).
+    Each bar is stored at 00:00 UTC of its broker trading date (the day, the
+    week's Sunday or the month's 1st, like live broker candles), not at its
+    first intraday bar, which usually falls on the previous calendar day.
+    The oldest bucket is left out because the intraday history can start
+    inside it. Every run rebuilds the derived series from the whole 1h series.
+    """
+    import candle_boundaries
+
+    if tickers is None:
+        tickers = [meta["ticker"] for meta in store.list() if meta["interval"] == source]
+    written = {}
+    for ticker in tickers:
+        series = store.series(ticker, source)
+        if series is None or series.rows < 2:
+            continue
+        session = candle_boundaries.session_for(ticker)
+        for timeframe, interval in RESAMPLED_INTERVALS.items():
+            columns = candle_boundaries.resample(
+                series.columns["ts"], series.columns["open"], series.columns["high"],
+                series.columns["low"], series.columns["close"], timeframe, profile, session,
+            )
+            name = f"{interval}-{profile}"
+            dates = candle_boundaries.bucket_dates(columns["bucket"][1:], timeframe)
+            written[(ticker, name)] = store.write(
+                ticker, name, dates.astype("datetime64[s]").astype(np.int64), columns["open"][1:],
+                columns["high"][1:], columns["low"][1:], columns["close"][1:], replace=True,
+            )
+        print(f"{ticker:24} {session:10} " + "  ".join(
+            f"{interval}: {written[(ticker, f'{interval}-{profile}')]}" for interval in RESAMPLED_INTERVALS.values()
+        ))
+    return written
+
+
+_store = None
+
+
+def get_store() -> HistoryStore:
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+    return _store
+
+
+# ====================================
+# Ingest CLI
+# ====================================
+
+def ingest_yahoo(store: HistoryStore, interval: str = "1d", period: str = "max", replace: bool = False) -> dict:
+    """
+    Download every SYMBOL_MAP ticker (cross rates are materialised under their
+    formula). Daily and longer bars are stored at 00:00 UTC of their date.
+    """
+    from data_fetcher import SYMBOL_MAP, download_history
+
+    written = {}
+    for symbol, df in download_history(period, interval).items():
+        ticker = SYMBOL_MAP[symbol]
+        written[ticker] = store.write_frame(ticker, interval, df, replace)
+        print(f"{symbol:10} {ticker:22} {written[ticker]} rows")
+    return written
+
+
+def ingest_csv(store: HistoryStore) -> dict:
+    """Verification CSVs (daily) under their CSV symbol, e.g. XAUUSD"""
+    from rule_sweep import load_csv_history
+
+    written = {}
+    for symbol, df in load_csv_history().items():
+        written[symbol] = store.write_frame(symbol, "1d", df[PRICE_COLUMNS_TITLE].dropna())
+        print(f"{symbol:10} {written[symbol]} rows")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped candle history store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="download or import history")
+    ingest.add_argument("--source", choices=["yahoo", "csv"], default="yahoo")
+    ingest.add_argument("--interval", choices=INTERVALS, default="1d")
+    ingest.add_argument("--period", default="max", help="yfinance period, e.g. 5y or max")
+    ingest.add_argument("--replace", action="store_true", help="rebuild stored series instead of merging")
+    resample = sub.add_parser("resample", help="build broker-timezone D1/W1/MN series from 1h history")
+    resample.add_argument("--broker", default="ny-close", help="candle_boundaries profile, e.g. ny-close or gmt+2")
+    resample.add_argument("--source", choices=["1h"], default="1h")
+    sub.add_parser("info", help="list stored series")
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.command == "ingest":
+        if args.source == "csv":
+            ingest_csv(store)
+        else:
+            ingest_yahoo(store, args.interval, args.period, args.replace)
+    elif args.command == "resample":
+        resample_history(store, args.broker, args.source)
+    else:
+        for meta in store.list():
+            first = np.datetime64(meta["first"], "s") if meta["first"] is not None else None
+            last = np.datetime64(meta["last"], "s") if meta["last"] is not None else None
+            print(f"{meta['ticker']:24} {meta['interval']:12} {meta['rows']:>8} rows  {first} .. {last}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Load Test - Reproducible capacity numbers for the API
+Starts a local stub of the Yahoo chart API, runs the API server against it
+(YAHOO_CHART_URL) and drives it with concurrent clients, then reports
+throughput, latency percentiles and upstream calls per dashboard request.
+
+Usage:
+    cd backend
+    python loadtest.py                                     # 50 clients, 20s, /api/bias
+    python loadtest.py --clients 200 --workers 3 --cache-backend mmap
+    python loadtest.py --clients 200 --workers 3 --cache-backend redis   # local RESP stand-in unless REDIS_URL is set
+    python loadtest.py --latency 0.4 --error-rate 0.05 --stub-rate 10 --snapshot-max-age 5
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from upstream_scheduler import TokenBucket
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Rough price levels so stub candles look like the real instruments
+STUB_PRICES = {
+    "EURUSD=X": 1.08, "GBPUSD=X": 1.27, "USDJPY=X": 150.0, "USDCHF=X": 0.88,
+    "USDCAD=X": 1.36, "AUDUSD=X": 0.66, "NZDUSD=X": 0.61,
+    "GC=F": 2400.0, "SI=F": 29.0,
+}
+
+# Daily volatility used for the random walk (fraction of price)
+STUB_VOLATILITY = {"1h": 0.0012, "1d": 0.006, "1wk": 0.014, "1mo": 0.03}
+
+RANGE_UNITS = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+INTERVAL_DAYS = {"1h": 1 / 24, "1d": 1, "1wk": 7, "1mo": 30}
+
+
+# ====================================
+# Yahoo chart API stub
+# ====================================
+
+def _bar_times(interval: str, count: int) -> List[datetime]:
+    """Open times of the last `count` bars (oldest first), aligned like Yahoo"""
+    now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    times = []
+    if interval == "1mo":
+        year, month = now.year, now.month
+        for _ in range(count):
+            times.append(datetime(year, month, 1, tzinfo=timezone.utc))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    elif interval == "1wk":
+        monday = now - timedelta(days=now.weekday())
+        times = [monday - timedelta(weeks=i) for i in range(count)]
+    elif interval == "1h":
+        # FX hours: Sunday 22:00 to Friday 22:00 UTC
+        hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        while len(times) < count:
+            weekday = hour.weekday()
+            if not (weekday == 5 or (weekday == 4 and hour.hour >= 22) or (weekday == 6 and hour.hour < 22)):
+                times.append(hour)
+            hour -= timedelta(hours=1)
+    else:
+        day = now
+        while len(times) < count:
+            if day.weekday() < 5:
+                times.append(day)
+            day -= timedelta(days=1)
+    return times[::-1]
+
+
+def stub_chart(symbol: str, interval: str, range_: str) -> dict:
+    """
+    Deterministic chart response for a symbol: a random walk seeded by
+    (symbol, interval), so every run and every worker sees the same bars.
+    """
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", range_ or "1mo")
+    days = int(match.group(1)) * RANGE_UNITS[match.group(2)] if match else 30
+    count = max(3, math.ceil(days / INTERVAL_DAYS.get(interval, 1)))
+    if interval in ("1d", "1h"):
+        count = max(3, round(count * 5 / 7))
+
+    seed = int(hashlib.sha1(f"{symbol}:{interval}".encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    volatility = STUB_VOLATILITY.get(interval, 0.006)
+    price = STUB_PRICES.get(symbol, 100.0)
+
+    quote = {"open": [], "high": [], "low": [], "close": [], "volume": []}
+    for _ in range(count):
+        open_ = price
+        close = open_ * (1 + rng.gauss(0, volatility))
+        quote["open"].append(round(open_, 5))
+        quote["close"].append(round(close, 5))
+        quote["high"].append(round(max(open_, close) * (1 + abs(rng.gauss(0, volatility / 2))), 5))
+        quote["low"].append(round(min(open_, close) * (1 - abs(rng.gauss(0, volatility / 2))), 5))
+        quote["volume"].append(0)
+        price = close
+
+    timestamps = [int(t.timestamp()) for t in _bar_times(interval, count)]
+    return {"chart": {"result": [{
+        "meta": {"symbol": symbol, "currency": "USD", "gmtoffset": 0,
+                 "dataGranularity": interval, "range": range_},
+        "timestamp": timestamps,
+        "indicators": {"quote": [quote]},
+    }], "error": None}}
+
+
+class ChartStub:
+    """
+    In-process HTTP stand-in for query1.finance.yahoo.com/v8/finance/chart.
+
+        stub = ChartStub(latency=0.2, error_rate=0.05, rate_limit=10).start()
+        os.environ["YAHOO_CHART_URL"] = stub.url
+
+    latency/jitter:  seconds added to every response (jitter is +/- uniform)
+    error_rate:      fraction of requests answered with HTTP 500
+    rate_limit:      requests per second before answering HTTP 429 (None = unlimited)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.1,
+                 jitter: float = 0.05, error_rate: float = 0.0, rate_limit: float = None,
+                 seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, rate_limit) if rate_limit else None
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0}
+        self.per_symbol: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = stub.handle(self.path)
+                payload = json.dumps(body).encode() if isinstance(body, dict) else body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json" if isinstance(body, dict) else "text/plain")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.allow_reuse_address = True
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="chart-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, path: str) -> tuple:
+        """(status, body) for a request path"""
+        parsed = urlparse(path)
+        match = re.fullmatch(r"/v8/finance/chart/([^/]+)", parsed.path)
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+
+        if not match:
+            return 404, {"chart": {"result": None, "error": {"code": "Not Found", "description": path}}}
+        symbol = match.group(1)
+        with self._lock:
+            self.per_symbol[symbol] = self.per_symbol.get(symbol, 0) + 1
+
+        if self.bucket and self.bucket.try_acquire():
+            with self._lock:
+                self.stats["throttled"] += 1
+            return 429, "Too Many Requests"
+
+        time.sleep(delay)
+        if failed:
+            with self._lock:
+                self.stats["errors"] += 1
+            return 500, {"chart": {"result": None, "error": {"code": "Internal Server Error",
+                                                             "description": "stub error"}}}
+
+        query = parse_qs(parsed.query)
+        with self._lock:
+            self.stats["ok"] += 1
+        return 200, stub_chart(symbol, query.get("interval", ["1d"])[0], query.get("range", ["1mo"])[0])
+
+
+# ====================================
+# API server under test
+# ====================================
+
+def start_server(port: int, workers: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """Run the API with uvicorn in a separate process (like production)"""
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, **env},
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url: str, timeout: float = 30) -> float:
+    """Poll /api/health until the server answers; returns seconds waited"""
+    import requests
+
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).ok:
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+# ====================================
+# Load generation
+# ====================================
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def drive(url: str, clients: int, duration: float, think_time: float = 0.0) -> dict:
+    """
+    `clients` threads request `url` back to back (plus think_time) for
+    `duration` seconds. Returns latencies (ms) and status counts.
+    """
+    import requests
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = session.get(url, timeout=60).status_code
+            except requests.RequestException:
+                status = "error"
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if think_time:
+                time.sleep(think_time)
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies, "statuses": statuses}
+
+
+def run(clients: int = 50, duration: float = 20, workers: int = 1, path: str = "/api/bias",
+        port: int = 8799, latency: float = 0.1, jitter: float = 0.05, error_rate: float = 0.0,
+        stub_rate: float = None, snapshot_max_age: float = 60, cache_backend: str = "memory",
+        think_time: float = 0.0, env: Dict[str, str] = None) -> dict:
+    """
+    Start stub + server, warm up with one request, drive load, return the report.
+    cache_backend="redis" without a REDIS_URL starts shared_cache.LocalRespServer
+    for the workers to share.
+    """
+    import requests
+
+    stub = ChartStub(latency=latency, jitter=jitter, error_rate=error_rate, rate_limit=stub_rate).start()
+    resp_server = None
+    if cache_backend == "redis" and not (env or {}).get("REDIS_URL") and not os.environ.get("REDIS_URL"):
+        from shared_cache import LocalRespServer
+        resp_server = LocalRespServer().start()
+        env = {**(env or {}), "REDIS_URL": resp_server.url}
+    state_dir = tempfile.mkdtemp(prefix="loadtest-")
+    server_env = {
+        "YAHOO_CHART_URL": stub.url,
+        "STATE_DIR": state_dir,                              # cold start, no snapshot on disk
+        "CACHE_BACKEND": cache_backend,
+        "CACHE_DIR": os.path.join(state_dir, "cache"),      # never reuse a previous run's mmap cache
+        "SNAPSHOT_MAX_AGE": str(snapshot_max_age),
+        **(env or {}),
+    }
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(state_dir, "server.log")
+    server = start_server(port, workers, server_env, log_path)
+
+    try:
+        ready = wait_ready(base_url)
+
+        # First dashboard load: pays for the cold snapshot
+        started = time.perf_counter()
+        requests.get(base_url + path, timeout=120)
+        cold_ms = (time.perf_counter() - started) * 1000
+        cold_upstream = stub.stats["requests"]
+
+        result = drive(base_url + path, clients, duration, think_time)
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        stub.stop()
+        if resp_server:
+            resp_server.stop()
+
+    with open(log_path, errors="replace") as f:
+        cache_errors = sum("Shared cache" in line and "failed" in line for line in f)
+
+    latencies = sorted(result["latencies"])
+    total = len(latencies)
+    ok = result["statuses"].get(200, 0)
+    upstream = stub.stats["requests"] - cold_upstream
+    return {
+        "path": path,
+        "clients": clients,
+        "workers": workers,
+        "duration_s": round(result["elapsed"], 2),
+        "requests": total,
+        "ok": ok,
+        "statuses": {str(k): v for k, v in result["statuses"].items()},
+        "throughput_rps": round(total / result["elapsed"], 1) if result["elapsed"] else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(latencies[-1], 1) if latencies else float("nan"),
+        },
+        "server_ready_s": round(ready, 2),
+        "cold_request_ms": round(cold_ms, 1),
+        "upstream": {
+            "cold_start_calls": cold_upstream,
+            "calls": upstream,
+            "calls_per_request": round(upstream / total, 4) if total else 0.0,
+            **{k: v for k, v in stub.stats.items() if k != "requests"},
+        },
+        "cache_errors": cache_errors,
+        "server_log": log_path,
+    }
+
+
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    upstream = report["upstream"]
+    print(f"\n{report['path']}: {report['clients']} clients, {report['workers']} worker(s), "
+          f"{report['duration_s']}s")
+    print(f"  requests     {report['requests']} ({report['ok']} ok, statuses {report['statuses']})")
+    print(f"  throughput   {report['throughput_rps']} req/s")
+    print(f"  latency      p50 {latency['p50']}ms  p95 {latency['p95']}ms  "
+          f"p99 {latency['p99']}ms  max {latency['max']}ms")
+    print(f"  cold start   ready after {report['server_ready_s']}s, first request "
+          f"{report['cold_request_ms']}ms, {upstream['cold_start_calls']} upstream calls")
+    print(f"  upstream     {upstream['calls']} calls under load "
+          f"({upstream['calls_per_request']} per request), "
+          f"{upstream['throttled']} throttled, {upstream['errors']} errors")
+    if report["cache_errors"]:
+        print(f"  WARNING      {report['cache_errors']} shared cache errors, see the server log")
+    print(f"  server log   {report['server_log']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API against a local Yahoo chart stub")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--path", default="/api/bias", help="endpoint each client requests")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub response latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="stub latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub 500s")
+    parser.add_argument("--stub-rate", type=float, default=None, help="stub rate limit (req/s, 429 beyond)")
+    parser.add_argument("--snapshot-max-age", type=float, default=60,
+                        help="SNAPSHOT_MAX_AGE for the server (low values force refreshes under load)")
+    parser.add_argument("--cache-backend", default="memory", choices=["memory", "mmap", "redis"])
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a client's requests (s)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(
+        clients=args.clients, duration=args.duration, workers=args.workers, path=args.path,
+        port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        stub_rate=args.stub_rate, snapshot_max_age=args.snapshot_max_age,
+        cache_backend=args.cache_backend, think_time=args.think_time,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,29 @@ Candle Bias Forex - FastAPI Backend
 Main server for bias calculation API
 """
 
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from typing import Dict, List
+from pydantic import BaseModel
+import asyncio
+import concurrent.futures
+import functools
 import os
 import data_fetcher
+import encoders
+import profiling
+import rule_engine
+import shared_cache
+import upstream_scheduler
+from alerts import AlertEngine, ALERT_FIELDS
 from bias_calculator import get_bias_from_candles, calculate_trade_signal
+from snapshot_store import SnapshotStore
+from watchlists import FILTER_VALUES, IndexCache, WatchlistStore, validate_filters
 
 app = FastAPI(
     title="Candle Bias Forex API",
@@ -25,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
 # Serve frontend static files
@@ -37,6 +53,106 @@ if os.path.exists(frontend_path):
 else:
     print(f"Warning: Frontend path does not exist: {frontend_path}")
 
+# Refuse to start with an unknown BROKER_TIMEZONE rather than fail every fetch
+if data_fetcher.broker_profile():
+    print(f"Broker candles: {data_fetcher.broker_profile()}")
+
+# Last computed bias snapshot (persisted across restarts)
+snapshot_store = SnapshotStore(max_age=float(os.environ.get("SNAPSHOT_MAX_AGE", 60)))
+_refresh_task = None
+
+# Bias/signal transition alerts (webhooks), subscriptions in SQLite next to the snapshot
+alert_engine = AlertEngine(
+    db_path=os.environ.get("ALERTS_DB", os.path.join(snapshot_store.state_dir, "alerts.db")),
+    known_symbols=data_fetcher.get_all_symbols(),
+)
+
+# Personal watchlists (SQLite next to the snapshot) and the bitset index they resolve against
+watchlist_store = WatchlistStore(
+    os.environ.get("WATCHLIST_DB", os.path.join(snapshot_store.state_dir, "watchlists.db")),
+    known_symbols=data_fetcher.get_all_symbols(),
+)
+snapshot_index = IndexCache()
+
+# One pool for per-symbol work across all refreshes
+symbol_executor = concurrent.futures.ThreadPoolExecutor(max_workers=10, thread_name_prefix="symbol")
+
+# Currency x timeframe strength, built on first use (imports numpy)
+_currency_strength = None
+
+# Shared-tier lock that elects the worker refreshing the snapshot
+REFRESH_KEY = "refresh:bias"
+REFRESH_LEASE = 120
+
+# Cold start timings, reported by /api/health
+startup_metrics = {
+    "import_ms": None,
+    "startup_ms": None,
+    "warm_snapshot": False,
+    "first_request_ms": None,
+    "first_request_path": None,
+}
+
+
+class WatchlistBody(BaseModel):
+    owner: str = None
+    name: str = None
+    symbols: List[str] = None
+    style: str = None
+    filters: Dict[str, List[str]] = None
+
+
+class AlertSubscription(BaseModel):
+    owner: str = None
+    url: str
+    symbol: str = "*"
+    field: str = "signal"
+    to: str = "*"
+    from_: str = "*"
+
+
+@app.on_event("startup")
+async def load_warm_snapshot():
+    """Load the last snapshot from disk and refresh it in the background"""
+    startup_metrics["warm_snapshot"] = snapshot_store.load()
+    if startup_metrics["warm_snapshot"]:
+        # Transitions between the saved snapshot and the first live one still alert
+        alert_engine.seed(snapshot_store.snapshot["data"])
+    schedule_refresh()
+    startup_metrics["startup_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    print(f"Startup complete in {startup_metrics['startup_ms']}ms "
+          f"(warm snapshot: {startup_metrics['warm_snapshot']})")
+
+
+@app.middleware("http")
+async def measure_first_request(request: Request, call_next):
+    """Record the latency of the first request served after startup"""
+    if startup_metrics["first_request_ms"] is not None:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    if startup_metrics["first_request_ms"] is None:
+        startup_metrics["first_request_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        startup_metrics["first_request_path"] = request.url.path
+    return response
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give each request an id (returned as X-Request-ID) that every span
+    recorded for it carries, plus one span per request while tracing is on
+    """
+    request_id = profiling.new_request_id(request.headers.get("x-request-id"))
+    if not profiling.tracer.enabled:
+        response = await call_next(request)
+    else:
+        with profiling.span("request", "http", method=request.method, path=request.url.path) as span:
+            response = await call_next(request)
+            span.set(status=response.status_code)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 
 @app.get("/")
 async def root():
@@ -49,7 +165,12 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "startup": startup_metrics,
+        "snapshot_age": round(snapshot_store.age(), 1) if snapshot_store.snapshot else None,
+        "upstream": upstream_scheduler.get_scheduler().stats,
+    }
 
 
 @app.get("/api/test")
@@ -71,14 +192,26 @@ async def get_symbols():
     return {"symbols": data_fetcher.get_all_symbols()}
 
 
-@app.get("/api/bias/{symbol}")
-async def get_symbol_bias(symbol: str):
+def encoded_response(request: Request, cache_key: tuple, build_payload, encode,
+                     cache: bool = True) -> Response:
     """
-    Get bias for a specific symbol across all timeframes.
-    Symbol format: EUR/USD, XAU/USD, etc.
+    Encode a payload in the negotiated format (JSON, MessagePack or Arrow).
+    With cache=True the encoded body is reused until the next snapshot.
     """
-    symbol = symbol.upper().replace("-", "/")
+    try:
+        media = encoders.negotiate(request.headers.get("accept"), request.query_params.get("format"))
+    except encoders.NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
     
+    def build():
+        return encode(build_payload(), media)
+    
+    body = snapshot_store.encoded(cache_key + (media,), build) if cache else build()
+    return Response(content=body, media_type=media, headers={"Vary": "Accept"})
+
+
+def symbol_bias_payload(symbol: str, rules: str = None) -> dict:
+    """Bias and last 2 candles per timeframe for one symbol"""
     result = {
         "symbol": symbol,
         "daily": {"bias": "NEUTRAL", "candles": []},
@@ -89,7 +222,7 @@ async def get_symbol_bias(symbol: str):
     for timeframe in ["daily", "weekly", "monthly"]:
         candles = data_fetcher.get_timeframe_candles(symbol, timeframe)
         if candles and len(candles) >= 2:
-            bias = get_bias_from_candles(candles)
+            bias = get_bias_from_candles(candles, rules)
             result[timeframe] = {
                 "bias": bias,
                 "candles": candles[:2]  # Return last 2 candles for reference
@@ -98,12 +231,8 @@ async def get_symbol_bias(symbol: str):
     return result
 
 
-@app.get("/api/debug/{symbol}")
-async def debug_symbol(symbol: str):
-    """
-    Debug endpoint to see raw candle data for a symbol
-    """
-    symbol = symbol.upper().replace("-", "/")
+def debug_payload(symbol: str) -> dict:
+    """Raw candles per timeframe for one symbol"""
     debug_data = {"symbol": symbol}
     
     for timeframe in ["daily", "weekly", "monthly"]:
@@ -113,61 +242,513 @@ async def debug_symbol(symbol: str):
     return debug_data
 
 
-@app.get("/api/bias")
-async def get_all_bias():
+def requested_rules(rules: str = None) -> rule_engine.CompiledRules:
+    """The ?rules= rule set; an unknown or malformed one is the client's error (400) on every endpoint"""
+    try:
+        return rule_engine.get_rules(rules)
+    except rule_engine.RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/bias/{symbol}")
+async def get_symbol_bias(symbol: str, request: Request, rules: str = None):
     """
-    Get bias for all symbols across all timeframes.
-    Returns a list of bias data for the dashboard.
-    Fetches data in parallel to prevent timeouts.
-    """
-    import asyncio
-    import concurrent.futures
-    
-    symbols = data_fetcher.get_all_symbols()
-    results = []
-    
-    # Helper function to process a single symbol (runs in thread)
-    def process_symbol(symbol):
-        bias_data = {
-            "symbol": symbol,
-            "daily": "NEUTRAL",
-            "weekly": "NEUTRAL",
-            "monthly": "NEUTRAL",
-        }
-        
+    Get bias for a specific symbol across all timeframes.
+    Symbol format: EUR/USD, XAU/USD, etc.
+    ?rules=<name> evaluates another desk's rule set instead of the active one.
+    """
+    symbol = symbol.upper().replace("-", "/")
+    compiled = requested_rules(rules)
+    
+    # Building the payload can fetch candles, keep it off the event loop
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, profiling.bind(
+        encoded_response, request, ("bias", symbol, compiled.version),
+        lambda: symbol_bias_payload(symbol, compiled.name), encoders.encode_candles,
+        not snapshot_store.is_stale(),
+    ))
+
+
+@app.get("/api/debug/{symbol}")
+async def debug_symbol(symbol: str, request: Request):
+    """
+    Debug endpoint to see raw candle data for a symbol
+    """
+    symbol = symbol.upper().replace("-", "/")
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, profiling.bind(
+        encoded_response, request, ("debug", symbol), lambda: debug_payload(symbol),
+        encoders.encode_candles, not snapshot_store.is_stale(),
+    ))
+
+
+def process_symbol(symbol: str, background: bool = False, previous: dict = None,
+                   queued_at: float = None) -> dict:
+    """
+    Fetch all timeframes for one symbol and compute bias + signal (runs in a thread)
+    previous is the symbol's row from the last snapshot: if a timeframe has no
+    data at all, its last known bias is kept instead of reporting NEUTRAL.
+    queued_at (perf_counter) lets the trace show time spent waiting for the pool.
+    """
+    if queued_at is not None:
+        profiling.tracer.complete("symbol.queue", queued_at, time.perf_counter(), symbol=symbol)
+    
+    bias_data = {
+        "symbol": symbol,
+        "daily": "NEUTRAL",
+        "weekly": "NEUTRAL",
+        "monthly": "NEUTRAL",
+    }
+    
+    with profiling.span("symbol", symbol=symbol):
         # Try to fetch data
         for timeframe in ["daily", "weekly", "monthly"]:
             try:
                 # This is blocking, so we run it in a thread
-                candles = data_fetcher.get_timeframe_candles(symbol, timeframe)
+                with profiling.span("fetch", symbol=symbol, timeframe=timeframe) as span:
+                    candles = data_fetcher.get_timeframe_candles(symbol, timeframe, background)
+                    span.set(candles=len(candles or []))
                 if candles and len(candles) >= 2:
-                    bias_data[timeframe] = get_bias_from_candles(candles)
+                    with profiling.span("bias", symbol=symbol, timeframe=timeframe):
+                        bias_data[timeframe] = get_bias_from_candles(candles)
+                    continue
             except Exception as e:
                 print(f"Error fetching {symbol} {timeframe}: {e}")
+            if previous:
+                bias_data[timeframe] = previous.get(timeframe, "NEUTRAL")
         
         # Calculate Signal
-        bias_data["signal"] = calculate_trade_signal(
-            bias_data["daily"], 
-            bias_data["weekly"], 
-            bias_data["monthly"]
-        )
-        return bias_data
-
-    # Use ThreadPoolExecutor to run sync network calls in parallel
-    # Limit workers to avoid hitting Yahoo Finance rate limits too hard
-    # 10 workers = ~10 concurrent requests
+        with profiling.span("signal", symbol=symbol):
+            bias_data["signal"] = calculate_trade_signal(
+                bias_data["daily"], 
+                bias_data["weekly"], 
+                bias_data["monthly"]
+            )
+    return bias_data
+
+
+async def refresh_snapshot(background: bool = False) -> dict:
+    """
+    Recompute bias for all symbols and publish a new snapshot.
+    Concurrent callers share the refresh that is already running.
+    """
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh_snapshot(background))
+    return await asyncio.shield(_refresh_task)
+
+
+async def _refresh_snapshot(background: bool) -> dict:
     loop = asyncio.get_event_loop()
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Create a list of coroutines
+    cache = shared_cache.get_cache()
+    
+    # With several workers only the elected one recomputes the snapshot,
+    # the others adopt it from the shared tier once it is published
+    while True:
+        token = await loop.run_in_executor(None, cache.acquire, REFRESH_KEY, REFRESH_LEASE)
+        if token:
+            break
+        snapshot = await _wait_for_shared_snapshot()
+        if snapshot:
+            return snapshot
+    
+    try:
+        # Continue from the newest published version, whichever worker made it
+        adopted = await loop.run_in_executor(None, snapshot_store.sync, True)
+        if adopted:
+            alert_engine.seed(adopted["data"])
+        
+        symbols = data_fetcher.get_all_symbols()
+        previous = {row["symbol"]: row for row in (snapshot_store.snapshot or {}).get("data", [])}
+        
+        # Run the blocking per-symbol work in the shared pool. Upstream
+        # concurrency and rate are bounded by the upstream scheduler, not here.
+        queued_at = time.perf_counter()
         futures = [
-            loop.run_in_executor(executor, process_symbol, symbol) 
+            loop.run_in_executor(symbol_executor, profiling.bind(process_symbol, symbol, background,
+                                                                 previous.get(symbol), queued_at))
             for symbol in symbols
         ]
         
         # Wait for all to complete
         results = await asyncio.gather(*futures)
+        
+        snapshot = await loop.run_in_executor(None, snapshot_store.publish, results)
+    finally:
+        await loop.run_in_executor(None, cache.release, REFRESH_KEY, token)
+    
+    # Detect transitions (deliveries happen in the background). Only the
+    # publishing worker does this, so each transition is delivered once.
+    alert_engine.observe(results)
     
-    return {"data": results, "count": len(results)}
+    # Persist for the next cold start
+    await loop.run_in_executor(None, snapshot_store.save)
+    return snapshot
+
+
+async def _wait_for_shared_snapshot():
+    """
+    Wait while another worker refreshes. Returns its snapshot, or None if
+    the lock went away without a new snapshot (the caller then takes over).
+    """
+    loop = asyncio.get_event_loop()
+    cache = shared_cache.get_cache()
+    previous = snapshot_store.snapshot
+    deadline = time.time() + REFRESH_LEASE
+    
+    while time.time() < deadline:
+        await asyncio.sleep(0.1)
+        snapshot = await loop.run_in_executor(None, snapshot_store.sync, True)
+        if snapshot:
+            alert_engine.seed(snapshot["data"])
+            return snapshot
+        if not await loop.run_in_executor(None, cache.is_locked, REFRESH_KEY):
+            break
+    
+    snapshot = snapshot_store.snapshot
+    return snapshot if snapshot is not previous else None
+
+
+def schedule_refresh():
+    """Start a background refresh unless one is already running"""
+    if _refresh_task is None or _refresh_task.done():
+        asyncio.ensure_future(refresh_snapshot(background=True))
+
+
+async def current_snapshot() -> dict:
+    """
+    The snapshot every snapshot-backed endpoint serves: adopts a newer one
+    from another worker, schedules a background refresh when stale, and only
+    waits for a live fetch when there is no snapshot at all.
+    """
+    # Pick up a snapshot published by another worker (reading the shared tier blocks)
+    adopted = None
+    if snapshot_store.sync_due():
+        loop = asyncio.get_event_loop()
+        adopted = await loop.run_in_executor(None, snapshot_store.sync)
+    if adopted:
+        # The worker that published it raised its alerts; only record the state
+        alert_engine.seed(adopted["data"])
+    
+    snapshot = snapshot_store.snapshot
+    if snapshot is None:
+        snapshot = await refresh_snapshot()
+    elif snapshot_store.is_stale():
+        schedule_refresh()
+    return snapshot
+
+
+@app.get("/api/bias")
+async def get_all_bias(request: Request):
+    """
+    Get bias for all symbols across all timeframes.
+    Returns a list of bias data for the dashboard.
+    
+    Served from the current snapshot; a stale snapshot is returned right
+    away and refreshed in the background. Only the very first request of
+    an instance without a saved snapshot waits for the live fetch.
+    
+    Responds with JSON, MessagePack or Arrow IPC depending on the Accept
+    header (or ?format=json|msgpack|arrow).
+    """
+    snapshot = await current_snapshot()
+    
+    payload = {
+        "data": snapshot["data"],
+        "count": snapshot["count"],
+        "generated_at": snapshot["generated_at"],
+        "version": snapshot.get("version", 0),
+        "epoch": snapshot.get("epoch"),
+    }
+    return encoded_response(request, ("bias", snapshot["generated_at"]), lambda: payload, encoders.encode_bias)
+
+
+@app.get("/api/changes")
+async def get_bias_changes(since: int, epoch: str = None):
+    """
+    Rows that changed since snapshot version `since` of lineage `epoch`
+    (both from /api/bias or a previous call). {"full": true, "data": [...]}
+    means the version is too old, unknown or from another lineage and the
+    client should replace its copy.
+    """
+    await current_snapshot()
+    return snapshot_store.changes_since(since, epoch)
+
+
+def get_currency_strength():
+    global _currency_strength
+    if _currency_strength is None:
+        from currency_strength import CurrencyStrength
+        _currency_strength = CurrencyStrength(data_fetcher.get_all_symbols())
+    return _currency_strength
+
+
+@app.get("/api/strength")
+async def get_strength_matrix():
+    """
+    Currency x timeframe strength aggregated from all pairs' bias and
+    latest close-to-close moves (recomputed once per snapshot version)
+    """
+    snapshot = await current_snapshot()
+    
+    # Candle reads may hit the shared tier, keep them off the event loop
+    strength = get_currency_strength()
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, profiling.bind(strength.update, snapshot, data_fetcher.get_known_candles))
+    return strength.matrix()
+
+
+@app.get("/api/rules")
+async def get_rule_sets():
+    """Available bias/signal rule sets and the one the snapshot uses"""
+    try:
+        active = rule_engine.get_rules().describe()
+    except rule_engine.RuleError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"active": active, "available": rule_engine.list_rule_sets()}
+
+
+# ====================================
+# Admin: profiling and tracing
+# ====================================
+
+def require_admin(token: str = None):
+    """Admin endpoints only exist when ADMIN_TOKEN is set, and need it in X-Admin-Token"""
+    if not profiling.admin_token():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.check_admin_token(token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/api/admin/profile")
+async def sample_profile(seconds: float = 10, interval: float = 0.005, threads: str = None,
+                         x_admin_token: str = Header(None)):
+    """
+    Sample all threads for `seconds` and return folded stacks
+    (flamegraph.pl / speedscope input). `threads` filters by thread name
+    prefix, e.g. "symbol,upstream".
+    """
+    require_admin(x_admin_token)
+    loop = asyncio.get_event_loop()
+    try:
+        folded = await loop.run_in_executor(None, profiling.sample, seconds, interval, threads)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=folded, media_type="text/plain")
+
+
+@app.get("/api/admin/trace")
+async def export_trace(clear: bool = False, x_admin_token: str = Header(None)):
+    """Recorded spans in Chrome trace-event format (chrome://tracing, Perfetto)"""
+    require_admin(x_admin_token)
+    trace = profiling.tracer.export()
+    if clear:
+        profiling.tracer.clear()
+    return trace
+
+
+@app.post("/api/admin/trace")
+async def toggle_trace(enabled: bool, x_admin_token: str = Header(None)):
+    """Turn span recording on or off for this worker"""
+    require_admin(x_admin_token)
+    profiling.tracer.enabled = enabled
+    return {"enabled": enabled, "events": len(profiling.tracer.events)}
+
+
+# ====================================
+# History (memory-mapped store)
+# ====================================
+
+HISTORY_MAX_ROWS = 100000
+
+
+@app.get("/api/history/{symbol}")
+async def get_history(symbol: str, request: Request, interval: str = "1d", start: str = None,
+                      end: str = None, limit: int = 5000, bias: bool = False, rules: str = None):
+    """
+    Stored candles for start <= time < end (ISO dates), newest `limit` rows.
+    bias=true adds each bar's bias vs the bar before it. Fill the store with
+    `python history_store.py ingest`. JSON, MessagePack or Arrow like /api/bias.
+    """
+    import history_store
+    
+    symbol = symbol.upper().replace("-", "/")
+    ticker = data_fetcher.SYMBOL_MAP.get(symbol, symbol)
+    if rules:
+        requested_rules(rules)
+    try:
+        series = history_store.get_store().series(ticker, interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if series is None:
+        raise HTTPException(status_code=404, detail=f"No stored {interval} history for {symbol}")
+    
+    limit = max(1, min(limit, HISTORY_MAX_ROWS))
+    try:
+        if bias:
+            columns = history_store.bias_history(series, start, end, rules)
+        else:
+            columns = series.slice(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = len(columns["ts"])
+    columns = {name: values[max(rows - limit, 0):] for name, values in columns.items()}
+    payload = {
+        "symbol": symbol,
+        "ticker": ticker,
+        "interval": interval,
+        "rows": len(columns["ts"]),
+        "truncated": rows > limit,
+        "columns": columns,
+    }
+    return encoded_response(request, ("history",), lambda: payload, encoders.encode_history, cache=False)
+
+
+# ====================================
+# Watchlists
+# ====================================
+
+@app.get("/api/watchlists")
+async def list_watchlists(owner: str = None):
+    """Saved watchlists of one owner (?owner= is required)"""
+    if not owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    return {"watchlists": watchlist_store.list(owner), "filters": FILTER_VALUES}
+
+
+@app.post("/api/watchlists")
+async def create_watchlist(body: WatchlistBody):
+    """
+    Save a watchlist, e.g.
+    {"owner": "alice", "name": "Majors", "symbols": ["EUR/USD", "GBP/USD"],
+     "style": "swing", "filters": {"signal": ["BUY", "SELL"]}}
+    """
+    if not body.owner or not body.name:
+        raise HTTPException(status_code=400, detail="owner and name are required")
+    try:
+        return watchlist_store.create(body.owner, body.name, body.symbols or [],
+                                      body.style or "position", body.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/watchlists/{watchlist_id}")
+async def get_watchlist(watchlist_id: str):
+    watchlist = watchlist_store.get(watchlist_id)
+    if not watchlist:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    return watchlist
+
+
+@app.put("/api/watchlists/{watchlist_id}")
+async def update_watchlist(watchlist_id: str, body: WatchlistBody):
+    """
+    Change name, symbols, style and/or filters (omitted fields are kept).
+    body.owner must be the watchlist's owner.
+    """
+    if not body.owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    try:
+        watchlist = watchlist_store.update(watchlist_id, body.owner, body.name, body.symbols,
+                                           body.style, body.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not watchlist:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    return watchlist
+
+
+@app.delete("/api/watchlists/{watchlist_id}")
+async def delete_watchlist(watchlist_id: str, owner: str = None):
+    """?owner= must be the watchlist's owner"""
+    if not owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    if not watchlist_store.delete(watchlist_id, owner):
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    return {"deleted": watchlist_id}
+
+
+@app.get("/api/watchlists/{watchlist_id}/bias")
+async def get_watchlist_bias(watchlist_id: str, request: Request):
+    """
+    The watchlist's rows from the shared snapshot, with its saved filters.
+    Query parameters signal/daily/weekly/monthly (comma-separated values)
+    replace the saved filter for that field, e.g. ?signal=BUY&daily=BULL,STRONG BULL
+    """
+    watchlist = watchlist_store.get(watchlist_id)
+    if not watchlist:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    try:
+        overrides = validate_filters({field: request.query_params[field]
+                                      for field in FILTER_VALUES if field in request.query_params})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {**watchlist["filters"], **overrides}
+    
+    snapshot = await current_snapshot()
+    rows = snapshot_index.get(snapshot).resolve(watchlist["symbols"], filters)
+    return {
+        "watchlist": watchlist_id,
+        "style": watchlist["style"],
+        "filters": filters,
+        "data": rows,
+        "count": len(rows),
+        "generated_at": snapshot["generated_at"],
+        "version": snapshot.get("version", 0),
+        "epoch": snapshot.get("epoch"),
+    }
+
+
+@app.get("/api/alerts")
+async def list_alerts(owner: str = None):
+    """One owner's alert subscriptions (?owner= is required) and delivery stats"""
+    if not owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    return {
+        "subscriptions": alert_engine.list_subscriptions(owner),
+        "fields": ALERT_FIELDS,
+        "stats": alert_engine.dispatcher.stats,
+    }
+
+
+@app.post("/api/alerts")
+async def create_alert(subscription: AlertSubscription):
+    """
+    Subscribe a webhook to bias/signal transitions.
+    symbol/to/from_ accept "*" as a wildcard, e.g.
+    {"owner": "alice", "url": "https://example.com/hook", "symbol": "EUR/USD", "field": "signal", "to": "BUY"}
+    The URL must resolve to a public address.
+    """
+    if not subscription.owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    loop = asyncio.get_event_loop()
+    try:
+        # subscribe resolves the webhook host, keep that off the event loop
+        return await loop.run_in_executor(None, functools.partial(
+            alert_engine.subscribe,
+            subscription.owner,
+            subscription.url,
+            symbol=subscription.symbol,
+            field=subscription.field,
+            to=subscription.to,
+            from_=subscription.from_,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/api/alerts/{subscription_id}")
+async def delete_alert(subscription_id: str, owner: str = None):
+    """Remove an alert subscription (?owner= must be its owner)"""
+    if not owner:
+        raise HTTPException(status_code=400, detail="owner is required")
+    if not alert_engine.unsubscribe(subscription_id, owner):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"deleted": subscription_id}
+
+
+startup_metrics["import_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
 
 
 if __name__ == "__main__":
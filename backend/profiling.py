@@ -0,0 +1,240 @@
+"""
+Profiling - On-demand sampling profiler and span tracing
+sample() snapshots every thread's stack at a fixed interval for N seconds
+and returns folded stacks ("a;b;c count" lines) that flamegraph.pl,
+speedscope and similar tools read directly.
+
+The tracer records spans (fetch, convert, bias, signal, ...) into a ring
+buffer and exports them in the Chrome trace-event format (chrome://tracing,
+Perfetto). When tracing is off, span() returns a shared no-op object, so
+instrumented code pays one attribute check per span.
+
+Every span carries the id of the request it ran for (request_id), taken
+from a context variable the HTTP middleware sets; work handed to threads
+keeps it when submitted through bind() or the upstream scheduler.
+
+Both are exposed through admin endpoints that need ADMIN_TOKEN to be set.
+"""
+
+import contextlib
+import contextvars
+import functools
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Optional
+
+ADMIN_TOKEN_ENV = "ADMIN_TOKEN"
+MAX_PROFILE_SECONDS = 60
+
+
+def admin_token() -> Optional[str]:
+    return os.environ.get(ADMIN_TOKEN_ENV) or None
+
+
+def check_admin_token(supplied: Optional[str]) -> bool:
+    """True if ADMIN_TOKEN is configured and `supplied` matches it"""
+    expected = admin_token()
+    if not expected or not supplied:
+        return False
+    return hmac.compare_digest(expected.encode(), supplied.encode())
+
+
+# ====================================
+# Sampling profiler
+# ====================================
+
+_sampling = threading.Lock()
+
+
+def _thread_group(name: str) -> str:
+    """"symbol_3" / "upstream-2" -> "symbol" / "upstream" so pools merge in the graph"""
+    return re.sub(r"[-_]\d+$", "", name)
+
+
+def _folded_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample(seconds: float = 10, interval: float = 0.005, threads: str = None) -> str:
+    """
+    Sample all threads (except this one) every `interval` seconds for
+    `seconds` and return folded stacks, heaviest first. `threads` limits
+    sampling to thread groups starting with one of the comma-separated prefixes.
+    Raises RuntimeError if a profile is already being taken.
+    """
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    prefixes = tuple(p.strip() for p in threads.split(",") if p.strip()) if threads else None
+
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A profile is already being taken")
+    try:
+        own = threading.get_ident()
+        counts: Dict[str, int] = {}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                group = _thread_group(names.get(ident, f"thread-{ident}"))
+                if prefixes and not group.startswith(prefixes):
+                    continue
+                stack = f"{group};{_folded_stack(frame)}"
+                counts[stack] = counts.get(stack, 0) + 1
+            time.sleep(interval)
+    finally:
+        _sampling.release()
+
+    return "".join(f"{stack} {count}\n" for stack, count in
+                   sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
+# ====================================
+# Request ids
+# ====================================
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def new_request_id(supplied: Optional[str] = None) -> str:
+    """Set the current context's request id: a sane client-supplied one (X-Request-ID) or a fresh one"""
+    request_id = supplied if supplied and _VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def request_context(request_id: Optional[str]):
+    """Run a block (e.g. a queued job on a worker thread) on behalf of request_id"""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def bind(fn: Callable, *args) -> Callable:
+    """fn(*args) in the caller's context, for loop.run_in_executor (which doesn't copy it)"""
+    return functools.partial(contextvars.copy_context().run, fn, *args)
+
+
+# ====================================
+# Span tracing
+# ====================================
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "started")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.complete(self.name, self.started, time.perf_counter(), self.cat, **self.args)
+        return False
+
+    def set(self, **args):
+        """Attach extra arguments once they are known (e.g. number of candles)"""
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Ring buffer of completed spans.
+
+        with tracer.span("fetch", symbol="EUR/USD", timeframe="daily") as s:
+            ...
+            s.set(candles=5)
+
+    export() returns {"traceEvents": [...]} with one complete ("X") event per
+    span plus thread-name metadata, timestamps in microseconds. Spans
+    recorded on behalf of a request have its id in args["request_id"].
+    """
+
+    def __init__(self, enabled: bool = False, max_events: int = 50000):
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def span(self, name: str, cat: str = "app", **args):
+        if not self.enabled:
+            return NOOP_SPAN
+        return _Span(self, name, cat, args)
+
+    def complete(self, name: str, started: float, finished: float, cat: str = "app", **args):
+        """Record a span from perf_counter() timestamps (e.g. time spent queued)"""
+        if not self.enabled:
+            return
+        request_id = _request_id.get()
+        if request_id is not None:
+            args.setdefault("request_id", request_id)
+        thread = threading.current_thread()
+        # deque.append is atomic, no lock needed
+        self.events.append((name, cat, started, finished, thread.ident, thread.name, args))
+
+    def clear(self):
+        self.events.clear()
+
+    def export(self) -> dict:
+        events, threads = [], {}
+        for name, cat, started, finished, tid, thread_name, args in list(self.events):
+            threads[tid] = thread_name
+            events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": round((started - self._origin) * 1e6, 1),
+                "dur": round((finished - started) * 1e6, 1),
+                "pid": self._pid,
+                "tid": tid,
+                "args": args,
+            })
+        for tid, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                           "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+tracer = Tracer(enabled=os.environ.get("TRACE_ENABLED", "").lower() in ("1", "true", "yes"))
+span = tracer.span
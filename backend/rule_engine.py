@@ -0,0 +1,390 @@
+"""
+Rule Engine - Bias and signal rules as data
+A rule set lists bias rules (conditions over C1/C2 candle fields) and
+signal rules (allowed bias labels per timeframe), each evaluated in
+priority order with the first match winning. compile_rules() turns a rule
+set into a generated Python function for live calls and numpy evaluators
+for whole histories; compiled sets are cached per rule-set version. Live
+calls, /api/history and rule_sweep all evaluate through the same sets.
+
+Rule sets other than the built-in "default" are JSON files in RULES_DIR
+(backend/rules by default), one per desk, e.g. rules/desk-a.json. The
+active set is picked with the RULE_SET environment variable.
+"""
+
+import copy
+import hashlib
+import json
+import operator
+import os
+import re
+import threading
+import time
+from typing import Dict, List
+
+from bias_calculator import BIAS_LABELS, BIAS_SCORES, SIGNAL_LABELS
+
+DEFAULT_RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+
+CANDLES = ["c1", "c2"]
+FIELDS = ["open", "high", "low", "close"]
+TIMEFRAMES = ["daily", "weekly", "monthly"]
+OPERATORS = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le, "==": operator.eq}
+
+# The rules calculate_bias / calculate_trade_signal have always applied
+DEFAULT_RULES = {
+    "name": "default",
+    "version": 1,
+    "bias": [
+        # Clean breakout above / breakdown below the previous range
+        {"label": "STRONG BULL", "when": [["c1.close", ">", "c2.high"]]},
+        {"label": "STRONG BEAR", "when": [["c1.close", "<", "c2.low"]]},
+        # Rejection from the high / recovery from the low
+        {"label": "BEAR", "when": [["c1.high", ">", "c2.high"], ["c1.close", "<", "c2.high"]]},
+        {"label": "BULL", "when": [["c1.low", "<", "c2.low"], ["c1.close", ">", "c2.low"]]},
+    ],
+    "bias_default": "NEUTRAL",
+    "signal": [
+        {"label": "BUY", "when": {
+            "monthly": ["STRONG BULL", "BULL"],
+            "weekly": ["STRONG BULL", "BULL"],
+            "daily": ["STRONG BULL", "BULL"],
+        }},
+        {"label": "SELL", "when": {
+            "monthly": ["STRONG BEAR", "BEAR"],
+            "weekly": ["STRONG BEAR", "BEAR"],
+            "daily": ["STRONG BEAR", "BEAR"],
+        }},
+    ],
+    "signal_default": "WAIT",
+}
+
+
+class RuleError(ValueError):
+    """Rule set is malformed or cannot be found"""
+
+
+# ====================================
+# Compilation
+# ====================================
+
+_TOKEN = re.compile(r"\s*(?:(c[12]\.[a-z]+)|(\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([-+*]))")
+
+
+def _operand(value) -> tuple:
+    """
+    Operand -> linear expression (terms, const), terms = ((coef, candle, field), ...).
+    Accepts numbers, fields ("c1.close") and sums of fields, numbers and
+    number * field products, e.g. "c2.high + 0.0001 * c2.close".
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (), float(value)
+    text = str(value).strip()
+    error = RuleError(f"Invalid operand: {value!r} (expected c1/c2.open/high/low/close, a number "
+                      f"or a sum like 'c2.high + 0.0001 * c2.close')")
+
+    tokens, position = [], 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise error
+        field, number, symbol = match.groups()
+        tokens.append(("field", field) if field else ("number", float(number)) if number else ("op", symbol))
+        position = match.end()
+
+    terms, const = {}, 0.0
+    i, sign = 0, 1.0
+    while i < len(tokens):
+        if tokens[i] in (("op", "+"), ("op", "-")):
+            sign = -1.0 if tokens[i][1] == "-" else 1.0
+            i += 1
+        factors = tokens[i:i + 3]
+        if len(factors) == 3 and factors[1] == ("op", "*"):
+            kinds = {factors[0][0], factors[2][0]}
+            if kinds != {"field", "number"}:
+                raise error
+            coef = factors[0][1] if factors[0][0] == "number" else factors[2][1]
+            field = factors[2][1] if factors[2][0] == "field" else factors[0][1]
+            i += 3
+        elif factors and factors[0][0] in ("field", "number"):
+            coef, field = (1.0, factors[0][1]) if factors[0][0] == "field" else (factors[0][1], None)
+            i += 1
+        else:
+            raise error
+        if field is None:
+            const += sign * coef
+        else:
+            candle, _, name = field.partition(".")
+            if candle not in CANDLES or name not in FIELDS:
+                raise error
+            terms[(candle, name)] = terms.get((candle, name), 0.0) + sign * coef
+        if i < len(tokens) and tokens[i] not in (("op", "+"), ("op", "-")):
+            raise error
+        sign = 1.0
+    if not terms and not tokens:
+        raise error
+    return tuple((coef, candle, name) for (candle, name), coef in terms.items()), const
+
+
+def _source(expression: tuple) -> str:
+    """Python source of a linear expression over c1_open .. c2_close"""
+    terms, const = expression
+    parts = [f"{candle}_{field}" if coef == 1.0 else f"{coef!r} * {candle}_{field}"
+             for coef, candle, field in terms]
+    if const or not parts:
+        parts.append(repr(const))
+    return " + ".join(parts)
+
+
+def _parse_condition(condition) -> tuple:
+    if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+        raise RuleError(f"Invalid condition: {condition!r} (expected [left, op, right])")
+    left, op, right = condition
+    if op not in OPERATORS:
+        raise RuleError(f"Invalid operator: {op!r} (expected one of {', '.join(OPERATORS)})")
+    return _operand(left), op, _operand(right)
+
+
+def fingerprint(rules: dict) -> str:
+    """Rule-set version key: declared name/version plus a hash of the content"""
+    digest = hashlib.sha1(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{rules.get('name', 'unnamed')}@{rules.get('version', 0)}-{digest}"
+
+
+class CompiledRules:
+    """
+    One compiled rule set.
+
+    Scalar (live) calls:
+        bias(c1, c2)                    candles as dicts with open/high/low/close
+        bias_values(c1_open, ..., c2_close)  the same from eight floats
+        signal(daily, weekly, monthly)  bias labels (generated function)
+    Batch (history) calls, numpy arrays in and out:
+        bias_series(c1, c2)             dicts of arrays -> int8 bias scores
+        signal_series(daily, weekly, monthly)  bias score arrays -> int8 signal codes
+    """
+
+    def __init__(self, rules: dict):
+        self.name = rules.get("name", "unnamed")
+        self.version = fingerprint(rules)
+
+        bias_default = rules.get("bias_default", "NEUTRAL")
+        signal_default = rules.get("signal_default", "WAIT")
+        if bias_default not in BIAS_LABELS:
+            raise RuleError(f"Invalid bias_default: {bias_default!r}")
+        if signal_default not in SIGNAL_LABELS:
+            raise RuleError(f"Invalid signal_default: {signal_default!r}")
+        self.bias_default = bias_default
+        self.signal_default = signal_default
+
+        # [(label, [(left, op, right), ...]), ...] in priority order
+        self.bias_rules = []
+        for rule in rules.get("bias", []):
+            if rule.get("label") not in BIAS_LABELS:
+                raise RuleError(f"Invalid bias label: {rule.get('label')!r}")
+            self.bias_rules.append((rule["label"], [_parse_condition(c) for c in rule.get("when", [])]))
+
+        # [(label, {timeframe: frozenset(labels)}), ...] in priority order
+        self.signal_rules = []
+        for rule in rules.get("signal", []):
+            if rule.get("label") not in SIGNAL_LABELS:
+                raise RuleError(f"Invalid signal label: {rule.get('label')!r}")
+            allowed = {}
+            for timeframe, labels in rule.get("when", {}).items():
+                if timeframe not in TIMEFRAMES:
+                    raise RuleError(f"Invalid timeframe: {timeframe!r}")
+                unknown = [label for label in labels if label not in BIAS_LABELS]
+                if unknown:
+                    raise RuleError(f"Invalid bias labels for {timeframe}: {unknown}")
+                allowed[timeframe] = frozenset(labels)
+            self.signal_rules.append((rule["label"], allowed))
+
+        # Fields the bias rules read, for batch callers that only have some columns
+        self.fields = sorted({(candle, field) for _, conditions in self.bias_rules
+                              for left, _, right in conditions for _, candle, field in left[0] + right[0]})
+        self.bias_values = self._generate_bias_function()
+        self.signal = self._generate_signal_function()
+
+    # ---------- Scalar ----------
+
+    def _generate_bias_function(self):
+        """
+        Generate one plain function for the bias rules, so a live call costs
+        what the hand-written if-chain did. Operands are validated field
+        names and float literals, nothing else reaches the source.
+        """
+        arguments = ", ".join(f"{candle}_{field}" for candle in CANDLES for field in FIELDS)
+        lines = [f"def bias_values({arguments}):"]
+        for label, conditions in self.bias_rules:
+            test = " and ".join(f"({_source(left)}) {op} ({_source(right)})"
+                                for left, op, right in conditions) or "True"
+            lines.append(f"    if {test}:")
+            lines.append(f"        return {label!r}")
+        lines.append(f"    return {self.bias_default!r}")
+        namespace = {}
+        exec(compile("\n".join(lines), f"<rules {self.version}>", "exec"), namespace)
+        return namespace["bias_values"]
+
+    def _generate_signal_function(self):
+        """signal(daily, weekly, monthly) as one plain function, like the bias rules"""
+        namespace = {}
+        lines = ["def signal(daily, weekly, monthly):"]
+        for i, (label, allowed) in enumerate(self.signal_rules):
+            tests = []
+            for timeframe, options in allowed.items():
+                namespace[f"_{timeframe}_{i}"] = options
+                tests.append(f"{timeframe} in _{timeframe}_{i}")
+            lines.append(f"    if {' and '.join(tests) or 'True'}:")
+            lines.append(f"        return {label!r}")
+        lines.append(f"    return {self.signal_default!r}")
+        exec(compile("\n".join(lines), f"<signal rules {self.version}>", "exec"), namespace)
+        return namespace["signal"]
+
+    def bias(self, c1: dict, c2: dict) -> str:
+        return self.bias_values(c1["open"], c1["high"], c1["low"], c1["close"],
+                                c2["open"], c2["high"], c2["low"], c2["close"])
+
+    # ---------- Batch ----------
+
+    def bias_series(self, c1: dict, c2: dict):
+        """
+        c1/c2 map field -> equal-length arrays (only the fields the rules
+        use are needed, see `fields`). Returns int8 bias scores (-2 .. 2,
+        see BIAS_SCORES).
+        """
+        import numpy as np
+
+        columns = {
+            "c1": {field: np.asarray(values, dtype=float) for field, values in c1.items()},
+            "c2": {field: np.asarray(values, dtype=float) for field, values in c2.items()},
+        }
+        length = len(next(iter(columns["c1"].values())))
+        missing = [f"{candle}.{field}" for candle, field in self.fields if field not in columns[candle]]
+        if missing:
+            raise RuleError(f"Rule set {self.name} needs {', '.join(missing)}")
+
+        def values(expression):
+            terms, const = expression
+            if len(terms) == 1 and terms[0][0] == 1.0 and not const:
+                return columns[terms[0][1]][terms[0][2]]
+            total = const
+            for coef, candle, field in terms:
+                total = total + coef * columns[candle][field]
+            return total
+
+        conditions, choices = [], []
+        for label, rule_conditions in self.bias_rules:
+            mask = np.ones(length, dtype=bool)
+            for left, op, right in rule_conditions:
+                mask &= OPERATORS[op](values(left), values(right))
+            conditions.append(mask)
+            choices.append(BIAS_SCORES[label])
+        return np.select(conditions, choices, default=BIAS_SCORES[self.bias_default]).astype(np.int8)
+
+    def signal_series(self, daily, weekly, monthly):
+        """Bias score arrays per timeframe -> int8 signal codes (index into SIGNAL_LABELS)"""
+        import numpy as np
+
+        scores = {"daily": np.asarray(daily), "weekly": np.asarray(weekly), "monthly": np.asarray(monthly)}
+        conditions, choices = [], []
+        for label, allowed in self.signal_rules:
+            mask = np.ones(len(scores["daily"]), dtype=bool)
+            for timeframe, options in allowed.items():
+                mask &= np.isin(scores[timeframe], [BIAS_SCORES[option] for option in options])
+            conditions.append(mask)
+            choices.append(SIGNAL_LABELS.index(label))
+        return np.select(conditions, choices, default=SIGNAL_LABELS.index(self.signal_default)).astype(np.int8)
+
+    def describe(self) -> dict:
+        return {"name": self.name, "version": self.version}
+
+
+# ====================================
+# Rule set lookup (cached per version)
+# ====================================
+
+# Rule files are re-checked at most this often (seconds) by get_rules()
+CHECK_INTERVAL = 1.0
+
+_compiled: Dict[str, CompiledRules] = {}
+_files: Dict[str, tuple] = {}          # path -> (mtime, rules)
+_active: Dict[str, tuple] = {}         # name -> (checked_at, compiled)
+_lock = threading.Lock()
+
+
+def rules_dir() -> str:
+    return os.environ.get("RULES_DIR", DEFAULT_RULES_DIR)
+
+
+def list_rule_sets() -> List[str]:
+    names = ["default"]
+    try:
+        names += sorted(f[:-5] for f in os.listdir(rules_dir()) if f.endswith(".json") and f != "default.json")
+    except FileNotFoundError:
+        pass
+    return names
+
+
+def load_rule_set(name: str) -> dict:
+    """Rule set as data: the built-in default or rules/<name>.json"""
+    if "/" in name or "\\" in name or name.startswith("."):
+        raise RuleError(f"Invalid rule set name: {name!r}")
+
+    path = os.path.join(rules_dir(), f"{name}.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        if name == "default":
+            return copy.deepcopy(DEFAULT_RULES)
+        raise RuleError(f"Unknown rule set: {name!r}")
+
+    with _lock:
+        cached = _files.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path) as f:
+            rules = json.load(f)
+    except ValueError as e:
+        raise RuleError(f"Invalid JSON in {path}: {e}")
+    rules.setdefault("name", name)
+    with _lock:
+        _files[path] = (mtime, rules)
+    return rules
+
+
+def compile_rules(rules: dict) -> CompiledRules:
+    """Compile a rule set, reusing the compiled version if it was seen before"""
+    version = fingerprint(rules)
+    with _lock:
+        compiled = _compiled.get(version)
+    if compiled is None:
+        compiled = CompiledRules(rules)
+        with _lock:
+            _compiled[version] = compiled
+    return compiled
+
+
+def get_rules(name: str = None) -> CompiledRules:
+    """Compiled rule set by name (defaults to RULE_SET, then "default")"""
+    now = time.monotonic()
+    active = _active.get(name)
+    if active and now - active[0] < CHECK_INTERVAL:
+        return active[1]
+    compiled = compile_rules(load_rule_set(name or os.environ.get("RULE_SET", "default")))
+    # Cached under the requested name; None (the active set) re-reads RULE_SET on expiry
+    _active[name] = (now, compiled)
+    return compiled
+
+
+def resolve_rules(rules=None) -> CompiledRules:
+    """
+    Rule set argument as the calculators accept it: None (active set), a
+    rule-set name, a rule-set dict (e.g. a sweep variant) or a CompiledRules
+    """
+    if rules is None or isinstance(rules, str):
+        return get_rules(rules)
+    if isinstance(rules, CompiledRules):
+        return rules
+    return compile_rules(rules)
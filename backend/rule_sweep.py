@@ -0,0 +1,465 @@
+"""
+Rule Sweep - Parallel parameter sweep over bias/signal rule variants
+Every variant is a rule set in rule_engine format (the grid below, or desk
+rule sets from rules/*.json), evaluated over candle history with the same
+compiled evaluators the live API uses, and ranked by CSV match rate or
+forward return.
+
+Usage (from the backend folder):
+    python rule_sweep.py                      # verification CSVs, rank by match rate
+    python rule_sweep.py --rank signal_return --source yahoo --period 5y
+    python rule_sweep.py --rank signal_return --source store   # history_store.py daily series
+    python rule_sweep.py --rule-sets default,strong-monthly --rank signal_return
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+import rule_engine
+from bias_calculator import BIAS_LABELS, BIAS_SCORES, SIGNAL_LABELS, calculate_bias_series
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Stored verification history: CSV file -> symbol (None = file has a Symbol column)
+# debug_snippet.csv is left out: its numbers are not quoted and the columns are broken.
+HISTORY_FILES = {
+    "data_analysis.csv": "XAUUSD",
+    "extended_verification.csv": None,
+    "new_data_verification.csv": None,
+}
+
+# Label sets used by the variant grid
+STRONG_ONLY = {"bull": ["STRONG BULL"], "bear": ["STRONG BEAR"]}
+WITH_REJECTIONS = {"bull": ["STRONG BULL", "BULL"], "bear": ["STRONG BEAR", "BEAR"]}
+
+# Signal rules: labels that qualify for BUY per timeframe (SELL is the mirror image)
+SIGNAL_RULES = {
+    # The default rule set
+    "current": rule_engine.DEFAULT_RULES["signal"][0]["when"],
+    # MN must be STRONG (also shipped as rules/strong-monthly.json)
+    "strong_monthly": {
+        "monthly": ["STRONG BULL"],
+        "weekly": ["STRONG BULL", "BULL"],
+        "daily": ["STRONG BULL", "BULL"],
+    },
+    "strong_all": {
+        "monthly": ["STRONG BULL"],
+        "weekly": ["STRONG BULL"],
+        "daily": ["STRONG BULL"],
+    },
+}
+
+RANK_KEYS = ["match_rate", "bias_return", "signal_return"]
+
+
+# ====================================
+# Variants
+# ====================================
+
+def _mirror(labels: List[str]) -> List[str]:
+    """["STRONG BULL", "BULL"] -> ["STRONG BEAR", "BEAR"]"""
+    return [BIAS_LABELS[2 - BIAS_SCORES[label]] for label in labels]
+
+
+def variant_rules(name: str, rejections: str, tolerance: float, signal: Dict[str, List[str]]) -> dict:
+    """
+    Rule set (rule_engine format) for one grid point.
+
+    rejections: priority of the rejection rules after the breakouts
+                ("bear_first" is the default set, "none" disables them)
+    tolerance:  breakout filter as a fraction of the C2 close
+    signal:     BUY labels per timeframe, SELL uses the mirrored labels
+    """
+    def level(field, sign):
+        return f"c2.{field} {sign} {tolerance!r} * c2.close" if tolerance else f"c2.{field}"
+
+    bear = {"label": "BEAR", "when": [["c1.high", ">", "c2.high"], ["c1.close", "<", "c2.high"]]}
+    bull = {"label": "BULL", "when": [["c1.low", "<", "c2.low"], ["c1.close", ">", "c2.low"]]}
+    bias = [
+        {"label": "STRONG BULL", "when": [["c1.close", ">", level("high", "+")]]},
+        {"label": "STRONG BEAR", "when": [["c1.close", "<", level("low", "-")]]},
+    ]
+    bias += {"bear_first": [bear, bull], "bull_first": [bull, bear]}.get(rejections, [])
+
+    return {
+        "name": name,
+        "version": 1,
+        "bias": bias,
+        "bias_default": "NEUTRAL",
+        "signal": [
+            {"label": "BUY", "when": signal},
+            {"label": "SELL", "when": {timeframe: _mirror(labels) for timeframe, labels in signal.items()}},
+        ],
+        "signal_default": "WAIT",
+    }
+
+
+def build_variants(lags=(1, 0), rejections=("bear_first", "bull_first", "none"),
+                   tolerances=(0.0, 0.0001, 0.0002),
+                   label_sets=(("strong", STRONG_ONLY), ("rejections", WITH_REJECTIONS)),
+                   signal_rules=tuple(SIGNAL_RULES.items()), rule_sets: List[str] = None) -> List[dict]:
+    """
+    Build the variant grid as plain dicts: {"name", "lag", "bull", "bear", "rules"}.
+
+    lag:        1 = label for bar T comes from T-1 vs T-2 (live C1/C2 logic)
+                0 = label for bar T comes from T vs T-1
+    bull/bear:  bias labels that count as a bullish/bearish reading
+    rules:      the rule set evaluated, from the rejection/tolerance/signal
+                grid, or the named rule sets (rules/*.json) when `rule_sets` is given
+    """
+    if rule_sets:
+        candidates = [(name, rule_engine.load_rule_set(name)) for name in rule_sets]
+    else:
+        candidates = []
+        for rejection, tolerance, (signal_name, signal) in itertools.product(rejections, tolerances, signal_rules):
+            name = f"{rejection}-tol{tolerance:g}-{signal_name}"
+            candidates.append((name, variant_rules(name, rejection, tolerance, signal)))
+
+    variants = []
+    for lag, (set_name, labels), (rules_name, rules) in itertools.product(lags, label_sets, candidates):
+        variants.append({
+            "name": f"lag{lag}-{rules_name}-{set_name}",
+            "lag": lag,
+            "bull": labels["bull"],
+            "bear": labels["bear"],
+            "rules": rules,
+        })
+    return variants
+
+
+# ====================================
+# History loading (pandas only used here)
+# ====================================
+
+def load_csv_history(files: Dict[str, str] = None, root: str = REPO_ROOT) -> Dict[str, "pd.DataFrame"]:
+    """
+    Load the verification CSVs into one daily DataFrame per symbol (oldest first).
+    Rows for the same symbol from different files are merged by date.
+    """
+    import pandas as pd
+
+    files = files or HISTORY_FILES
+    frames = {}
+    for filename, symbol in files.items():
+        path = os.path.join(root, filename)
+        if not os.path.exists(path):
+            print(f"History file not found: {path}")
+            continue
+
+        df = pd.read_csv(path, thousands=",")
+        if symbol is not None:
+            df["Symbol"] = symbol
+        df["Date"] = pd.to_datetime(df["Date"], format="%a %d %b '%y")
+
+        for sym, sub in df.groupby("Symbol"):
+            frames.setdefault(sym, []).append(sub)
+
+    history = {}
+    for sym, parts in frames.items():
+        df = pd.concat(parts).drop_duplicates("Date").set_index("Date").sort_index()
+        history[sym] = df[["Open", "High", "Low", "Close", "Bullish Bias", "Bearish Bias"]]
+    return history
+
+
+def load_yahoo_history(period: str = "5y") -> Dict[str, "pd.DataFrame"]:
+    """Download daily history for every tracked symbol (cross rates are synthesised)"""
+    from data_fetcher import download_history
+
+    return download_history(period, "1d")
+
+
+def load_store_history(interval: str = "1d") -> Dict[str, "pd.DataFrame"]:
+    """
+    Daily frames from the memory-mapped history store (fill it with
+    `python history_store.py ingest`). Tracked tickers are listed under their
+    symbol, anything else (e.g. the ingested CSVs) under its stored name.
+    Broker series ("1d-ny-close") are indexed by their trading date.
+    """
+    import pandas as pd
+    import history_store
+    from data_fetcher import SYMBOL_MAP
+
+    symbols = {ticker: symbol for symbol, ticker in SYMBOL_MAP.items()}
+    store = history_store.get_store()
+    history = {}
+    for meta in store.list():
+        if meta["interval"] != interval or not meta["rows"]:
+            continue
+        columns = store.series(meta["ticker"], interval).columns
+        index = pd.to_datetime(np.asarray(columns["ts"]), unit="s").normalize()
+        df = pd.DataFrame({name.capitalize(): np.array(columns[name]) for name in ["open", "high", "low", "close"]},
+                          index=index)
+        history[symbols.get(meta["ticker"], meta["ticker"])] = df[~df.index.duplicated(keep="last")]
+    if not history:
+        print(f"No stored {interval} history in {store.root}")
+    return history
+
+
+def load_store_higher(interval: str) -> Dict[str, Dict[str, "pd.DataFrame"]]:
+    """
+    Stored broker W1/MN frames that go with a broker daily series, e.g.
+    1wk-ny-close and 1mo-ny-close for "1d-ny-close" ({} for plain intervals).
+    """
+    from history_store import RESAMPLED_INTERVALS
+
+    daily, _, profile = interval.partition("-")
+    if daily != RESAMPLED_INTERVALS["daily"] or not profile:
+        return {}
+    weekly = load_store_history(f"{RESAMPLED_INTERVALS['weekly']}-{profile}")
+    monthly = load_store_history(f"{RESAMPLED_INTERVALS['monthly']}-{profile}")
+    return {symbol: {"weekly": weekly[symbol], "monthly": monthly[symbol]}
+            for symbol in weekly if symbol in monthly}
+
+
+def prepare_history(frames: Dict[str, "pd.DataFrame"],
+                    stored: Dict[str, Dict[str, "pd.DataFrame"]] = None) -> dict:
+    """
+    Flatten per-symbol daily frames into concatenated numpy arrays.
+
+    Weekly and monthly bars come from `stored` ({symbol: {"weekly": df,
+    "monthly": df}}, broker bars indexed by trading date) when given for a
+    symbol. Otherwise they are resampled from the daily bars, and the first
+    bucket of every symbol is dropped because it is usually partial.
+    Each daily row keeps the index of the week/month it belongs to, so
+    higher timeframe bias can be looked up with a single take().
+    """
+    import pandas as pd
+    from candle_boundaries import date_buckets
+
+    def empty_bars():
+        return {"open": [], "high": [], "low": [], "close": [], "pos": []}
+
+    daily = empty_bars()
+    daily.update({"bull": [], "bear": [], "weekly": [], "monthly": []})
+    higher = {"weekly": empty_bars(), "monthly": empty_bars()}
+    symbols = []
+
+    for symbol, df in frames.items():
+        df = df.sort_index()
+        symbols.append(symbol)
+        n = len(df)
+
+        for col in ["open", "high", "low", "close"]:
+            daily[col].append(df[col.capitalize()].to_numpy(dtype=float))
+        daily["pos"].append(np.arange(n))
+        for col, key in [("Bullish Bias", "bull"), ("Bearish Bias", "bear")]:
+            daily[key].append(df[col].to_numpy(dtype=float) if col in df else np.full(n, np.nan))
+
+        for timeframe, freq in [("weekly", "W-FRI"), ("monthly", "M")]:
+            bars = higher[timeframe]
+            stored_bars = (stored or {}).get(symbol, {}).get(timeframe)
+            if stored_bars is not None:
+                # Match trading dates to the stored broker buckets
+                ohlc = stored_bars.sort_index()
+                periods = date_buckets(df.index.values, timeframe)
+                bucket_index = pd.Index(date_buckets(ohlc.index.values, timeframe))
+            else:
+                periods = df.index.to_period(freq)
+                ohlc = df.groupby(periods).agg({"Open": "first", "High": "max", "Low": "min", "Close": "last"})
+                ohlc = ohlc.iloc[1:]
+                bucket_index = ohlc.index
+
+            offset = sum(len(a) for a in bars["close"])
+            for col in ["open", "high", "low", "close"]:
+                bars[col].append(ohlc[col.capitalize()].to_numpy(dtype=float))
+            bars["pos"].append(np.arange(len(ohlc)))
+
+            # Bucket of every daily row (-1 = inside the dropped first bucket)
+            bucket = bucket_index.get_indexer(periods)
+            daily[timeframe].append(np.where(bucket >= 0, bucket + offset, -1))
+
+    def concat(bars):
+        return {k: (np.concatenate(v) if v else np.array([])) for k, v in bars.items()}
+
+    history = {"symbols": symbols, "daily": concat(daily)}
+    history.update({tf: concat(bars) for tf, bars in higher.items()})
+    return history
+
+
+# ====================================
+# Vectorized evaluation
+# ====================================
+
+def variant_scores(bars: dict, variant: dict, lag: int) -> tuple:
+    """
+    Bias scores for every bar under a variant's rule set (same codes as
+    BIAS_SCORES). Returns (scores, valid) where valid marks bars with
+    enough history.
+    """
+    n = len(bars["close"])
+    c1 = np.arange(n) - lag
+    c2 = c1 - 1
+    valid = bars["pos"] >= lag + 1
+
+    # Invalid rows point at bar 0, the mask hides them afterwards
+    c1 = np.where(valid, c1, 0)
+    c2 = np.where(valid, c2, 0)
+
+    scores = calculate_bias_series(
+        bars["high"][c1], bars["low"][c1], bars["close"][c1], bars["high"][c2], bars["low"][c2],
+        c1_open=bars["open"][c1], c2_open=bars["open"][c2], c2_close=bars["close"][c2],
+        rules=variant["rules"],
+    )
+    return scores, valid
+
+
+def _codes(labels) -> np.ndarray:
+    return np.array([BIAS_SCORES[label] for label in labels], dtype=np.int8)
+
+
+def _forward_return(bars: dict, lag: int, horizon: int) -> np.ndarray:
+    """Return from the bar where a label becomes known to `horizon` bars later"""
+    close = bars["close"]
+    n = len(close)
+    entry = np.arange(n) - lag
+    exit_ = entry + horizon
+    ok = (entry >= 0) & (exit_ < n) & (bars["pos"] >= lag)
+    # Exit must stay inside the same symbol's segment
+    ok &= np.where(ok, bars["pos"][np.clip(exit_, 0, n - 1)] == bars["pos"] - lag + horizon, False)
+
+    entry = np.clip(entry, 0, n - 1)
+    exit_ = np.clip(exit_, 0, n - 1)
+    ret = close[exit_] / close[entry] - 1.0
+    return np.where(ok, ret, np.nan)
+
+
+def evaluate_variant(history: dict, variant: dict, horizon: int = 1) -> dict:
+    """Evaluate one variant over the whole (concatenated) history"""
+    daily = history["daily"]
+    lag = variant["lag"]
+
+    scores, valid = variant_scores(daily, variant, lag)
+    is_bull = np.isin(scores, _codes(variant["bull"]))
+    is_bear = np.isin(scores, _codes(variant["bear"]))
+
+    # Match rate against the labelled CSV columns
+    labelled = valid & ~np.isnan(daily["bull"]) & ~np.isnan(daily["bear"])
+    matches = (is_bull == (daily["bull"] == 1.0)) & (is_bear == (daily["bear"] == 1.0))
+    total = int(labelled.sum())
+    match_rate = float(matches[labelled].mean()) if total else float("nan")
+
+    # Forward return when following the bias direction
+    fwd = _forward_return(daily, lag, horizon)
+    direction = is_bull.astype(np.int8) - is_bear.astype(np.int8)
+    taken = valid & (direction != 0) & ~np.isnan(fwd)
+    bias_return = float((direction * fwd)[taken].mean()) if taken.any() else float("nan")
+
+    # Signals: daily bias combined with the weekly/monthly bias as of that day (live C1/C2)
+    signal_ok = valid.copy()
+    tf_scores = {"daily": scores}
+    for timeframe in ["weekly", "monthly"]:
+        bucket = daily[timeframe]
+        tf_all, tf_valid = variant_scores(history[timeframe], variant, 1)
+        safe = np.clip(bucket, 0, max(len(tf_all) - 1, 0))
+        tf_scores[timeframe] = tf_all[safe] if len(tf_all) else np.zeros_like(scores)
+        signal_ok &= (bucket >= 0) & (tf_valid[safe] if len(tf_all) else False)
+
+    # SIGNAL_LABELS index -> -1 (SELL) / 0 (WAIT) / 1 (BUY)
+    codes = rule_engine.compile_rules(variant["rules"]).signal_series(
+        tf_scores["daily"], tf_scores["weekly"], tf_scores["monthly"]
+    )
+    signal = np.where(signal_ok, codes.astype(np.int8) - SIGNAL_LABELS.index("WAIT"), 0)
+    traded = (signal != 0) & ~np.isnan(fwd)
+    signal_return = float((signal * fwd)[traded].mean()) if traded.any() else float("nan")
+
+    return {
+        "name": variant["name"],
+        "match_rate": match_rate,
+        "matched": int(matches[labelled].sum()),
+        "labelled": total,
+        "bias_return": bias_return,
+        "bias_trades": int(taken.sum()),
+        "signal_return": signal_return,
+        "signal_trades": int(traded.sum()),
+    }
+
+
+# ====================================
+# Process pool
+# ====================================
+
+_worker_history = None
+
+
+def _init_worker(history: dict):
+    global _worker_history
+    _worker_history = history
+
+
+def _evaluate_chunk(args) -> List[dict]:
+    variants, horizon = args
+    return [evaluate_variant(_worker_history, v, horizon) for v in variants]
+
+
+def run_sweep(history: dict, variants: List[dict], horizon: int = 1,
+              workers: int = None, chunk_size: int = 16) -> List[dict]:
+    """
+    Evaluate all variants, spreading chunks across a process pool.
+    The prepared history is shipped once per worker via the initializer.
+    """
+    chunks = [(variants[i:i + chunk_size], horizon) for i in range(0, len(variants), chunk_size)]
+
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(history)
+        return [r for chunk in chunks for r in _evaluate_chunk(chunk)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(history,)) as executor:
+        return [r for results in executor.map(_evaluate_chunk, chunks) for r in results]
+
+
+def rank_results(results: List[dict], key: str = "match_rate") -> List[dict]:
+    """Sort results best first, variants without data for `key` go last"""
+    return sorted(results, key=lambda r: (np.isnan(r[key]), -np.nan_to_num(r[key])))
+
+
+def print_results(results: List[dict], top: int = 20):
+    print(f"{'VARIANT':<52} {'MATCH':>13} {'BIAS RET':>14} {'SIGNAL RET':>14}")
+    print("-" * 96)
+    for r in results[:top]:
+        match = f"{r['matched']}/{r['labelled']}" if r["labelled"] else "-"
+        bias = f"{r['bias_return'] * 1e4:+.1f}bp/{r['bias_trades']}" if r["bias_trades"] else "-"
+        signal = f"{r['signal_return'] * 1e4:+.1f}bp/{r['signal_trades']}" if r["signal_trades"] else "-"
+        print(f"{r['name']:<52} {match:>13} {bias:>14} {signal:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep bias/signal rule variants over history")
+    parser.add_argument("--source", choices=["csv", "yahoo", "store"], default="csv")
+    parser.add_argument("--period", default="5y", help="history period for --source yahoo")
+    parser.add_argument("--interval", default="1d",
+                        help="stored daily series for --source store, e.g. 1d or 1d-ny-close")
+    parser.add_argument("--rank", choices=RANK_KEYS, default="match_rate")
+    parser.add_argument("--rule-sets", default=None,
+                        help="comma-separated rule sets to sweep instead of the built-in grid, "
+                             f"e.g. {','.join(rule_engine.list_rule_sets())}")
+    parser.add_argument("--horizon", type=int, default=1, help="forward return horizon in bars")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    stored = None
+    if args.source == "store":
+        frames = load_store_history(args.interval)
+        stored = load_store_higher(args.interval)
+    elif args.source == "yahoo":
+        frames = load_yahoo_history(args.period)
+    else:
+        frames = load_csv_history()
+    history = prepare_history(frames, stored)
+    rule_sets = [name.strip() for name in args.rule_sets.split(",") if name.strip()] if args.rule_sets else None
+    variants = build_variants(rule_sets=rule_sets)
+
+    print(f"Evaluating {len(variants)} variants over {len(history['daily']['close'])} daily bars "
+          f"({', '.join(history['symbols'])})...")
+    results = rank_results(run_sweep(history, variants, args.horizon, args.workers), args.rank)
+    print_results(results, args.top)
+
+
+if __name__ == "__main__":
+    main()
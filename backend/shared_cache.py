@@ -0,0 +1,559 @@
+"""
+Shared Cache - Cache and snapshot tier shared by all uvicorn/gunicorn workers
+Backends:
+    memory  - per-process dict (default, single worker)
+    mmap    - one file per key in a shared-memory directory, read via mmap
+    redis   - any server speaking the Redis protocol (RESP)
+
+Only one worker is elected (via a lease lock) to refresh a given key; the
+others serve the previous value or wait for the leader's result.
+
+Configure with environment variables:
+    CACHE_BACKEND=memory|mmap|redis
+    CACHE_DIR=/dev/shm/candle-bias-cache      (mmap backend)
+    REDIS_URL=redis://127.0.0.1:6379/0        (redis backend)
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import re
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+
+# ====================================
+# Backends
+# ====================================
+
+class MemoryBackend:
+    """Process-local backend, used when there is a single worker"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float = None, only_if_missing: bool = False) -> bool:
+        with self._lock:
+            if only_if_missing:
+                entry = self._data.get(key)
+                if entry and (not entry[1] or entry[1] >= time.time()):
+                    return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete key only if it still holds `value` (lease release)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry or entry[0] != value or (entry[1] and entry[1] < time.time()):
+                return False
+            del self._data[key]
+            return True
+
+
+class MmapBackend:
+    """
+    One file per key in a directory shared by all workers (tmpfs by default).
+
+    File layout: 8-byte float expires_at (0 = never) followed by the value.
+    Writers replace files atomically, readers map them read-only, so a
+    reader always sees a complete value without taking a lock.
+
+    Locks (only_if_missing) are written completely to a temp file and
+    linked into place; link() fails if the name exists, so exactly one
+    process creates a lock. Removing a lock (expired takeover, release)
+    happens under a per-key flock, so nobody removes a lock that was
+    re-created between their check and their removal.
+
+    Expired files, and guard or temp files left by workers that died, are
+    swept on write at most every SWEEP_INTERVAL seconds.
+    """
+
+    HEADER = struct.Struct("<d")
+    SWEEP_INTERVAL = 300
+    TMP_MAX_AGE = 60         # a temp file this old belongs to a writer that died
+
+    def __init__(self, directory: str = None):
+        if directory is None:
+            base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            directory = os.path.join(base, "candle-bias-cache")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._last_sweep = 0.0
+
+    def _path(self, key: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", key)[:80]
+        digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+        return os.path.join(self.directory, f"{safe}.{digest}")
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    @contextlib.contextmanager
+    def _guarded(self, path: str):
+        """
+        Exclusive flock serializing removals of one key's file across processes.
+        The holder removes the guard file when done; whoever waited on the
+        removed guard sees it is no longer linked and locks a new one.
+        """
+        guard = f"{path}.guard"
+        while True:
+            fd = os.open(guard, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    current = os.stat(guard)
+                except FileNotFoundError:
+                    current = None
+                if current is None or current.st_ino != os.fstat(fd).st_ino:
+                    continue
+                try:
+                    yield
+                finally:
+                    os.remove(guard)
+                return
+            finally:
+                os.close(fd)   # releases the flock
+
+    def _read(self, path: str) -> Optional[bytes]:
+        """The value in path, or None when missing or expired"""
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < self.HEADER.size:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    (expires_at,) = self.HEADER.unpack_from(mapped, 0)
+                    if expires_at and expires_at < time.time():
+                        return None
+                    return mapped[self.HEADER.size:]
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._read(self._path(key))
+
+    def sweep(self):
+        """Remove expired files and files left behind by workers that died"""
+        self._last_sweep = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(".tmp"):
+                    if os.stat(path).st_mtime < self._last_sweep - self.TMP_MAX_AGE:
+                        os.remove(path)
+                elif name.endswith(".guard"):
+                    with self._guarded(path[:-len(".guard")]):
+                        pass
+                elif self._read(path) is None:
+                    # Only remove it if it is still expired under the guard
+                    with self._guarded(path):
+                        if os.path.exists(path) and self._read(path) is None:
+                            os.remove(path)
+            except FileNotFoundError:
+                pass   # removed by another worker meanwhile
+            except OSError as e:
+                print(f"Shared cache sweep of {name} failed: {e}")
+
+    def set(self, key: str, value: bytes, ttl: float = None, only_if_missing: bool = False) -> bool:
+        if time.time() - self._last_sweep > self.SWEEP_INTERVAL:
+            self.sweep()
+        path = self._path(key)
+        header = self.HEADER.pack(time.time() + ttl if ttl else 0.0)
+
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            f.write(header + value)
+
+        if only_if_missing:
+            try:
+                for _ in range(2):
+                    try:
+                        os.link(tmp_path, path)
+                        return True
+                    except FileExistsError:
+                        pass
+                    # Held or expired: only remove it if it is still expired under the guard
+                    with self._guarded(path):
+                        if self.get(key) is not None:
+                            return False
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                return False
+            finally:
+                os.remove(tmp_path)
+
+        os.replace(tmp_path, path)
+        return True
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete key only if it still holds `value` (lease release)"""
+        path = self._path(key)
+        with self._guarded(path):
+            if self.get(key) != value:
+                return False
+            os.remove(path)
+            return True
+
+
+class RedisBackend:
+    """Minimal RESP client (GET / SET NX PX / DEL / EVAL), no redis package needed"""
+
+    # Lease release: delete the lock only while it still holds our owner id
+    COMPARE_AND_DELETE = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._call_locked("AUTH", self.password)
+        if self.db:
+            self._call_locked("SELECT", self.db)
+
+    def _close(self):
+        try:
+            if self._sock:
+                self._sock.close()
+        finally:
+            self._sock = None
+            self._reader = None
+
+    def call(self, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._call_locked(*args)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _call_locked(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+        return read_resp(self._reader)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.call("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float = None, only_if_missing: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        if only_if_missing:
+            args.append("NX")
+        return self.call(*args) == "OK"
+
+    def delete(self, key: str):
+        self.call("DEL", key)
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete key only if it still holds `value` (atomic on the server)"""
+        return self.call("EVAL", self.COMPARE_AND_DELETE, 1, key, value) == 1
+
+
+def read_resp(reader):
+    """Read one RESP reply from a binary file-like object"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RuntimeError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        return None if count < 0 else [read_resp(reader) for _ in range(count)]
+    raise ConnectionError(f"Bad RESP reply: {line!r}")
+
+
+class LocalRespServer:
+    """
+    Tiny in-process stand-in for a Redis server (PING, GET, SET [NX] [PX|EX],
+    DEL, EXISTS, FLUSHALL, and EVAL of RedisBackend.COMPARE_AND_DELETE).
+    For local development and tests only.
+
+        server = LocalRespServer().start()
+        os.environ["REDIS_URL"] = server.url
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.store = MemoryBackend()
+        store = self.store
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        command = read_resp(self.rfile)
+                    except (ConnectionError, OSError):
+                        return
+                    self.wfile.write(LocalRespServer.execute(store, command))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="resp-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def execute(store: MemoryBackend, command) -> bytes:
+        if not isinstance(command, list) or not command:
+            return b"-ERR bad command\r\n"
+        name = command[0].decode().upper()
+        args = command[1:]
+
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "GET":
+            value = store.get(args[0].decode())
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == "SET":
+            ttl, only_if_missing = None, False
+            options = [a.decode().upper() for a in args[2:]]
+            for i, option in enumerate(options):
+                if option == "NX":
+                    only_if_missing = True
+                elif option == "PX":
+                    ttl = int(options[i + 1]) / 1000
+                elif option == "EX":
+                    ttl = int(options[i + 1])
+            if store.set(args[0].decode(), args[1], ttl, only_if_missing):
+                return b"+OK\r\n"
+            return b"$-1\r\n"
+        if name == "DEL":
+            for key in args:
+                store.delete(key.decode())
+            return b":%d\r\n" % len(args)
+        if name == "EVAL":
+            if args[0].decode() != RedisBackend.COMPARE_AND_DELETE or args[1] != b"1":
+                return b"-ERR unsupported script\r\n"
+            return b":%d\r\n" % store.delete_if(args[2].decode(), args[3])
+        if name == "EXISTS":
+            return b":%d\r\n" % sum(store.get(key.decode()) is not None for key in args)
+        if name == "FLUSHALL":
+            store._data.clear()
+            return b"+OK\r\n"
+        if name in ("SELECT", "AUTH"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+# ====================================
+# Cache with leader election
+# ====================================
+
+class SharedCache:
+    """
+    JSON values with freshness on top of a backend.
+
+    Entries are kept for `ttl * stale_factor` seconds so that while the
+    elected worker refreshes a key, everyone else can keep serving the
+    previous value instead of hitting upstream themselves.
+    """
+
+    def __init__(self, backend=None, stale_factor: float = 10):
+        self.backend = backend or MemoryBackend()
+        self.stale_factor = stale_factor
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"     # prefix of this process' lease tokens
+
+    @property
+    def is_shared(self) -> bool:
+        return not isinstance(self.backend, MemoryBackend)
+
+    def get_entry(self, key: str) -> Optional[dict]:
+        """{"stored_at": epoch, "value": ...} or None"""
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            print(f"Shared cache read failed for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def get(self, key: str, max_age: float = None):
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry["stored_at"] > max_age:
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value, ttl: float, stored_at: float = None):
+        payload = json.dumps({"stored_at": stored_at or time.time(), "value": value}).encode()
+        try:
+            self.backend.set(key, payload, ttl * self.stale_factor)
+        except Exception as e:
+            print(f"Shared cache write failed for {key}: {e}")
+
+    # ---------- Leader election ----------
+
+    def acquire(self, key: str, lease: float) -> Optional[str]:
+        """
+        Try to become the refresher for key for at most `lease` seconds.
+        Returns the lease token to pass to release(), or None. Tokens are
+        unique per acquisition, so a holder whose lease expired can never
+        release a lease that another worker or thread holds by now.
+        """
+        token = f"{self.owner}-{uuid.uuid4().hex[:12]}"
+        try:
+            if self.backend.set(f"lock:{key}", token.encode(), lease, only_if_missing=True):
+                return token
+            return None
+        except Exception as e:
+            print(f"Shared cache lock failed for {key}: {e}")
+            return token  # Backend down: refresh locally rather than not at all
+
+    def release(self, key: str, token: str):
+        """Give up the lease, unless it expired and someone else holds it by now"""
+        try:
+            self.backend.delete_if(f"lock:{key}", token.encode())
+        except Exception as e:
+            print(f"Shared cache unlock failed for {key}: {e}")
+
+    def is_locked(self, key: str) -> bool:
+        try:
+            return self.backend.get(f"lock:{key}") is not None
+        except Exception:
+            return False
+
+    def get_or_refresh(self, key: str, ttl: float, refresh: Callable, lease: float = 30,
+                       wait: float = 30, poll: float = 0.05):
+        """
+        Return a fresh value for key, refreshing it in at most one worker.
+
+        Fresh value -> returned. Otherwise the elected worker calls refresh()
+        and stores the result (empty results are not stored; if refresh
+        raises, the stale value is returned when there is one). Workers that
+        lose the election return the stale value if there is one, or wait
+        for the leader's result up to `wait` seconds.
+        """
+        entry = self.get_entry(key)
+        if entry and time.time() - entry["stored_at"] <= ttl:
+            return entry["value"]
+
+        deadline = time.time() + wait
+        while True:
+            token = self.acquire(key, lease)
+            if token:
+                try:
+                    value = refresh()
+                except Exception as e:
+                    if not entry:
+                        raise
+                    print(f"Refresh of {key} failed, serving stale value: {e}")
+                    return entry["value"]
+                finally:
+                    self.release(key, token)
+                if value:
+                    self.set(key, value, ttl)
+                return value if value or not entry else entry["value"]
+
+            if entry:
+                return entry["value"]
+
+            # No value at all yet: wait for the leader
+            while self.is_locked(key) and time.time() < deadline:
+                time.sleep(poll)
+            entry = self.get_entry(key)
+            if entry:
+                return entry["value"]
+            if time.time() >= deadline:
+                return refresh()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SharedCache:
+    """Process-wide SharedCache configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend_name = os.environ.get("CACHE_BACKEND", "memory").lower()
+            if backend_name == "mmap":
+                backend = MmapBackend(os.environ.get("CACHE_DIR"))
+            elif backend_name == "redis":
+                backend = RedisBackend(os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0"))
+            else:
+                backend = MemoryBackend()
+            _cache = SharedCache(backend)
+            print(f"Shared cache backend: {type(backend).__name__}")
+        return _cache
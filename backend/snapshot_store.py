@@ -0,0 +1,239 @@
+"""
+Snapshot Store - Last computed bias snapshot, persisted to disk
+Lets a freshly started instance answer /api/bias from the previous run
+while the live refresh happens in the background.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+import data_fetcher
+import shared_cache
+
+SNAPSHOT_KEY = "snapshot:bias"
+
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".state")
+
+
+class SnapshotStore:
+    """
+    Holds the current bias snapshot:
+        {"data": [...], "count": n, "generated_at": epoch, "version": v, "epoch": "9f1c..."}
+
+    Every published snapshot gets the next version number, and the row-level
+    diff to the previous one is kept in a bounded ring so clients can ask
+    for "changes since version N" instead of downloading everything.
+    Versions only mean something within one lineage: "epoch" is a random id
+    created with the first snapshot and carried (and persisted) with every
+    later one, so a version from another server lifetime is never mistaken
+    for one of ours.
+
+    The snapshot and the data_fetcher candle cache are written to
+    `state_dir` after every refresh and read back on startup.
+    
+    Published snapshots are also written to the shared cache tier, and
+    sync() adopts a newer snapshot published by another worker.
+    """
+
+    def __init__(self, state_dir: str = None, max_age: float = 60, sync_interval: float = 1.0,
+                 diff_history: int = 120):
+        self.state_dir = state_dir or os.environ.get("STATE_DIR", DEFAULT_STATE_DIR)
+        self.max_age = max_age
+        self.sync_interval = sync_interval
+        self.snapshot: Optional[dict] = None
+        self.diffs = deque(maxlen=diff_history)   # {"from": v, "to": v2, "upserts": [...], "removed": [...]}
+        self._encoded: dict = {}
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.state_dir, "snapshot.json")
+
+    @property
+    def candles_path(self) -> str:
+        return os.path.join(self.state_dir, "candles.json")
+
+    def age(self) -> float:
+        if not self.snapshot:
+            return float("inf")
+        return time.time() - self.snapshot["generated_at"]
+
+    def is_stale(self) -> bool:
+        return self.age() > self.max_age
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.get("version", 0) if self.snapshot else 0
+
+    @property
+    def epoch(self) -> Optional[str]:
+        return self.snapshot.get("epoch") if self.snapshot else None
+
+    @staticmethod
+    def new_epoch() -> str:
+        return secrets.token_hex(8)
+
+    def publish(self, rows: List[dict]) -> dict:
+        """Replace the current snapshot with freshly computed rows (next version)"""
+        with self._lock:
+            snapshot = {
+                "data": rows,
+                "count": len(rows),
+                "generated_at": time.time(),
+                "version": self.version + 1,
+                "epoch": self.epoch or self.new_epoch(),
+            }
+            self._replace(snapshot)
+        
+        cache = shared_cache.get_cache()
+        if cache.is_shared:
+            cache.set(SNAPSHOT_KEY, snapshot, self.max_age, stored_at=snapshot["generated_at"])
+        return snapshot
+
+    def sync_due(self) -> bool:
+        """Whether sync() would check the shared tier now (cheap, no I/O)"""
+        return shared_cache.get_cache().is_shared and time.time() - self._last_sync >= self.sync_interval
+
+    def sync(self, force: bool = False) -> Optional[dict]:
+        """
+        Adopt a newer snapshot from the shared tier (checked at most once
+        per sync_interval unless forced). Returns the adopted snapshot or None.
+        Reads the shared tier, so call it from an executor in async code.
+        """
+        cache = shared_cache.get_cache()
+        now = time.time()
+        if not cache.is_shared or (not force and now - self._last_sync < self.sync_interval):
+            return None
+        self._last_sync = now
+        
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if not snapshot:
+            return None
+        with self._lock:
+            if self.snapshot and self.snapshot["generated_at"] >= snapshot["generated_at"]:
+                return None
+            self._replace(snapshot)
+        return snapshot
+
+    def _replace(self, snapshot: dict):
+        """Swap in a new snapshot and record its diff (caller holds the lock)"""
+        previous = self.snapshot
+        if previous is not None and previous.get("epoch") != snapshot.get("epoch"):
+            # Another lineage (e.g. adopted from a worker that started fresh): old diffs don't chain into it
+            self.diffs.clear()
+        elif previous is not None:
+            old_rows = {row["symbol"]: row for row in previous["data"]}
+            new_symbols = {row["symbol"] for row in snapshot["data"]}
+            self.diffs.append({
+                "from": previous.get("version", 0),
+                "to": snapshot.get("version", 0),
+                "upserts": [row for row in snapshot["data"] if old_rows.get(row["symbol"]) != row],
+                "removed": [symbol for symbol in old_rows if symbol not in new_symbols],
+            })
+        self.snapshot = snapshot
+        self._encoded = {}
+
+    def changes_since(self, version: int, epoch: str = None) -> dict:
+        """
+        Rows that changed between `version` and the current snapshot.
+        Falls back to the full snapshot ("full": True) when the client's
+        epoch is not ours or its version is unknown or already dropped out
+        of the diff ring.
+        """
+        with self._lock:
+            snapshot = self.snapshot
+            current = self.version
+            diffs = list(self.diffs)
+        
+        result = {"version": current, "epoch": snapshot.get("epoch"), "since": version,
+                  "generated_at": snapshot["generated_at"]}
+        if epoch != snapshot.get("epoch"):
+            return {**result, "full": True, "data": snapshot["data"], "count": snapshot["count"]}
+        if version == current:
+            return {**result, "full": False, "upserts": [], "removed": []}
+        
+        # Chain diffs from the client's version forward
+        upserts, removed = {}, set()
+        cursor = version
+        for diff in diffs:
+            if diff["from"] != cursor:
+                continue
+            for row in diff["upserts"]:
+                upserts[row["symbol"]] = row
+                removed.discard(row["symbol"])
+            for symbol in diff["removed"]:
+                upserts.pop(symbol, None)
+                removed.add(symbol)
+            cursor = diff["to"]
+        
+        if cursor != current:
+            return {**result, "full": True, "data": snapshot["data"], "count": snapshot["count"]}
+        return {**result, "full": False, "upserts": list(upserts.values()), "removed": sorted(removed)}
+
+    def encoded(self, key, build):
+        """
+        Serialized response derived from the current snapshot, built once
+        and cached until the next publish. key is e.g. ("bias", media_type).
+        """
+        with self._lock:
+            cache = self._encoded
+            body = cache.get(key)
+        if body is None:
+            body = build()
+            # Stored in the cache of the snapshot it was built from
+            with self._lock:
+                cache[key] = body
+        return body
+
+    # ---------- Persistence ----------
+
+    def load(self) -> bool:
+        """Load snapshot and candle cache from disk, returns True if a snapshot was found"""
+        try:
+            with open(self.candles_path) as f:
+                loaded = data_fetcher.import_candle_cache(json.load(f))
+            print(f"Loaded {loaded} cached candle series from {self.candles_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading candle cache: {e}")
+
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading snapshot: {e}")
+            return False
+
+        # Snapshots saved before epochs existed start a new lineage
+        snapshot.setdefault("epoch", self.new_epoch())
+        with self._lock:
+            if self.snapshot is None:
+                self._replace(snapshot)
+        print(f"Loaded snapshot from {self.snapshot_path} ({self.age():.0f}s old)")
+        return True
+
+    def save(self):
+        """Write snapshot and candle cache to disk (atomic replace)"""
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            if self.snapshot:
+                self._write_json(self.snapshot_path, self.snapshot)
+            self._write_json(self.candles_path, data_fetcher.export_candle_cache())
+        except Exception as e:
+            print(f"Error saving snapshot: {e}")
+
+    @staticmethod
+    def _write_json(path: str, payload):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alerts import AlertEngine, WebhookDispatcher, check_webhook_url
+
+SYMBOLS = ["EUR/USD", "GBP/USD", "XAU/USD"]
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(json.loads(body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    """Local webhook stub; set .statuses to fail the first deliveries"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    server.received, server.statuses = [], []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def _engine(tmp_path, **dispatcher_options):
+    dispatcher = WebhookDispatcher(flush_interval=0.05, backoff=0.01, allow_private=True, **dispatcher_options)
+    return AlertEngine(dispatcher, db_path=str(tmp_path / "alerts.db"), known_symbols=SYMBOLS)
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _row(symbol, signal, daily="NEUTRAL"):
+    return {"symbol": symbol, "signal": signal, "daily": daily, "weekly": "NEUTRAL", "monthly": "NEUTRAL"}
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:6379/",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.1.2.3/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_private_targets_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_webhook_url(url)
+    check_webhook_url(url, allow_private=True)
+
+
+@pytest.mark.parametrize("url", ["ftp://example.com/hook", "hook", "http://", "http://host:notaport/"])
+def test_malformed_urls_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_webhook_url(url, allow_private=True)
+
+
+def test_public_address_is_accepted():
+    check_webhook_url("https://8.8.8.8/hook")
+
+
+def test_subscribe_validates_symbol_and_target(tmp_path):
+    engine = AlertEngine(WebhookDispatcher(allow_private=False), db_path=str(tmp_path / "alerts.db"),
+                         known_symbols=SYMBOLS)
+    with pytest.raises(ValueError, match="Unknown symbol"):
+        engine.subscribe("alice", "https://8.8.8.8/hook", symbol="EURUSD")
+    with pytest.raises(ValueError, match="non-public"):
+        engine.subscribe("alice", "http://169.254.169.254/", symbol="EUR/USD")
+    with pytest.raises(ValueError, match="Invalid to value"):
+        engine.subscribe("alice", "https://8.8.8.8/hook", to="MAYBE")
+    assert engine.subscribe("alice", "https://8.8.8.8/hook", symbol="eur-usd")["symbol"] == "EUR/USD"
+
+
+def test_subscriptions_are_scoped_to_their_owner(tmp_path):
+    engine = _engine(tmp_path)
+    alice = engine.subscribe("alice", "http://127.0.0.1:1/a")
+    engine.subscribe("bob", "http://127.0.0.1:1/b")
+
+    assert [s["url"] for s in engine.list_subscriptions("alice")] == ["http://127.0.0.1:1/a"]
+    assert not engine.unsubscribe(alice["id"], "bob")
+    assert engine.unsubscribe(alice["id"], "alice")
+    assert engine.list_subscriptions("alice") == []
+
+    # Another engine on the same database (another worker) sees the same state
+    other = _engine(tmp_path)
+    assert [s["owner"] for s in other.list_subscriptions("bob")] == ["bob"]
+
+
+def test_transitions_are_delivered_to_the_webhook(tmp_path, receiver):
+    engine = _engine(tmp_path)
+    engine.subscribe("alice", receiver.url, symbol="EUR/USD", field="signal", to="BUY")
+    try:
+        engine.observe([_row("EUR/USD", "WAIT"), _row("GBP/USD", "WAIT")])
+        transitions = engine.observe([_row("EUR/USD", "BUY"), _row("GBP/USD", "BUY")])
+        assert len(transitions) == 2
+
+        _wait(lambda: receiver.received)
+        events = [event for batch in receiver.received for event in batch["events"]]
+        assert [(e["symbol"], e["from"], e["to"]) for e in events] == [("EUR/USD", "WAIT", "BUY")]
+    finally:
+        engine.dispatcher.stop()
+
+
+def test_seeded_state_alerts_on_the_first_live_snapshot(tmp_path, receiver):
+    engine = _engine(tmp_path)
+    engine.subscribe("alice", receiver.url, field="daily")
+    try:
+        engine.seed([_row("XAU/USD", "WAIT", daily="BEAR")])
+        engine.observe([_row("XAU/USD", "WAIT", daily="BULL")])
+        _wait(lambda: receiver.received)
+        assert receiver.received[0]["events"][0]["to"] == "BULL"
+    finally:
+        engine.dispatcher.stop()
+
+
+def test_failed_deliveries_are_retried(tmp_path, receiver):
+    receiver.statuses = [500, 500]
+    engine = _engine(tmp_path, max_attempts=3)
+    engine.subscribe("alice", receiver.url)
+    try:
+        engine.observe([_row("EUR/USD", "WAIT")])
+        engine.observe([_row("EUR/USD", "SELL")])
+        _wait(lambda: engine.dispatcher.stats["delivered"] == 1)
+        assert len(receiver.received) == 3
+        assert engine.dispatcher.stats["retries"] == 2
+    finally:
+        engine.dispatcher.stop()
+
+
+def test_private_webhooks_are_not_delivered_without_opt_in(tmp_path, receiver):
+    engine = _engine(tmp_path)
+    engine.subscribe("alice", receiver.url)
+    engine.dispatcher.allow_private = False
+    try:
+        engine.observe([_row("EUR/USD", "WAIT")])
+        engine.observe([_row("EUR/USD", "SELL")])
+        _wait(lambda: engine.dispatcher.stats["dropped"] == 1)
+        assert receiver.received == []
+    finally:
+        engine.dispatcher.stop()
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+import candle_boundaries
+from candle_boundaries import (BROKER_PROFILES, SESSIONS, BoundaryCalendar, bucket_dates, bucket_label,
+                               date_buckets, resample, session_for)
+
+HOUR = 3600
+
+
+def _epoch(text):
+    return int(datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _naive_trading_date(ts, profile):
+    """Trading date of one UTC hour straight from zoneinfo, hour by hour"""
+    broker = BROKER_PROFILES[profile]
+    local = datetime.fromtimestamp(ts, timezone.utc).astimezone(ZoneInfo(broker["tz"]))
+    day = (local + timedelta(hours=(24 - broker["day_start_hour"]) % 24)).date()
+    if broker["sunday_into_monday"] and day.weekday() == 6:
+        day += timedelta(days=1)
+    return np.datetime64(day, "D")
+
+
+def _naive_in_session(ts, session):
+    spec = SESSIONS[session]
+    local = datetime.fromtimestamp(ts, timezone.utc).astimezone(ZoneInfo(spec["tz"]))
+    week_hour = local.weekday() * 24 + local.hour
+    open_, close = spec["open"][0] * 24 + spec["open"][1], spec["close"][0] * 24 + spec["close"][1]
+    inside = week_hour >= open_ or week_hour < close if open_ > close else open_ <= week_hour < close
+    return inside and not any(start <= local.hour < end for start, end in spec["breaks"])
+
+
+@pytest.mark.parametrize("profile", list(BROKER_PROFILES))
+def test_trading_days_match_zoneinfo_through_dst_changes(profile):
+    # US DST changes on 10 Mar and 3 Nov 2024, UK on 31 Mar and 27 Oct
+    start, end = _epoch("2024-03-01T00:00"), _epoch("2024-11-15T00:00")
+    calendar = BoundaryCalendar(profile, "fx", start, end)
+    hours = np.arange(start, end, HOUR, dtype=np.int64)
+    days, _ = calendar.lookup(hours, "daily")
+    expected = [_naive_trading_date(int(ts), profile) for ts in hours]
+    assert bucket_dates(days, "daily").tolist() == expected
+
+
+@pytest.mark.parametrize("session", list(SESSIONS))
+def test_sessions_match_zoneinfo_through_dst_changes(session):
+    start, end = _epoch("2024-03-01T00:00"), _epoch("2024-04-08T00:00")
+    calendar = BoundaryCalendar("ny-close", session, start, end)
+    hours = np.arange(start, end, HOUR, dtype=np.int64)
+    _, in_session = calendar.lookup(hours, "daily")
+    assert in_session.tolist() == [_naive_in_session(int(ts), session) for ts in hours]
+
+
+def test_ny_close_day_starts_at_17_new_york_in_summer_and_winter():
+    calendar = BoundaryCalendar("ny-close", "fx", _epoch("2024-01-01T00:00"), _epoch("2024-12-31T00:00"))
+
+    def day(text):
+        return bucket_label(calendar.lookup([_epoch(text)], "daily")[0][0], "daily")
+
+    assert day("2024-07-02T20:00") == "2024-07-02"
+    assert day("2024-07-02T21:00") == "2024-07-03"      # EDT, UTC-4
+    assert day("2024-01-09T21:00") == "2024-01-09"
+    assert day("2024-01-09T22:00") == "2024-01-10"      # EST, UTC-5
+
+
+def test_sunday_session_is_folded_into_monday_for_gmt2():
+    calendar = BoundaryCalendar("gmt+2", "fx", _epoch("2024-06-01T00:00"), _epoch("2024-06-30T00:00"))
+    sunday_evening, monday = calendar.lookup([_epoch("2024-06-16T22:00"), _epoch("2024-06-17T08:00")], "daily")[0]
+    assert sunday_evening == monday
+
+
+def test_bucket_dates_and_date_buckets_round_trip():
+    dates = np.array(["2024-06-30", "2024-07-01", "2024-07-06", "2024-12-31"], dtype="datetime64[D]")
+    for timeframe in ["daily", "weekly", "monthly"]:
+        buckets = date_buckets(dates, timeframe)
+        assert date_buckets(bucket_dates(buckets, timeframe), timeframe).tolist() == buckets.tolist()
+    assert bucket_dates(date_buckets(dates, "weekly"), "weekly").tolist() == \
+        np.array(["2024-06-30", "2024-06-30", "2024-06-30", "2024-12-29"], dtype="datetime64[D]").tolist()
+    assert bucket_dates(date_buckets(dates, "monthly"), "monthly").astype(str).tolist() == \
+        ["2024-06-01", "2024-07-01", "2024-07-01", "2024-12-01"]
+
+
+def test_resample_aggregates_ohlc_and_drops_out_of_session_bars():
+    ts = np.arange(_epoch("2024-07-05T19:00"), _epoch("2024-07-08T23:00"), HOUR, dtype=np.int64)
+    price = np.arange(len(ts), dtype=np.float64)
+    candles = resample(ts, price, price + 0.5, price - 0.5, price + 0.25, "daily")
+
+    # Friday 19:00-21:00 UTC, the weekend is closed, then Sunday 21:00 onwards is Monday
+    assert [bucket_label(b, "daily") for b in candles["bucket"]] == ["2024-07-05", "2024-07-08", "2024-07-09"]
+    assert candles["bars"].tolist() == [2, 24, 2]
+    monday = np.flatnonzero(ts == _epoch("2024-07-07T21:00"))[0]
+    assert candles["open"][1] == price[monday]
+    assert candles["high"][1] == price[monday + 23] + 0.5
+    assert candles["low"][1] == price[monday] - 0.5
+    assert candles["close"][1] == price[monday + 23] + 0.25
+
+
+def test_invalid_arguments_are_rejected():
+    with pytest.raises(ValueError, match="Unknown broker profile"):
+        BoundaryCalendar("tokyo", "fx", 0, HOUR)
+    with pytest.raises(ValueError, match="Invalid timeframe"):
+        resample([0], [1], [1], [1], [1], "hourly")
+    with pytest.raises(ValueError, match="non whole-hour"):
+        candle_boundaries._hourly_offsets("Asia/Kolkata", np.array([0], dtype=np.int64))
+
+
+def test_session_for_cross_rates_follows_the_non_fx_leg():
+    assert session_for("EURUSD=X") == "fx"
+    assert session_for("GC=F") == "cme_metals"
+    assert session_for("CROSS:GC=F*USDJPY=X") == "cme_metals"
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import encoders
+from encoders import ARROW, JSON, MSGPACK, NotAcceptable, negotiate
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    """Pretend msgpack is installed and pyarrow is not"""
+    monkeypatch.setattr(encoders, "available_formats", lambda: [JSON, MSGPACK])
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("application/msgpack", MSGPACK),
+    ("application/x-msgpack", MSGPACK),
+    ("application/json, application/msgpack", JSON),
+    ("application/json;q=0.5, application/msgpack", MSGPACK),
+    ("application/msgpack;q=0.2, application/json;q=0.9", JSON),
+    ("application/msgpack; q=0.8, text/html", MSGPACK),
+    ("application/msgpack;q=0", JSON),
+    ("application/msgpack;q=oops, application/json;q=0.1", JSON),
+    # Unavailable and unknown types fall through to the next acceptable one
+    ("application/vnd.apache.arrow.stream, application/msgpack;q=0.5", MSGPACK),
+    ("text/html, */*;q=0.8", JSON),
+])
+def test_accept_header_is_honoured_by_q_value(installed, accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_format_parameter_wins_over_accept(installed):
+    assert negotiate("application/msgpack", "json") == JSON
+    assert negotiate(None, "MSGPACK") == MSGPACK
+    with pytest.raises(NotAcceptable, match="available: json, msgpack"):
+        negotiate(JSON, "arrow")
+    with pytest.raises(NotAcceptable, match="Unsupported format: xml"):
+        negotiate(JSON, "xml")
+
+
+def test_equal_q_values_keep_the_client_order(monkeypatch):
+    monkeypatch.setattr(encoders, "available_formats", lambda: [JSON, MSGPACK, ARROW])
+    assert negotiate(f"{ARROW}, {MSGPACK}") == ARROW
+    assert negotiate(f"{MSGPACK};q=0.9, {ARROW};q=0.9") == MSGPACK
+
+
+def _bias_payload():
+    return {"data": [{"symbol": "EUR/USD", "daily": "BULL", "weekly": "STRONG BEAR", "monthly": "NEUTRAL",
+                      "signal": "BUY"}], "count": 1, "version": 3}
+
+
+def test_bias_encodings_carry_the_same_rows():
+    payload = _bias_payload()
+    assert json.loads(encoders.encode_bias(payload, JSON)) == payload
+
+    msgpack = pytest.importorskip("msgpack")
+    decoded = msgpack.unpackb(encoders.encode_bias(payload, MSGPACK))
+    labels = decoded["labels"]
+    assert decoded["version"] == 3
+    assert labels["bias"][decoded["columns"]["weekly"][0]] == "STRONG BEAR"
+    assert labels["signal"][decoded["columns"]["signal"][0]] == "BUY"
+
+    pyarrow = pytest.importorskip("pyarrow")
+    table = pyarrow.ipc.open_stream(encoders.encode_bias(payload, ARROW)).read_all()
+    assert table.column("daily").to_pylist() == ["BULL"]
+    assert table.column("signal").to_pylist() == ["BUY"]
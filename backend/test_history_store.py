@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import history_store
+import rule_sweep
+from history_store import HistoryStore, resample_history
+
+HOUR = 3600
+
+
+def _epoch(text):
+    return int(np.datetime64(text, "s").astype(np.int64))
+
+
+def _hourly(store, ticker, start, end):
+    """Stub 1h bars whose prices are the bar's hour number, so opens name their hour"""
+    ts = np.arange(_epoch(start), _epoch(end), HOUR, dtype=np.int64)
+    price = (ts - ts[0]) / HOUR + 1.0
+    store.write(ticker, "1h", ts, price, price + 0.5, price - 0.5, price)
+    return ts
+
+
+def _dates(series):
+    return [str(np.datetime64(int(ts), "s").astype("datetime64[D]")) for ts in series.columns["ts"]]
+
+
+def test_broker_bars_are_stored_at_their_trading_date(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    ts = _hourly(store, "EURUSD=X", "2024-06-16T00:00", "2024-07-13T00:00")
+    resample_history(store, "ny-close")
+
+    daily = store.series("EURUSD=X", "1d-ny-close")
+    dates = _dates(daily)
+    # Monday 2024-07-01 opens Sunday 17:00 New York (21:00 UTC) and is dated Monday
+    assert "2024-06-30" not in dates
+    monday = dates.index("2024-07-01")
+    assert daily.columns["open"][monday] == np.flatnonzero(ts == _epoch("2024-06-30T21:00"))[0] + 1
+    assert np.all(daily.columns["ts"] % 86400 == 0)
+
+    # Its month bucket is July, not June
+    monthly = store.series("EURUSD=X", "1mo-ny-close")
+    assert _dates(monthly) == ["2024-07-01"]
+    assert monthly.columns["open"][0] == daily.columns["open"][monday]
+
+    weekly = _dates(store.series("EURUSD=X", "1wk-ny-close"))
+    assert weekly == ["2024-06-23", "2024-06-30", "2024-07-07"]
+
+
+def test_resample_replaces_previous_derived_series(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    _hourly(store, "EURUSD=X", "2024-06-16T00:00", "2024-07-13T00:00")
+    store.write("EURUSD=X", "1d-ny-close", [_epoch("2024-06-30T21:00")], [1.0], [1.0], [1.0], [1.0])
+    resample_history(store, "ny-close")
+    assert "2024-06-30" not in _dates(store.series("EURUSD=X", "1d-ny-close"))
+
+
+def test_sweep_uses_stored_broker_buckets(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path))
+    _hourly(store, "EURUSD=X", "2024-06-16T00:00", "2024-07-13T00:00")
+    resample_history(store, "ny-close")
+    monkeypatch.setattr(history_store, "_store", store)
+
+    frames = rule_sweep.load_store_history("1d-ny-close")
+    stored = rule_sweep.load_store_higher("1d-ny-close")
+    frame = frames["EUR/USD"]
+    assert pd.Timestamp("2024-07-01") in frame.index
+    assert set(stored["EUR/USD"]) == {"weekly", "monthly"}
+
+    history = rule_sweep.prepare_history(frames, stored)
+    daily = history["daily"]
+    monday = frame.index.get_loc(pd.Timestamp("2024-07-01"))
+    friday = frame.index.get_loc(pd.Timestamp("2024-06-28"))
+    # The first July trading day maps to the July bar, the last June one to nothing stored
+    assert daily["monthly"][monday] == 0
+    assert history["monthly"]["open"][0] == frame["Open"].iloc[monday]
+    assert daily["monthly"][friday] == -1
+    # Monday and the Friday before it are in consecutive Sunday-based weeks
+    assert daily["weekly"][monday] == daily["weekly"][friday] + 1
+    assert history["weekly"]["open"][daily["weekly"][monday]] == frame["Open"].iloc[monday]
+
+
+def test_plain_daily_intervals_have_no_stored_buckets():
+    assert rule_sweep.load_store_higher("1d") == {}
+
+
+def _columns(series):
+    return {name: np.asarray(values).tolist() for name, values in series.columns.items()}
+
+
+def test_newer_bars_are_appended_in_place(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.write("EURUSD=X", "1d", [10, 20], [1, 2], [1, 2], [1, 2], [1, 2])
+    directory = os.stat(os.path.join(tmp_path, "EURUSD=X", "1d")).st_ino
+
+    assert store.write("EURUSD=X", "1d", [40, 30], [4, 3], [4, 3], [4, 3], [4, 3]) == 4
+    assert os.stat(os.path.join(tmp_path, "EURUSD=X", "1d")).st_ino == directory
+    series = store.series("EURUSD=X", "1d")
+    assert _columns(series)["ts"] == [10, 20, 30, 40]
+    assert _columns(series)["close"] == [1, 2, 3, 4]
+    assert (series.meta["first"], series.meta["last"]) == (10, 40)
+
+
+def test_overlapping_bars_are_merged_and_replace_stored_ones(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.write("EURUSD=X", "1d", [10, 20, 30], [1, 2, 3], [1, 2, 3], [1, 2, 3], [1, 2, 3])
+    # Older, equal and newer timestamps; the later of two incoming duplicates wins
+    store.write("EURUSD=X", "1d", [5, 20, 35, 20], [0, 9, 7, 8], [0, 9, 7, 8], [0, 9, 7, 8], [0, 9, 7, 8])
+
+    columns = _columns(store.series("EURUSD=X", "1d"))
+    assert columns["ts"] == [5, 10, 20, 30, 35]
+    assert columns["close"] == [0, 1, 8, 3, 7]
+
+
+def test_range_index_matches_a_full_search_across_fences(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    ts = np.arange(3 * history_store.FENCE_STRIDE + 17, dtype=np.int64) * HOUR
+    price = np.ones(len(ts))
+    store.write("EURUSD=X", "1h", ts[:1500], price[:1500], price[:1500], price[:1500], price[:1500])
+    store.write("EURUSD=X", "1h", ts[1500:], price[1500:], price[1500:], price[1500:], price[1500:])
+    series = store.series("EURUSD=X", "1h")
+    assert len(series.fences) == 4
+
+    for start, end in [(0, HOUR), (-HOUR, 10 ** 9), (1023 * HOUR, 1025 * HOUR + 1),
+                       (2048 * HOUR - 1, 3000 * HOUR), (ts[-1], ts[-1] + 1), (ts[-1] + 1, None), (None, 7 * HOUR)]:
+        i = 0 if start is None else np.searchsorted(ts, start)
+        j = len(ts) if end is None else np.searchsorted(ts, end)
+        assert series.range_index(start, end) == (i, max(i, j))
+    assert series.slice("1970-01-02", "1970-01-03")["ts"].tolist() == ts[24:48].tolist()
+
+
+def test_invalid_intervals_and_tickers_are_rejected(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    with pytest.raises(ValueError, match="Invalid interval"):
+        store.series("EURUSD=X", "../1d")
+    with pytest.raises(ValueError, match="Invalid ticker"):
+        store.write("..", "1d", [1], [1], [1], [1], [1])
+    assert store.series("EURUSD=X", "1d") is None
@@ -0,0 +1,123 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+import rule_engine
+from bias_calculator import BIAS_LABELS, BIAS_SCORES, SIGNAL_LABELS
+from rule_engine import DEFAULT_RULES, CompiledRules, RuleError, compile_rules, load_rule_set
+
+
+def _candle(open_, high, low, close):
+    return {"open": open_, "high": high, "low": low, "close": close}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("c1.close", (((1.0, "c1", "close"),), 0.0)),
+    (1.5, ((), 1.5)),
+    ("c2.high + 0.0001 * c2.close", (((1.0, "c2", "high"), (0.0001, "c2", "close")), 0.0)),
+    ("2 * c1.low - c2.low - .5", (((2.0, "c1", "low"), (-1.0, "c2", "low")), -0.5)),
+    ("c1.close*1e-3 + c1.close", (((1.001, "c1", "close"),), 0.0)),
+])
+def test_operands_parse_to_linear_expressions(text, expected):
+    assert rule_engine._operand(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "", "c3.close", "c1.volume", "c1.close * c2.close", "c1.close +", "2 * 3", "* c1.close",
+    "c1.close c2.close", "__import__('os')", "c1.close; import os", True,
+])
+def test_invalid_operands_are_rejected(text):
+    with pytest.raises(RuleError, match="Invalid operand"):
+        rule_engine._operand(text)
+
+
+def test_default_bias_rules():
+    rules = compile_rules(DEFAULT_RULES)
+    c2 = _candle(1.0, 2.0, 0.5, 1.5)
+    assert rules.bias(_candle(1.5, 2.5, 1.0, 2.1), c2) == "STRONG BULL"
+    assert rules.bias(_candle(1.5, 1.8, 0.2, 0.4), c2) == "STRONG BEAR"
+    assert rules.bias(_candle(1.5, 2.5, 1.0, 1.9), c2) == "BEAR"
+    assert rules.bias(_candle(1.5, 1.9, 0.4, 1.0), c2) == "BULL"
+    assert rules.bias(_candle(1.5, 1.9, 0.6, 1.0), c2) == "NEUTRAL"
+
+
+def test_batch_evaluation_matches_the_generated_function():
+    rules = compile_rules({**DEFAULT_RULES, "bias": DEFAULT_RULES["bias"] + [
+        {"label": "BULL", "when": [["c1.close", ">", "c2.close + 0.001 * c2.close"]]},
+    ]})
+    rng = np.random.default_rng(7)
+    low = rng.uniform(1.0, 2.0, (2, 500))
+    high = low + rng.uniform(0.0, 0.5, (2, 500))
+    open_, close = [low + rng.uniform(0, 1, (2, 500)) * (high - low) for _ in range(2)]
+    c1 = {"open": open_[0], "high": high[0], "low": low[0], "close": close[0]}
+    c2 = {"open": open_[1], "high": high[1], "low": low[1], "close": close[1]}
+
+    scores = rules.bias_series(c1, c2)
+    expected = [BIAS_SCORES[rules.bias({k: v[i] for k, v in c1.items()}, {k: v[i] for k, v in c2.items()})]
+                for i in range(500)]
+    assert scores.tolist() == expected
+
+
+def test_signal_rules_scalar_and_batch():
+    rules = compile_rules(DEFAULT_RULES)
+    assert rules.signal("BULL", "STRONG BULL", "BULL") == "BUY"
+    assert rules.signal("BEAR", "BEAR", "STRONG BEAR") == "SELL"
+    assert rules.signal("BULL", "BEAR", "BULL") == "WAIT"
+
+    labels = [(d, w, m) for d in BIAS_LABELS for w in BIAS_LABELS for m in BIAS_LABELS]
+    codes = rules.signal_series(*[[BIAS_SCORES[row[i]] for row in labels] for i in range(3)])
+    assert [SIGNAL_LABELS[code] for code in codes] == [rules.signal(*row) for row in labels]
+
+
+def test_batch_callers_must_supply_the_fields_the_rules_read():
+    rules = compile_rules(DEFAULT_RULES)
+    assert ("c1", "close") in rules.fields and ("c2", "open") not in rules.fields
+    with pytest.raises(RuleError, match="needs c2.low"):
+        rules.bias_series({"high": [1], "low": [1], "close": [1]}, {"high": [1]})
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda r: r["bias"][0].update(label="UP"), "Invalid bias label"),
+    (lambda r: r["bias"][0].update(when=[["c1.close", "=>", "c2.high"]]), "Invalid operator"),
+    (lambda r: r["bias"][0].update(when=[["c1.close", ">"]]), "Invalid condition"),
+    (lambda r: r["signal"][0]["when"].update(hourly=["BULL"]), "Invalid timeframe"),
+    (lambda r: r["signal"][0]["when"].update(daily=["UP"]), "Invalid bias labels"),
+    (lambda r: r.update(signal_default="HOLD"), "Invalid signal_default"),
+])
+def test_malformed_rule_sets_are_rejected(change, message):
+    rules = copy.deepcopy(DEFAULT_RULES)
+    change(rules)
+    with pytest.raises(RuleError, match=message):
+        CompiledRules(rules)
+
+
+def test_versions_follow_the_content():
+    changed = copy.deepcopy(DEFAULT_RULES)
+    changed["bias"].pop()
+    assert compile_rules(copy.deepcopy(DEFAULT_RULES)) is compile_rules(DEFAULT_RULES)
+    assert compile_rules(changed).version != compile_rules(DEFAULT_RULES).version
+
+
+def test_rule_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("RULES_DIR", str(tmp_path))
+    path = tmp_path / "desk-a.json"
+    path.write_text(json.dumps({**DEFAULT_RULES, "name": "desk-a"}))
+    assert load_rule_set("desk-a")["name"] == "desk-a"
+    assert rule_engine.list_rule_sets() == ["default", "desk-a"]
+    assert load_rule_set("default") == DEFAULT_RULES
+
+    path.write_text(json.dumps({**DEFAULT_RULES, "name": "desk-a", "version": 2}))
+    os.utime(path, (0, os.path.getmtime(path) + 5))
+    assert load_rule_set("desk-a")["version"] == 2
+
+    (tmp_path / "broken.json").write_text("{")
+    with pytest.raises(RuleError, match="Invalid JSON"):
+        load_rule_set("broken")
+    with pytest.raises(RuleError, match="Unknown rule set"):
+        load_rule_set("desk-b")
+    for name in ["../desk-a", ".hidden", "a\\b"]:
+        with pytest.raises(RuleError, match="Invalid rule set name"):
+            load_rule_set(name)
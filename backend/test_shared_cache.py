@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from shared_cache import LocalRespServer, MemoryBackend, MmapBackend, RedisBackend, SharedCache
+
+
+@pytest.fixture(params=["memory", "mmap", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    elif request.param == "mmap":
+        yield MmapBackend(str(tmp_path / "cache"))
+    else:
+        server = LocalRespServer().start()
+        yield RedisBackend(server.url)
+        server.stop()
+
+
+def test_values_expire(backend):
+    backend.set("key", b"value", 0.05)
+    backend.set("forever", b"value")
+    assert backend.get("key") == b"value"
+    time.sleep(0.1)
+    assert backend.get("key") is None
+    assert backend.get("forever") == b"value"
+
+
+def test_only_one_lock_holder_until_it_expires(backend):
+    assert backend.set("lock:x", b"a", 0.1, only_if_missing=True)
+    assert not backend.set("lock:x", b"b", 0.1, only_if_missing=True)
+    assert backend.get("lock:x") == b"a"
+    time.sleep(0.15)
+    # An expired lock is taken over
+    assert backend.set("lock:x", b"b", 10, only_if_missing=True)
+    assert backend.get("lock:x") == b"b"
+
+
+def test_delete_if_compares_the_value(backend):
+    backend.set("lock:x", b"a", 10)
+    assert not backend.delete_if("lock:x", b"b")
+    assert backend.get("lock:x") == b"a"
+    assert backend.delete_if("lock:x", b"a")
+    assert backend.get("lock:x") is None
+    assert not backend.delete_if("lock:x", b"a")
+
+
+def test_late_release_keeps_the_next_holders_lease(backend):
+    cache = SharedCache(backend)
+    first = cache.acquire("refresh", 0.05)
+    assert first
+    time.sleep(0.1)
+    second = cache.acquire("refresh", 10)
+    assert second and second != first
+
+    cache.release("refresh", first)
+    assert cache.is_locked("refresh")
+    assert not cache.acquire("refresh", 10)
+    cache.release("refresh", second)
+    assert not cache.is_locked("refresh")
+
+
+def test_one_thread_refreshes_while_the_others_wait(backend):
+    cache = SharedCache(backend)
+    calls, results = [], []
+
+    def refresh():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"n": len(calls)}
+
+    def worker():
+        results.append(cache.get_or_refresh("quotes", 60, refresh, lease=5, poll=0.01))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"n": 1}] * 8
+
+
+def test_stale_value_is_served_when_refresh_fails(backend):
+    cache = SharedCache(backend)
+    cache.set("quotes", [1], ttl=60, stored_at=time.time() - 120)
+
+    def refresh():
+        raise RuntimeError("upstream down")
+
+    assert cache.get_or_refresh("quotes", 60, refresh) == [1]
+    assert not cache.is_locked("quotes")
+
+
+def test_unreachable_backend_still_refreshes_locally():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    cache = SharedCache(RedisBackend(f"redis://127.0.0.1:{port}/0", timeout=0.2))
+    assert cache.acquire("refresh", 10)
+    assert cache.get_or_refresh("quotes", 60, lambda: [1]) == [1]
+
+
+def _hold_locks(directory, marker, rounds):
+    """Take the lock `rounds` times; a marker file created exclusively proves nobody else holds it"""
+    backend = MmapBackend(directory)
+    overlaps = taken = 0
+    me = str(os.getpid()).encode()
+    for _ in range(rounds):
+        if not backend.set("lock:refresh", me, 5, only_if_missing=True):
+            continue
+        taken += 1
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+            os.remove(marker)
+        except FileExistsError:
+            overlaps += 1
+        assert backend.delete_if("lock:refresh", me)
+    return taken, overlaps
+
+
+def test_mmap_lock_is_exclusive_across_processes(tmp_path):
+    directory, marker = str(tmp_path / "cache"), str(tmp_path / "inside")
+    MmapBackend(directory)
+    context = multiprocessing.get_context("fork")
+    with context.Pool(4) as pool:
+        results = pool.starmap(_hold_locks, [(directory, marker, 200)] * 4)
+    assert sum(taken for taken, _ in results) > 0
+    assert sum(overlaps for _, overlaps in results) == 0
+    # Releases remove the guard files with the lock
+    assert os.listdir(directory) == []
+
+
+def test_mmap_sweep_removes_expired_and_orphaned_files(tmp_path):
+    backend = MmapBackend(str(tmp_path))
+    backend.set("expired", b"v", 0.01)
+    backend.set("kept", b"v", 60)
+    orphan_guard = tmp_path / "gone.0123456789.guard"
+    orphan_guard.touch()
+    old_tmp = tmp_path / "kept.0123456789.1.2.tmp"
+    old_tmp.touch()
+    os.utime(old_tmp, (0, 0))
+    fresh_tmp = tmp_path / "kept.0123456789.3.4.tmp"
+    fresh_tmp.touch()
+    time.sleep(0.05)
+
+    backend.sweep()
+    assert backend.get("kept") == b"v"
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(backend._path("kept")), fresh_tmp.name])
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+import shared_cache
+from shared_cache import MmapBackend, SharedCache
+from snapshot_store import SnapshotStore
+
+
+def _row(symbol, signal="WAIT"):
+    return {"symbol": symbol, "daily": "BULL", "weekly": "BULL", "monthly": "BEAR", "signal": signal}
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    monkeypatch.setattr(shared_cache, "_cache", SharedCache())
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(state_dir=str(tmp_path))
+
+
+def test_versions_increase_within_one_epoch(store):
+    first = store.publish([_row("EUR/USD")])
+    second = store.publish([_row("EUR/USD", "BUY")])
+    assert (first["version"], second["version"]) == (1, 2)
+    assert first["epoch"] == second["epoch"] == store.epoch
+
+
+def test_changes_since_chains_the_diffs(store):
+    store.publish([_row("EUR/USD"), _row("GBP/USD"), _row("XAU/USD")])
+    epoch = store.epoch
+    store.publish([_row("EUR/USD", "BUY"), _row("GBP/USD"), _row("XAU/USD")])
+    store.publish([_row("EUR/USD", "BUY"), _row("XAU/USD", "SELL")])
+
+    changes = store.changes_since(1, epoch)
+    assert not changes["full"]
+    assert changes["version"] == 3
+    assert sorted(row["symbol"] for row in changes["upserts"]) == ["EUR/USD", "XAU/USD"]
+    assert changes["removed"] == ["GBP/USD"]
+
+    assert store.changes_since(3, epoch)["upserts"] == []
+
+
+def test_readded_symbol_is_an_upsert_not_a_removal(store):
+    store.publish([_row("EUR/USD"), _row("GBP/USD")])
+    store.publish([_row("EUR/USD")])
+    store.publish([_row("EUR/USD"), _row("GBP/USD", "BUY")])
+
+    changes = store.changes_since(1, store.epoch)
+    assert changes["removed"] == []
+    assert changes["upserts"] == [_row("GBP/USD", "BUY")]
+
+
+@pytest.mark.parametrize("version, epoch", [(1, "another-epoch"), (1, None), (99, "ours")])
+def test_unknown_versions_get_the_full_snapshot(store, version, epoch):
+    store.publish([_row("EUR/USD")])
+    store.publish([_row("EUR/USD", "BUY")])
+    changes = store.changes_since(version, store.epoch if epoch == "ours" else epoch)
+    assert changes["full"]
+    assert changes["data"] == [_row("EUR/USD", "BUY")]
+
+
+def test_versions_that_left_the_ring_get_the_full_snapshot(tmp_path):
+    store = SnapshotStore(state_dir=str(tmp_path), diff_history=2)
+    for signal in ["WAIT", "BUY", "SELL", "WAIT"]:
+        store.publish([_row("EUR/USD", signal)])
+    assert store.changes_since(1, store.epoch)["full"]
+    assert not store.changes_since(2, store.epoch)["full"]
+
+
+def test_sync_adopts_a_newer_snapshot_from_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "_cache", SharedCache(MmapBackend(str(tmp_path / "cache"))))
+    publisher = SnapshotStore(state_dir=str(tmp_path / "a"))
+    follower = SnapshotStore(state_dir=str(tmp_path / "b"), sync_interval=60)
+
+    publisher.publish([_row("EUR/USD")])
+    assert follower.sync_due()
+    assert follower.sync()["version"] == 1
+    assert not follower.sync_due()
+
+    publisher.publish([_row("EUR/USD", "BUY")])
+    assert follower.sync() is None            # throttled
+    adopted = follower.sync(force=True)
+    assert (adopted["version"], adopted["epoch"]) == (2, publisher.epoch)
+    assert follower.changes_since(1, publisher.epoch)["upserts"] == [_row("EUR/USD", "BUY")]
+    assert follower.sync(force=True) is None  # nothing newer
+
+
+def test_adopting_another_epoch_drops_the_old_diffs(store, tmp_path):
+    store.publish([_row("EUR/USD")])
+    store.publish([_row("EUR/USD", "BUY")])
+    old_epoch = store.epoch
+    other = SnapshotStore(state_dir=str(tmp_path / "other"))
+    with store._lock:
+        store._replace(other.publish([_row("EUR/USD", "SELL")]))
+    assert len(store.diffs) == 0
+    assert store.changes_since(1, old_epoch)["full"]
+
+
+def test_snapshot_survives_a_restart(store, tmp_path):
+    store.publish([_row("EUR/USD")])
+    store.save()
+
+    restarted = SnapshotStore(state_dir=str(tmp_path))
+    assert restarted.load()
+    assert (restarted.version, restarted.epoch) == (1, store.epoch)
+    assert restarted.publish([_row("EUR/USD", "BUY")])["version"] == 2
+
+
+def test_snapshots_saved_without_an_epoch_start_a_lineage(tmp_path):
+    (tmp_path / "snapshot.json").write_text(json.dumps(
+        {"data": [_row("EUR/USD")], "count": 1, "generated_at": 1.0, "version": 5}))
+    store = SnapshotStore(state_dir=str(tmp_path))
+    assert store.load()
+    assert store.epoch and store.version == 5
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from upstream_scheduler import BACKGROUND, USER, TokenBucket, UpstreamScheduler, job_priority
+
+
+@pytest.fixture
+def scheduler():
+    """One worker, no rate limit to speak of, fast retries"""
+    return UpstreamScheduler(rate=1000, burst=1000, workers=1, max_attempts=3, backoff=0.01)
+
+
+def _block(scheduler):
+    """Occupy the only worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit("blocker", blocker)
+    assert started.wait(5)
+    return release
+
+
+def test_identical_jobs_share_one_call(scheduler):
+    release = _block(scheduler)
+    calls = []
+    first = scheduler.submit("EURUSD=X", lambda: calls.append(1) or "candles")
+    second = scheduler.submit("EURUSD=X", lambda: calls.append(2) or "other")
+    assert first is second
+    release.set()
+
+    assert first.result(5) == "candles"
+    assert calls == [1]
+    assert scheduler.stats["deduplicated"] == 1
+    assert scheduler.queue_depth() == 0
+
+
+def test_jobs_run_in_priority_order(scheduler):
+    release = _block(scheduler)
+    order = []
+    futures = [
+        scheduler.submit("monthly", lambda: order.append("monthly"), job_priority("monthly", 1.0, background=True)),
+        scheduler.submit("weekly", lambda: order.append("weekly"), job_priority("weekly", 1.0)),
+        scheduler.submit("daily", lambda: order.append("daily"), job_priority("daily", 1.0)),
+        scheduler.submit("missing", lambda: order.append("missing"), job_priority("monthly", float("inf"))),
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ["missing", "daily", "weekly", "monthly"]
+
+
+def test_duplicate_raises_the_queued_priority(scheduler):
+    release = _block(scheduler)
+    order = []
+    scheduler.submit("user", lambda: order.append("user"), (USER,))
+    warmup = scheduler.submit("warmup", lambda: order.append("warmup"), (BACKGROUND,))
+    assert scheduler.submit("warmup", lambda: None, (USER - 1,)) is warmup
+    release.set()
+    warmup.result(5)
+    time.sleep(0.05)
+    assert order == ["warmup", "user"]
+
+
+def test_failed_jobs_are_retried(scheduler):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("upstream hiccup")
+        return "ok"
+
+    assert scheduler.run("flaky", flaky, timeout=5) == "ok"
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["failed"] == 0
+
+
+def test_jobs_fail_after_max_attempts(scheduler):
+    def broken():
+        raise ConnectionError("upstream down")
+
+    with pytest.raises(ConnectionError):
+        scheduler.run("broken", broken, timeout=5)
+    assert scheduler.stats["failed"] == 1
+    assert scheduler.stats["calls"] == 3
+    # The key is free again for a later attempt
+    assert scheduler.run("broken", lambda: "recovered", timeout=5) == "recovered"
+
+
+def test_job_priority_prefers_user_work_then_staleness():
+    assert job_priority("monthly", 0.1) < job_priority("daily", 5.0, background=True)
+    assert job_priority("monthly", 2.0) < job_priority("daily", 1.0)
+    assert job_priority("daily", 1.0) < job_priority("weekly", 1.0) < job_priority("monthly", 1.0)
+
+
+def test_token_bucket_limits_the_sustained_rate():
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.01
+
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.04
@@ -0,0 +1,92 @@
+import pytest
+
+from watchlists import IndexCache, SnapshotIndex, WatchlistStore, validate_filters
+
+SYMBOLS = ["EUR/USD", "GBP/USD", "USD/JPY", "XAU/USD"]
+
+
+def _snapshot(version=1, generated_at=100.0):
+    rows = [
+        {"symbol": "EUR/USD", "signal": "BUY", "daily": "BULL", "weekly": "BULL", "monthly": "STRONG BULL"},
+        {"symbol": "GBP/USD", "signal": "WAIT", "daily": "BEAR", "weekly": "BULL", "monthly": "BULL"},
+        {"symbol": "USD/JPY", "signal": "SELL", "daily": "BEAR", "weekly": "BEAR", "monthly": "BEAR"},
+        {"symbol": "XAU/USD", "signal": "BUY", "daily": "STRONG BULL", "weekly": "BULL", "monthly": "BULL"},
+    ]
+    return {"data": rows, "count": len(rows), "version": version, "generated_at": generated_at}
+
+
+def _symbols(rows):
+    return [row["symbol"] for row in rows]
+
+
+def test_bitsets_have_one_bit_per_row():
+    index = SnapshotIndex(_snapshot())
+    assert index.all == 0b1111
+    assert index.bitsets[("signal", "BUY")] == 0b1001
+    assert index.bitsets[("daily", "BEAR")] == 0b0110
+    assert index.symbols_mask(["XAU/USD", "EUR/USD"]) == 0b1001
+    assert index.symbols_mask() == index.all
+
+
+def test_resolve_keeps_the_watchlist_order():
+    index = SnapshotIndex(_snapshot())
+    assert _symbols(index.resolve(["XAU/USD", "USD/JPY", "EUR/USD"])) == ["XAU/USD", "USD/JPY", "EUR/USD"]
+    # Symbols missing from the snapshot are skipped
+    assert _symbols(index.resolve(["AUD/USD", "GBP/USD"])) == ["GBP/USD"]
+    assert _symbols(index.resolve()) == SYMBOLS
+
+
+def test_filters_or_values_and_and_fields():
+    index = SnapshotIndex(_snapshot())
+    assert _symbols(index.resolve(filters={"signal": ["BUY", "SELL"]})) == ["EUR/USD", "USD/JPY", "XAU/USD"]
+    assert _symbols(index.resolve(filters={"signal": ["BUY"], "monthly": ["BULL"]})) == ["XAU/USD"]
+    assert index.resolve(filters={"signal": ["WAIT"], "weekly": ["BEAR"]}) == []
+    assert _symbols(index.resolve(["XAU/USD", "GBP/USD", "EUR/USD"], {"weekly": ["BULL"], "daily": ["BULL", "BEAR"]})) \
+        == ["GBP/USD", "EUR/USD"]
+
+
+def test_counts_per_value():
+    counts = SnapshotIndex(_snapshot()).counts()
+    assert counts["signal"] == {"SELL": 1, "WAIT": 1, "BUY": 2}
+    assert counts["weekly"]["BULL"] == 3
+    assert counts["daily"]["NEUTRAL"] == 0
+
+
+def test_index_is_rebuilt_once_per_snapshot_version():
+    cache = IndexCache()
+    first = cache.get(_snapshot())
+    assert cache.get(_snapshot()) is first
+    assert cache.get(_snapshot(version=2, generated_at=160.0)) is not first
+
+
+def test_validate_filters():
+    assert validate_filters({"signal": "buy, sell", "daily": []}) == {"signal": ["BUY", "SELL"]}
+    with pytest.raises(ValueError, match="Invalid filter field"):
+        validate_filters({"hourly": ["BULL"]})
+    with pytest.raises(ValueError, match="Invalid signal values"):
+        validate_filters({"signal": ["HOLD"]})
+
+
+def test_watchlists_belong_to_their_owner(tmp_path):
+    store = WatchlistStore(str(tmp_path / "watchlists.db"), known_symbols=SYMBOLS)
+    created = store.create("alice", "majors", ["gbp-usd", "EUR/USD", "GBP/USD"], style="swing",
+                           filters={"signal": ["BUY"]})
+    assert created["symbols"] == ["GBP/USD", "EUR/USD"]
+    assert created["filters"] == {"signal": ["BUY"]}
+
+    assert store.update(created["id"], "bob", name="stolen") is None
+    assert not store.delete(created["id"], "bob")
+    assert store.list("bob") == []
+
+    updated = store.update(created["id"], "alice", symbols=["XAU/USD"])
+    assert (updated["name"], updated["symbols"], updated["style"]) == ("majors", ["XAU/USD"], "swing")
+    assert store.delete(created["id"], "alice")
+    assert store.get(created["id"]) is None
+
+
+def test_watchlists_reject_unknown_symbols_and_styles(tmp_path):
+    store = WatchlistStore(str(tmp_path / "watchlists.db"), known_symbols=SYMBOLS)
+    with pytest.raises(ValueError, match="Unknown symbols: EURUSD"):
+        store.create("alice", "typo", ["EURUSD"])
+    with pytest.raises(ValueError, match="Invalid style"):
+        store.create("alice", "style", ["EUR/USD"], style="weekly")
@@ -0,0 +1,226 @@
+"""
+Upstream Scheduler - Process-wide gate for every Yahoo Finance request
+Token-bucket rate limit, priority queue, dedup of identical queued jobs and
+retry with jitter, so a growing symbol universe stays inside upstream limits.
+
+Configure with environment variables:
+    UPSTREAM_RATE=5        requests per second (sustained)
+    UPSTREAM_BURST=30      token bucket size (one full refresh of the current universe)
+    UPSTREAM_WORKERS=6     concurrent upstream requests
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+import profiling
+
+# Priority classes (lower runs first)
+USER = 0
+BACKGROUND = 1
+
+TIMEFRAME_RANK = {"daily": 0, "weekly": 1, "monthly": 2}
+
+
+def job_priority(timeframe: str, staleness: float, background: bool = False) -> tuple:
+    """
+    Priority for a candle fetch.
+    User-facing work beats background warmup; within a class the most
+    overdue series goes first (staleness = cache age / TTL, inf if missing),
+    so a stale daily bar beats a fresh monthly one.
+    """
+    return (BACKGROUND if background else USER, -staleness, TIMEFRAME_RANK.get(timeframe, 3))
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success, otherwise seconds until one is available"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class _Job:
+    __slots__ = ("key", "fn", "priority", "future", "attempt", "seq", "state", "queued_at", "request_id")
+
+    def __init__(self, key, fn, priority, seq):
+        self.queued_at = time.perf_counter()
+        self.request_id = profiling.current_request_id()    # of the caller that queued it
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.future = Future()
+        self.attempt = 0
+        self.seq = seq
+        self.state = "queued"     # queued -> running -> (delayed -> queued ...) -> done
+
+
+class UpstreamScheduler:
+    """
+    Runs upstream calls on a fixed set of worker threads.
+
+    submit(key, fn, priority) queues fn unless an identical job (same key)
+    is already queued or running, in which case the existing future is
+    returned (and its priority raised if the new caller is more urgent).
+    A job that raises is retried up to max_attempts times after an
+    exponential backoff with full jitter.
+    """
+
+    def __init__(self, rate: float = 4, burst: float = 8, workers: int = 4,
+                 max_attempts: int = 3, backoff: float = 0.5):
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+        self.stats = {"submitted": 0, "deduplicated": 0, "calls": 0, "retries": 0, "failed": 0}
+
+        self._queue = []          # heap of (priority, seq, job)
+        self._delayed = []        # heap of (due_time, seq, job) waiting for a retry
+        self._jobs = {}           # key -> job (queued, delayed or running)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"upstream-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: Hashable, fn: Callable, priority: tuple = (USER,)) -> Future:
+        with self._cond:
+            self._ensure_started()
+            self.stats["submitted"] += 1
+
+            job = self._jobs.get(key)
+            if job is not None:
+                self.stats["deduplicated"] += 1
+                if priority < job.priority and job.state == "queued":
+                    # Re-queue with the better priority, the old heap entry is skipped
+                    job.priority = priority
+                    job.seq = next(self._seq)
+                    heapq.heappush(self._queue, (priority, job.seq, job))
+                    self._cond.notify()
+                return job.future
+
+            job = _Job(key, fn, priority, next(self._seq))
+            self._jobs[key] = job
+            heapq.heappush(self._queue, (priority, job.seq, job))
+            self._cond.notify()
+            return job.future
+
+    def run(self, key: Hashable, fn: Callable, priority: tuple = (USER,), timeout: float = 60):
+        """Submit and wait for the result"""
+        return self.submit(key, fn, priority).result(timeout)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def _next_job(self) -> _Job:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self._delayed)
+                    job.state = "queued"
+                    job.queued_at = time.perf_counter()
+                    job.seq = next(self._seq)
+                    heapq.heappush(self._queue, (job.priority, job.seq, job))
+
+                while self._queue:
+                    priority, seq, job = heapq.heappop(self._queue)
+                    if seq == job.seq and job.state == "queued":
+                        job.state = "running"
+                        return job
+
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._cond.wait(timeout)
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            with profiling.request_context(job.request_id):
+                profiling.tracer.complete("upstream.queue", job.queued_at, time.perf_counter(), "upstream",
+                                          key=str(job.key))
+                with profiling.span("upstream.rate_limit", "upstream"):
+                    self.bucket.acquire()
+                job.attempt += 1
+                self.stats["calls"] += 1
+                try:
+                    with profiling.span("upstream.call", "upstream", key=str(job.key), attempt=job.attempt):
+                        result = job.fn()
+                except Exception as e:
+                    self._failed(job, e)
+                    continue
+
+            with self._cond:
+                job.state = "done"
+                self._jobs.pop(job.key, None)
+            job.future.set_result(result)
+
+    def _failed(self, job: _Job, error: Exception):
+        with self._cond:
+            if job.attempt < self.max_attempts:
+                self.stats["retries"] += 1
+                delay = random.uniform(0, self.backoff * (2 ** (job.attempt - 1)))
+                job.state = "delayed"
+                job.seq = next(self._seq)
+                heapq.heappush(self._delayed, (time.monotonic() + delay, job.seq, job))
+                self._cond.notify()
+                return
+
+            self.stats["failed"] += 1
+            job.state = "done"
+            self._jobs.pop(job.key, None)
+        print(f"Upstream job {job.key} failed after {job.attempt} attempts: {error}")
+        job.future.set_exception(error)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> UpstreamScheduler:
+    """Process-wide scheduler configured from the environment"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpstreamScheduler(
+                rate=float(os.environ.get("UPSTREAM_RATE", 5)),
+                burst=float(os.environ.get("UPSTREAM_BURST", 30)),
+                workers=int(os.environ.get("UPSTREAM_WORKERS", 6)),
+            )
+        return _scheduler
@@ -0,0 +1,254 @@
+"""
+Watchlists - Personal watchlists served from the shared bias snapshot
+Watchlists (symbols, saved dashboard style and filters) live in a local
+SQLite database. Views are resolved against a bitset index built once per
+snapshot version, so a watchlist/filter combination is a handful of integer
+AND/OR operations and never triggers a fetch or recomputation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from bias_calculator import BIAS_LABELS, SIGNAL_LABELS
+
+# Dashboard styles (frontend style buttons)
+STYLES = ["position", "swing", "intraday", "scalp"]
+
+# Snapshot row fields that can be filtered on, and their values
+FILTER_VALUES = {
+    "signal": SIGNAL_LABELS,
+    "daily": BIAS_LABELS,
+    "weekly": BIAS_LABELS,
+    "monthly": BIAS_LABELS,
+}
+
+
+def validate_filters(filters: Optional[dict]) -> Dict[str, List[str]]:
+    """{"signal": ["BUY"], "daily": ["BULL", "STRONG BULL"]} with upper-cased values"""
+    cleaned = {}
+    for field, values in (filters or {}).items():
+        if field not in FILTER_VALUES:
+            raise ValueError(f"Invalid filter field: {field} (expected one of {', '.join(FILTER_VALUES)})")
+        if isinstance(values, str):
+            values = values.split(",")
+        values = [value.strip().upper() for value in values if value.strip()]
+        unknown = [value for value in values if value not in FILTER_VALUES[field]]
+        if unknown:
+            raise ValueError(f"Invalid {field} values: {', '.join(unknown)}")
+        if values:
+            cleaned[field] = values
+    return cleaned
+
+
+class WatchlistStore:
+    """
+    SQLite-backed watchlists:
+        {"id", "owner", "name", "symbols": [...], "style", "filters": {...},
+         "created_at", "updated_at"}
+    """
+
+    def __init__(self, path: str, known_symbols: List[str] = None):
+        self.path = path
+        self.known_symbols = set(known_symbols) if known_symbols else None
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS watchlists (
+                    id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    symbols TEXT NOT NULL,
+                    style TEXT NOT NULL,
+                    filters TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS watchlists_owner ON watchlists (owner)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _validate(self, symbols: List[str], style: str, filters: dict) -> tuple:
+        symbols = [symbol.strip().upper().replace("-", "/") for symbol in symbols if symbol.strip()]
+        if self.known_symbols is not None:
+            unknown = [symbol for symbol in symbols if symbol not in self.known_symbols]
+            if unknown:
+                raise ValueError(f"Unknown symbols: {', '.join(unknown)}")
+        if style not in STYLES:
+            raise ValueError(f"Invalid style: {style} (expected one of {', '.join(STYLES)})")
+        # Keep the user's order, drop duplicates
+        return list(dict.fromkeys(symbols)), style, validate_filters(filters)
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "owner": row["owner"],
+            "name": row["name"],
+            "symbols": json.loads(row["symbols"]),
+            "style": row["style"],
+            "filters": json.loads(row["filters"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def create(self, owner: str, name: str, symbols: List[str], style: str = "position",
+               filters: dict = None) -> dict:
+        symbols, style, filters = self._validate(symbols, style, filters)
+        now = time.time()
+        watchlist_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT INTO watchlists VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (watchlist_id, owner, name, json.dumps(symbols), style, json.dumps(filters), now, now),
+            )
+            db.commit()
+        return self.get(watchlist_id)
+
+    def get(self, watchlist_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM watchlists WHERE id = ?", (watchlist_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, owner: str) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM watchlists WHERE owner = ? ORDER BY created_at", (owner,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def update(self, watchlist_id: str, owner: str, name: str = None, symbols: List[str] = None,
+               style: str = None, filters: dict = None) -> Optional[dict]:
+        """None if the watchlist does not exist or belongs to another owner"""
+        current = self.get(watchlist_id)
+        if current is None or current["owner"] != owner:
+            return None
+        symbols, style, filters = self._validate(
+            symbols if symbols is not None else current["symbols"],
+            style or current["style"],
+            filters if filters is not None else current["filters"],
+        )
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "UPDATE watchlists SET name = ?, symbols = ?, style = ?, filters = ?, updated_at = ? "
+                "WHERE id = ? AND owner = ?",
+                (name or current["name"], json.dumps(symbols), style, json.dumps(filters), time.time(),
+                 watchlist_id, owner),
+            )
+            db.commit()
+        return self.get(watchlist_id)
+
+    def delete(self, watchlist_id: str, owner: str) -> bool:
+        with self._lock:
+            db = self._connect()
+            deleted = db.execute("DELETE FROM watchlists WHERE id = ? AND owner = ?", (watchlist_id, owner)).rowcount
+            db.commit()
+        return bool(deleted)
+
+
+class SnapshotIndex:
+    """
+    Bitset index over one snapshot: bit i stands for row i, and there is one
+    Python int per (field, value), e.g. ("signal", "BUY") or ("daily", "BULL").
+
+    resolve() ORs the bits of the requested symbols, then for every filter
+    field ANDs with the OR of the allowed values' bitsets. Rows come back in
+    the watchlist's saved order.
+    """
+
+    def __init__(self, snapshot: dict):
+        self.version = snapshot.get("version", 0)
+        self.generated_at = snapshot.get("generated_at")
+        self.rows = snapshot["data"]
+        self.positions = {row["symbol"]: i for i, row in enumerate(self.rows)}
+        self.all = (1 << len(self.rows)) - 1
+
+        self._symbol_masks: Dict[tuple, tuple] = {}  # watchlist symbols -> (mask, positions), for this version
+        self.bitsets: Dict[tuple, int] = {}
+        for i, row in enumerate(self.rows):
+            bit = 1 << i
+            for field in FILTER_VALUES:
+                key = (field, row.get(field))
+                self.bitsets[key] = self.bitsets.get(key, 0) | bit
+
+    def _symbols(self, symbols: List[str]) -> tuple:
+        """(mask, row positions in the given order) of the symbols in this snapshot"""
+        key = tuple(symbols)
+        cached = self._symbol_masks.get(key)
+        if cached is None:
+            positions = [self.positions[symbol] for symbol in symbols if symbol in self.positions]
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            cached = self._symbol_masks[key] = (mask, positions)
+        return cached
+
+    def symbols_mask(self, symbols: List[str] = None) -> int:
+        """Bits of the given symbols (all rows when symbols is empty/None)"""
+        if not symbols:
+            return self.all
+        return self._symbols(symbols)[0]
+
+    def filter_mask(self, filters: Dict[str, List[str]]) -> int:
+        mask = self.all
+        for field, values in filters.items():
+            allowed = 0
+            for value in values:
+                allowed |= self.bitsets.get((field, value), 0)
+            mask &= allowed
+        return mask
+
+    def resolve(self, symbols: List[str] = None, filters: Dict[str, List[str]] = None) -> List[dict]:
+        """
+        Snapshot rows for a watchlist/filter combination, in the order of
+        `symbols` (snapshot order when no symbols are given)
+        """
+        mask = self.symbols_mask(symbols) & self.filter_mask(filters or {})
+        if symbols:
+            return [self.rows[position] for position in self._symbols(symbols)[1] if mask >> position & 1]
+        rows = []
+        while mask:
+            low = mask & -mask
+            rows.append(self.rows[low.bit_length() - 1])
+            mask ^= low
+        return rows
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Rows per value for every filter field (bit counts)"""
+        return {
+            field: {value: bin(self.bitsets.get((field, value), 0)).count("1") for value in values}
+            for field, values in FILTER_VALUES.items()
+        }
+
+
+class IndexCache:
+    """Keeps the SnapshotIndex of the newest snapshot version (rebuilt once per version)"""
+
+    def __init__(self):
+        self._index: Optional[SnapshotIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: dict) -> SnapshotIndex:
+        key = (snapshot.get("version", 0), snapshot.get("generated_at"))
+        index = self._index
+        if index is None or (index.version, index.generated_at) != key:
+            with self._lock:
+                index = self._index
+                if index is None or (index.version, index.generated_at) != key:
+                    index = self._index = SnapshotIndex(snapshot)
+        return index
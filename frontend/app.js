@@ -7,8 +7,14 @@ const CONFIG = {
     API_URL: '',
     REFRESH_INTERVAL: 60000,
     CACHE_KEY: 'biasData',
-    CACHE_TIMESTAMP_KEY: 'biasDataTimestamp',
-    CACHE_EXPIRY: 300000 // 5 minutes
+    CACHE_DB: 'marketBias',
+    CACHE_STORE: 'snapshots',
+    CACHE_EXPIRY: 300000, // 5 minutes (older cached data is only used as a delta base)
+
+    // Sections longer than this only render the rows in view
+    VIRTUAL_THRESHOLD: 50,
+    VIRTUAL_ROW_HEIGHT: 45, // px, replaced by the measured height once rows exist
+    VIRTUAL_OVERSCAN: 8
 };
 
 // State
@@ -17,6 +23,8 @@ let lastUpdateTime = null;
 let selectedMarket = 'forex';
 let selectedStyle = 'position';
 let selectedTimeframes = { tf1: 'monthly', tf2: 'weekly', tf3: 'daily' };
+let currentData = [];
+let cachedSnapshot = null; // {version, epoch, count, generated_at, data, savedAt}
 
 // DOM Elements
 const elements = {
@@ -47,6 +55,28 @@ const elements = {
     noSignalHeader3: document.getElementById('noSignalHeader3'),
 };
 
+// Per-section render state: rows are keyed by symbol and reused across refreshes
+const sections = {
+    buy: createSectionState(elements.buyTableBody, elements.buyCount),
+    sell: createSectionState(elements.sellTableBody, elements.sellCount),
+    'no-signal': createSectionState(elements.noSignalTableBody, elements.noSignalCount),
+};
+
+function createSectionState(tbody, countEl) {
+    return {
+        tbody,
+        countEl,
+        container: tbody.closest('.table-container'),
+        rows: new Map(),     // symbol -> <tr>
+        items: [],
+        virtual: false,
+        topSpacer: null,
+        bottomSpacer: null,
+        rowHeight: CONFIG.VIRTUAL_ROW_HEIGHT,
+        scrollPending: false,
+    };
+}
+
 /**
  * Initialize the dashboard
  */
@@ -58,7 +88,7 @@ async function init() {
     elements.refreshBtn.addEventListener('click', handleRefresh);
     
     // Load cache first
-    loadFromCache();
+    await loadFromCache();
     
     // Fetch fresh data
     await fetchBiasData();
@@ -112,7 +142,8 @@ function initStyleButtons() {
                 tf3: this.dataset.tf3
             };
             updateTableHeaders();
-            fetchBiasData();
+            // Same data, different columns: only the changed cells are touched
+            renderSignalSections(currentData);
         });
     });
 }
@@ -149,7 +180,10 @@ async function handleRefresh() {
 }
 
 /**
- * Fetch bias data from API
+ * Fetch bias data from API.
+ * With a cached snapshot only the changes since its version are requested
+ * and patched in; the server answers with the full snapshot if it no
+ * longer has that version.
  */
 async function fetchBiasData() {
     if (isLoading) return;
@@ -159,18 +193,12 @@ async function fetchBiasData() {
     updateStatus('loading', 'Fetching data...');
 
     try {
-        const apiUrl = `${CONFIG.API_URL}/api/bias`;
-        console.log('Fetching from:', apiUrl);
-
-        const response = await fetch(apiUrl);
-
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}`);
-        }
-
-        const data = await response.json();
+        const data = cachedSnapshot
+            ? await fetchChanges(cachedSnapshot)
+            : await fetchJson(`${CONFIG.API_URL}/api/bias`);
 
         // Save to cache
+        cachedSnapshot = data;
         saveToCache(data);
 
         // Render data in signal sections
@@ -198,6 +226,46 @@ async function fetchBiasData() {
     }
 }
 
+async function fetchJson(url) {
+    console.log('Fetching from:', url);
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    return response.json();
+}
+
+/**
+ * Apply /api/changes?since=<version>&epoch=<epoch> to the cached snapshot.
+ * A snapshot from another server lineage comes back as full data.
+ */
+async function fetchChanges(snapshot) {
+    const epoch = encodeURIComponent(snapshot.epoch || '');
+    const changes = await fetchJson(`${CONFIG.API_URL}/api/changes?since=${snapshot.version}&epoch=${epoch}`);
+
+    if (changes.full) {
+        return {
+            data: changes.data,
+            count: changes.count,
+            generated_at: changes.generated_at,
+            version: changes.version,
+            epoch: changes.epoch
+        };
+    }
+
+    const rows = new Map(snapshot.data.map(item => [item.symbol, item]));
+    changes.removed.forEach(symbol => rows.delete(symbol));
+    changes.upserts.forEach(item => rows.set(item.symbol, item));
+
+    return {
+        data: Array.from(rows.values()),
+        count: rows.size,
+        generated_at: changes.generated_at,
+        version: changes.version,
+        epoch: changes.epoch
+    };
+}
+
 /**
  * Render data into BUY/SELL/NO SIGNAL sections
  */
@@ -206,53 +274,211 @@ function renderSignalSections(data) {
         renderError();
         return;
     }
+    currentData = data;
     
-    // Separate data by signal type
-    const buySignals = data.filter(item => item.signal === 'BUY');
-    const sellSignals = data.filter(item => item.signal === 'SELL');
-    const noSignals = data.filter(item => item.signal === 'WAIT' || !item.signal);
-    
-    // Render each section
-    renderSection(elements.buyTableBody, buySignals, 'buy');
-    renderSection(elements.sellTableBody, sellSignals, 'sell');
-    renderSection(elements.noSignalTableBody, noSignals, 'no-signal');
+    // Separate data by signal type (single pass)
+    const buckets = { buy: [], sell: [], 'no-signal': [] };
+    for (const item of data) {
+        if (item.signal === 'BUY') buckets.buy.push(item);
+        else if (item.signal === 'SELL') buckets.sell.push(item);
+        else buckets['no-signal'].push(item);
+    }
     
-    // Update counts
-    elements.buyCount.textContent = `${buySignals.length} pairs`;
-    elements.sellCount.textContent = `${sellSignals.length} pairs`;
-    elements.noSignalCount.textContent = `${noSignals.length} pairs`;
+    // Render each section and update counts
+    for (const [type, items] of Object.entries(buckets)) {
+        const section = sections[type];
+        renderSection(section, items);
+        const countText = `${items.length} pairs`;
+        if (section.countEl.textContent !== countText) {
+            section.countEl.textContent = countText;
+        }
+    }
 }
 
 /**
  * Render a specific signal section
+ * Rows are reconciled by symbol: existing rows are reused and only cells
+ * whose bias changed are updated. Long sections are virtualized.
  */
-function renderSection(tbody, data, sectionType) {
-    if (!data || data.length === 0) {
-        tbody.innerHTML = `
+function renderSection(section, items) {
+    section.items = items;
+    
+    if (items.length === 0) {
+        resetSection(section);
+        section.tbody.innerHTML = `
             <tr>
                 <td colspan="4" class="empty-state">No signals found</td>
             </tr>
         `;
+        refreshSectionHeight(section);
         return;
     }
     
-    const rows = data.map(item => {
-        // Map timeframe data based on selected style
-        const tf1Data = item[selectedTimeframes.tf1] || item.monthly;
-        const tf2Data = item[selectedTimeframes.tf2] || item.weekly;
-        const tf3Data = item[selectedTimeframes.tf3] || item.daily;
+    // Drop the empty/error/loading placeholder rows
+    section.tbody.querySelectorAll('tr:not([data-key]):not(.spacer-row)').forEach(row => row.remove());
+    
+    setVirtual(section, items.length > CONFIG.VIRTUAL_THRESHOLD);
+    if (section.virtual) {
+        renderWindow(section);
+    } else {
+        reconcileRows(section, items);
+    }
+    refreshSectionHeight(section);
+}
+
+/**
+ * Make the tbody show exactly `items` in order, reusing keyed rows
+ */
+function reconcileRows(section, items) {
+    const { tbody, rows } = section;
+    const keep = new Set();
+    let cursor = section.topSpacer ? section.topSpacer.nextSibling : tbody.firstChild;
+    
+    for (const item of items) {
+        let row = rows.get(item.symbol);
+        if (!row) {
+            row = createRow(item.symbol);
+            rows.set(item.symbol, row);
+        }
+        updateRow(row, item);
+        keep.add(item.symbol);
         
-        return `
-            <tr>
-                <td class="symbol">${escapeHtml(item.symbol)}</td>
-                <td>${renderBadge(tf1Data)}</td>
-                <td>${renderBadge(tf2Data)}</td>
-                <td>${renderBadge(tf3Data)}</td>
-            </tr>
-        `;
-    }).join('');
+        if (row === cursor) {
+            cursor = cursor.nextSibling;
+        } else {
+            tbody.insertBefore(row, cursor);
+        }
+    }
     
-    tbody.innerHTML = rows;
+    rows.forEach((row, symbol) => {
+        if (!keep.has(symbol)) {
+            row.remove();
+            rows.delete(symbol);
+        }
+    });
+}
+
+/**
+ * Create an empty row for a symbol (badges are filled by updateRow)
+ */
+function createRow(symbol) {
+    const row = document.createElement('tr');
+    row.dataset.key = symbol;
+    
+    const symbolCell = document.createElement('td');
+    symbolCell.className = 'symbol';
+    symbolCell.textContent = symbol;
+    row.appendChild(symbolCell);
+    
+    for (let i = 0; i < 3; i++) {
+        const cell = document.createElement('td');
+        const badge = document.createElement('span');
+        cell.appendChild(badge);
+        row.appendChild(cell);
+    }
+    row.biasValues = [];
+    return row;
+}
+
+/**
+ * Update the badges of a row, touching only cells whose value changed
+ */
+function updateRow(row, item) {
+    // Map timeframe data based on selected style
+    const values = [
+        item[selectedTimeframes.tf1] || item.monthly,
+        item[selectedTimeframes.tf2] || item.weekly,
+        item[selectedTimeframes.tf3] || item.daily,
+    ];
+    
+    values.forEach((bias, i) => {
+        if (row.biasValues[i] === bias) return;
+        const badge = row.cells[i + 1].firstChild;
+        badge.className = `badge ${getBiasClass(bias)}`;
+        badge.textContent = formatBiasText(bias);
+    });
+    row.biasValues = values;
+}
+
+/**
+ * Switch a section between full and windowed rendering
+ */
+function setVirtual(section, enabled) {
+    if (section.virtual === enabled) return;
+    section.virtual = enabled;
+    section.container.classList.toggle('virtual-scroll', enabled);
+    
+    if (enabled) {
+        section.topSpacer = createSpacerRow();
+        section.bottomSpacer = createSpacerRow();
+        section.tbody.insertBefore(section.topSpacer, section.tbody.firstChild);
+        section.tbody.appendChild(section.bottomSpacer);
+        
+        if (!section.scrollListener) {
+            section.scrollListener = () => {
+                if (!section.virtual || section.scrollPending) return;
+                section.scrollPending = true;
+                requestAnimationFrame(() => {
+                    section.scrollPending = false;
+                    if (section.virtual) renderWindow(section);
+                });
+            };
+            section.container.addEventListener('scroll', section.scrollListener, { passive: true });
+        }
+    } else {
+        section.topSpacer.remove();
+        section.bottomSpacer.remove();
+        section.topSpacer = null;
+        section.bottomSpacer = null;
+        section.container.scrollTop = 0;
+    }
+}
+
+function createSpacerRow() {
+    const row = document.createElement('tr');
+    row.className = 'spacer-row';
+    row.innerHTML = '<td colspan="4"></td>';
+    return row;
+}
+
+/**
+ * Render only the rows visible in the scroll container (plus overscan)
+ */
+function renderWindow(section) {
+    const { items, container } = section;
+    const rowHeight = section.rowHeight;
+    const viewport = container.clientHeight || rowHeight * CONFIG.VIRTUAL_THRESHOLD;
+    
+    const start = Math.max(0, Math.floor(container.scrollTop / rowHeight) - CONFIG.VIRTUAL_OVERSCAN);
+    const end = Math.min(items.length, Math.ceil((container.scrollTop + viewport) / rowHeight) + CONFIG.VIRTUAL_OVERSCAN);
+    
+    reconcileRows(section, items.slice(start, end));
+    section.topSpacer.firstChild.style.height = `${start * rowHeight}px`;
+    section.bottomSpacer.firstChild.style.height = `${(items.length - end) * rowHeight}px`;
+    
+    // Measure the real row height once there is a rendered row
+    const firstRow = section.topSpacer.nextSibling;
+    if (firstRow && firstRow !== section.bottomSpacer && firstRow.offsetHeight) {
+        section.rowHeight = firstRow.offsetHeight;
+    }
+}
+
+/**
+ * Forget keyed rows (used before the tbody is replaced wholesale)
+ */
+function resetSection(section) {
+    setVirtual(section, false);
+    section.rows.clear();
+}
+
+/**
+ * Keep an expanded section's max-height in step with its content
+ */
+function refreshSectionHeight(section) {
+    const content = section.tbody.closest('.section-content');
+    if (content && !content.classList.contains('collapsed') && content.style.maxHeight) {
+        content.style.maxHeight = content.scrollHeight + 'px';
+    }
 }
 
 /**
@@ -303,51 +529,92 @@ function renderError() {
         </tr>
     `;
     
-    elements.buyTableBody.innerHTML = errorHtml;
-    elements.sellTableBody.innerHTML = errorHtml;
-    elements.noSignalTableBody.innerHTML = errorHtml;
+    Object.values(sections).forEach(section => {
+        resetSection(section);
+        section.tbody.innerHTML = errorHtml;
+    });
+}
+
+/**
+ * Open the IndexedDB cache (null when IndexedDB is unavailable)
+ */
+let cacheDb = null;
+
+function openCacheDb() {
+    if (cacheDb) return cacheDb;
+    cacheDb = new Promise(resolve => {
+        if (!window.indexedDB) {
+            resolve(null);
+            return;
+        }
+        const request = indexedDB.open(CONFIG.CACHE_DB, 1);
+        request.onupgradeneeded = () => request.result.createObjectStore(CONFIG.CACHE_STORE);
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => {
+            console.error('IndexedDB unavailable:', request.error);
+            resolve(null);
+        };
+    });
+    return cacheDb;
 }
 
 /**
- * Save data to localStorage cache
+ * Save the versioned snapshot to IndexedDB (localStorage as a fallback)
  */
-function saveToCache(data) {
+async function saveToCache(data) {
+    const entry = { ...data, savedAt: Date.now() };
     try {
-        localStorage.setItem(CONFIG.CACHE_KEY, JSON.stringify(data));
-        localStorage.setItem(CONFIG.CACHE_TIMESTAMP_KEY, Date.now().toString());
-        console.log('Data cached successfully');
+        const db = await openCacheDb();
+        if (db) {
+            const tx = db.transaction(CONFIG.CACHE_STORE, 'readwrite');
+            tx.objectStore(CONFIG.CACHE_STORE).put(entry, CONFIG.CACHE_KEY);
+        } else {
+            localStorage.setItem(CONFIG.CACHE_KEY, JSON.stringify(entry));
+        }
+        console.log(`Data cached (version ${data.version})`);
     } catch (error) {
         console.error('Cache save failed:', error);
     }
 }
 
 /**
- * Load data from localStorage cache
+ * Load the cached snapshot; it is rendered if recent and always kept as
+ * the base for the next delta request
  */
-function loadFromCache() {
+async function loadFromCache() {
     try {
-        const cachedData = localStorage.getItem(CONFIG.CACHE_KEY);
-        const cacheTimestamp = localStorage.getItem(CONFIG.CACHE_TIMESTAMP_KEY);
-        
-        if (!cachedData || !cacheTimestamp) {
+        let entry = null;
+        const db = await openCacheDb();
+        if (db) {
+            entry = await new Promise((resolve, reject) => {
+                const request = db.transaction(CONFIG.CACHE_STORE, 'readonly')
+                    .objectStore(CONFIG.CACHE_STORE).get(CONFIG.CACHE_KEY);
+                request.onsuccess = () => resolve(request.result || null);
+                request.onerror = () => reject(request.error);
+            });
+        } else {
+            const raw = localStorage.getItem(CONFIG.CACHE_KEY);
+            entry = raw ? JSON.parse(raw) : null;
+        }
+
+        // Entries from before snapshots were versioned can't be patched
+        if (!entry || entry.version === undefined) {
             console.log('No cache available');
             return;
         }
+        cachedSnapshot = entry;
 
-        const age = Date.now() - parseInt(cacheTimestamp);
-        const data = JSON.parse(cachedData);
-
-        if (age > CONFIG.CACHE_EXPIRY) {
+        if (Date.now() - entry.savedAt > CONFIG.CACHE_EXPIRY) {
             console.log('Cache expired');
             return;
         }
 
         console.log('Loading from cache');
-        renderSignalSections(data.data);
+        renderSignalSections(entry.data);
         updateStatus('cached', 'Cached data');
-        elements.pairsCount.textContent = `${data.count} pairs`;
+        elements.pairsCount.textContent = `${entry.count} pairs`;
         
-        lastUpdateTime = new Date(parseInt(cacheTimestamp));
+        lastUpdateTime = new Date(entry.savedAt);
         updateLastUpdateTime();
 
     } catch (error) {